@@ -0,0 +1,120 @@
+'''
+Seeded generators of test polygons.
+Every generator takes the approximate total number of vertices and a seed and returns
+(outline, holes): the outline is a list of (x, y) tuples, holes is a list of such lists.
+'''
+
+import math
+from random import Random
+
+
+
+def star(num_verts, seed=0, radius=1000.):
+    '''
+    Star-shaped polygon: vertices at regular angles and random distances from the center.
+    '''
+    rnd = Random(seed)
+    num_verts = max(num_verts, 3)
+
+    outline = []
+    for i in range(num_verts):
+        angle = 2. * math.pi * i / num_verts
+        dist = radius * rnd.uniform(.6, 1.)
+        outline.append((dist * math.cos(angle), dist * math.sin(angle)))
+
+    return outline, []
+
+
+
+def spiral(num_verts, seed=0, radius=1000., turns=3.):
+    '''
+    A band that winds around the center several times.
+    '''
+    rnd = Random(seed)
+    num_arm = max(num_verts // 2, 3)
+
+    # distance between neighbouring turns of the band
+    pitch = radius / (turns + 1.)
+    width = pitch * .5
+
+    outer = []
+    inner = []
+    for i in range(num_arm):
+        t = float(i) / (num_arm - 1)
+        angle = 2. * math.pi * turns * t
+        dist = pitch * (1. + turns * t)
+        jitter = width * rnd.uniform(0., .1)
+
+        outer.append(((dist - jitter) * math.cos(angle), (dist - jitter) * math.sin(angle)))
+        inner_dist = dist - width + jitter
+        inner.append((inner_dist * math.cos(angle), inner_dist * math.sin(angle)))
+
+    return outer + inner[::-1], []
+
+
+
+def maze(num_verts, seed=0, size=1000.):
+    '''
+    Serpentine corridor: a box with walls sticking out of its left and right sides in turns.
+    Every wall adds 4 vertices.
+    '''
+    rnd = Random(seed)
+    num_walls = max((num_verts - 4) // 4, 1)
+
+    step = size / (num_walls + 1)
+    thickness = step * .3
+
+    right_side = []
+    left_walls = []
+    for wall in range(num_walls):
+        y = step * (wall + 1) + rnd.uniform(-.1, .1) * step
+        length = size * rnd.uniform(.6, .9)
+
+        if wall % 2 == 0:
+            # wall attached to the right side, walk it bottom to top
+            right_side += [(size, y), (size - length, y), (size - length, y + thickness), (size, y + thickness)]
+        else:
+            # wall attached to the left side, walk it top to bottom
+            left_walls.append([(0., y + thickness), (length, y + thickness), (length, y), (0., y)])
+
+    left_side = [pt for wall in left_walls[::-1] for pt in wall]
+
+    outline = [(0., 0.), (size, 0.)] + right_side + [(size, size), (0., size)] + left_side
+    return outline, []
+
+
+
+def random_holes(num_verts, seed=0, size=1000., hole_verts=6):
+    '''
+    Square with randomly shaped convex holes, one hole per cell of a regular grid.
+    '''
+    rnd = Random(seed)
+    num_holes = max((num_verts - 4) // hole_verts, 1)
+
+    cells = int(math.ceil(math.sqrt(num_holes)))
+    step = size / cells
+
+    holes = []
+    for pos in range(num_holes):
+        cx = step * (pos % cells + .5) + rnd.uniform(-.1, .1) * step
+        cy = step * (pos // cells + .5) + rnd.uniform(-.1, .1) * step
+        hole_radius = step * rnd.uniform(.15, .3)
+        start_angle = rnd.uniform(0., 2. * math.pi)
+
+        hole = []
+        for i in range(hole_verts):
+            angle = start_angle + 2. * math.pi * i / hole_verts
+            hole.append((cx + hole_radius * math.cos(angle), cy + hole_radius * math.sin(angle)))
+        holes.append(hole)
+
+    outline = [(0., 0.), (size, 0.), (size, size), (0., size)]
+    return outline, holes
+
+
+
+GENERATORS = {
+    'star': star,
+    'spiral': spiral,
+    'maze': maze,
+    'random_holes': random_holes,
+}
@@ -0,0 +1,241 @@
+'''
+Timing of the main Mesh2d stages on synthetic polygons of growing size.
+
+    python benchmarks/run_benchmarks.py --out results.json
+    python benchmarks/run_benchmarks.py --generators star maze --sizes 10 100 1000 --max-exponent 1.5
+
+For every generator, size and stage the best time over the repeats is recorded.
+Once a stage takes longer than the time budget, it is not run for larger sizes
+of that generator. For consecutive sizes the growth exponent
+log(t2 / t1) / log(n2 / n1) is reported: about 1 for linear stages, 2 for quadratic ones.
+With --max-exponent the script exits with status 1 if any exponent is above the limit,
+which is how quadratic regressions are caught.
+'''
+
+import sys
+import os
+import json
+import math
+import time
+import argparse
+import platform
+
+here = os.path.abspath(os.path.dirname(__file__))
+
+module_root = os.path.join(here, "..")
+sys.path.append(module_root)
+
+from mesh2d import Mesh2d, Polygon2d, Vector2, TimingObserver, bool_add, bool_subtract
+from generators import GENERATORS
+
+
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+STAGES = ['init', 'find_spikes', 'get_portals', 'break_into_convex', 'break_into_convex_pruned',
+    'bool_add', 'bool_subtract']
+
+# stages that take less than this are too noisy for the growth exponent
+MIN_EXPONENT_TIME = 0.05
+
+
+
+class _Silence(object):
+    '''
+    Hide the debug output of the library while timing.
+    '''
+    def __enter__(self):
+        self.stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+
+
+    def __exit__(self, *args):
+        sys.stdout.close()
+        sys.stdout = self.stdout
+
+
+
+def make_mesh(outline, holes):
+    mesh = Mesh2d([Vector2(x, y) for x, y in outline], range(len(outline)))
+    for hole in holes:
+        mesh.add_hole([Vector2(x, y) for x, y in hole])
+    return mesh
+
+
+
+def shifted_polygon(outline, fraction=.13):
+    '''
+    Copy of the outline moved by a fraction of its size, overlapping the original.
+    '''
+    xs = [pt[0] for pt in outline]
+    ys = [pt[1] for pt in outline]
+    dx = (max(xs) - min(xs)) * fraction
+    dy = (max(ys) - min(ys)) * fraction * .5
+    return Polygon2d([Vector2(x + dx, y + dy) for x, y in outline], range(len(outline)))
+
+
+
+def run_stage(stage, outline, holes, threshold):
+    '''
+    Prepare the input of the stage (untimed), then time it.
+    Returns (seconds, dict of result counts).
+    '''
+    if stage == 'init':
+        start = time.time()
+        mesh = make_mesh(outline, holes)
+        return time.time() - start, {'vertices': len(mesh.vertices)}
+
+    if stage in ('bool_add', 'bool_subtract'):
+        poly_a = Polygon2d([Vector2(x, y) for x, y in outline], range(len(outline)))
+        poly_b = shifted_polygon(outline)
+        func = bool_add if stage == 'bool_add' else bool_subtract
+
+        start = time.time()
+        result = func(poly_a, poly_b)
+        return time.time() - start, {'polygons': len(result)}
+
+    mesh = make_mesh(outline, holes)
+
+    if stage == 'find_spikes':
+        start = time.time()
+        spikes = mesh.find_spikes(threshold)
+        return time.time() - start, {'spikes': len(spikes)}
+
+    if stage == 'get_portals':
+        start = time.time()
+        portals = mesh.get_portals(threshold)
+        return time.time() - start, {'portals': len(portals)}
+
+    if stage in ('break_into_convex', 'break_into_convex_pruned'):
+        observer = TimingObserver()
+        start = time.time()
+        mesh.break_into_convex(threshold, observer=observer,
+            prune_portals=(stage == 'break_into_convex_pruned'))
+        return time.time() - start, {'rooms': len(mesh.rooms), 'portals': len(mesh.portals),
+            'build': observer.report()}
+
+    raise ValueError("Unknown stage: {}".format(stage))
+
+
+
+def growth_exponents(records):
+    '''
+    Growth exponents between consecutive sizes of every generator and stage.
+    '''
+    exponents = []
+    series = {}
+    for rec in records:
+        if rec.get('seconds') is None: continue
+        series.setdefault((rec['generator'], rec['stage']), []).append(rec)
+
+    for (gen_name, stage), recs in sorted(series.items()):
+        recs.sort(key=lambda rec: rec['vertices'])
+        for rec1, rec2 in zip(recs[:-1], recs[1:]):
+            if rec2['seconds'] < MIN_EXPONENT_TIME: continue
+            if rec2['vertices'] <= rec1['vertices']: continue
+
+            exponent = math.log(rec2['seconds'] / max(rec1['seconds'], 1e-9)) / \
+                math.log(float(rec2['vertices']) / rec1['vertices'])
+
+            exponents.append({
+                'generator': gen_name,
+                'stage': stage,
+                'from_vertices': rec1['vertices'],
+                'to_vertices': rec2['vertices'],
+                'exponent': exponent,
+            })
+
+    return exponents
+
+
+
+def run(generators, sizes, stages, repeat, budget, threshold, seed, log=sys.stderr):
+    records = []
+
+    for gen_name in generators:
+        generator = GENERATORS[gen_name]
+        over_budget = set()
+
+        for size in sizes:
+            outline, holes = generator(size, seed)
+            num_verts = len(outline) + sum(len(hole) for hole in holes)
+
+            for stage in stages:
+                rec = {'generator': gen_name, 'size': size, 'vertices': num_verts, 'stage': stage}
+                records.append(rec)
+
+                if stage in over_budget:
+                    rec['skipped'] = 'over time budget'
+                    continue
+
+                best = None
+                try:
+                    for attempt in range(repeat):
+                        with _Silence():
+                            seconds, counts = run_stage(stage, outline, holes, threshold)
+                        best = seconds if best is None else min(best, seconds)
+                        if seconds > budget: break
+
+                    rec['seconds'] = best
+                    rec.update(counts)
+
+                except Exception as ex:
+                    rec['error'] = "{}: {}".format(type(ex).__name__, ex)
+
+                if best is not None and best > budget:
+                    over_budget.add(stage)
+
+                log.write("{:>12} {:>7} {:>18} {}\n".format(gen_name, num_verts, stage,
+                    rec.get('error') or "{:.4f}s".format(best)))
+
+    return records
+
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--generators', nargs='+', default=sorted(GENERATORS), choices=sorted(GENERATORS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=DEFAULT_SIZES)
+    parser.add_argument('--stages', nargs='+', default=STAGES, choices=STAGES)
+    parser.add_argument('--repeat', type=int, default=3, help="runs per measurement, the best is recorded")
+    parser.add_argument('--budget', type=float, default=10.0,
+        help="seconds; a stage that takes longer is not run for larger sizes")
+    parser.add_argument('--threshold', type=float, default=10.0, help="spike threshold in degrees")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help="JSON file for the results (default: stdout)")
+    parser.add_argument('--max-exponent', type=float,
+        help="fail if any stage grows faster than n ** max_exponent")
+    args = parser.parse_args(argv)
+
+    records = run(args.generators, sorted(args.sizes), args.stages,
+        args.repeat, args.budget, args.threshold, args.seed)
+    exponents = growth_exponents(records)
+
+    results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'threshold': args.threshold,
+        'repeat': args.repeat,
+        'results': records,
+        'growth': exponents,
+    }
+
+    if args.out:
+        with open(args.out, 'w') as outf:
+            json.dump(results, outf, indent=2, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write("\n")
+
+    if args.max_exponent is not None:
+        too_steep = [exp for exp in exponents if exp['exponent'] > args.max_exponent]
+        for exp in too_steep:
+            sys.stderr.write("{generator} {stage}: {from_vertices} -> {to_vertices} vertices, "
+                "exponent {exponent:.2f}\n".format(**exp))
+        if too_steep: return 1
+
+    return 0
+
+
+
+if __name__ == "__main__":
+    sys.exit(main())
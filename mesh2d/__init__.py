@@ -1,5 +1,12 @@
 from .mesh2d import  Mesh2d, Polygon2d
 from .vector2 import Vector2, ZeroSegmentError
+from .vertex_buffer import VertexBuffer
+from .room_graph import RoomGraph
+from .room_locator import RoomLocator
+from .half_edge import HalfEdgeMesh
+from .build_observer import BuildObserver, TimingObserver
 from .matrix import Matrix, add_rotation_to_mtx
 from .boolean2d import bool_add, bool_subtract
+from .navmesh_io import save_navmesh, load_navmesh
+from .parallel import build_many
 from .utils import debug_draw_room
\ No newline at end of file
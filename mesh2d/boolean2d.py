@@ -63,6 +63,31 @@ def _get_pieces_outside_inside(this_poly, intersect_ids, other_poly):
 
 
 
+def _candidate_edge_pairs(A, B):
+    '''
+    Yields (A_edge, B_edge) pairs of border edges with overlapping bounding boxes.
+    Edges of the polygon with fewer edges are looked up in the edge index of the other one,
+    so the work depends on the number of edges near the overlap and not on the sizes of A and B.
+    '''
+    tol = Vector2.tolerance
+    swap = len(A.edge_index) > len(B.edge_index)
+    this, other = (B, A) if swap else (A, B)
+
+    xs = this.vertices.x
+    ys = this.vertices.y
+    for this_edge in Polygon2d.get_segments(chain([this.outline], this.holes)):
+        x1, x2 = xs[this_edge[0]], xs[this_edge[1]]
+        y1, y2 = ys[this_edge[0]], ys[this_edge[1]]
+
+        other_edges = other.edge_index.intersection(
+            min(x1, x2) - tol, min(y1, y2) - tol,
+            max(x1, x2) + tol, max(y1, y2) + tol)
+
+        for other_edge in other_edges:
+            yield (other_edge, this_edge) if swap else (this_edge, other_edge)
+
+
+
 def _add_intersections_to_polys(A, B):
     # List of vertices on edge intersections.
     intersection_verts = []
@@ -73,29 +98,26 @@ def _add_intersections_to_polys(A, B):
     A_new_vert_lists = {}
     B_new_vert_lists = {}
 
-    A_edges = Polygon2d.get_segments(chain([A.outline], A.holes))
-    B_edges = Polygon2d.get_segments(chain([B.outline], B.holes))
-
     # Find all intersections of A and B borders.
-    for A_edge in A_edges:
-        for B_edge in B_edges:
-            seg_x = Vector2.where_segments_cross_inclusive(
-                A.vertices[A_edge[0]],
-                A.vertices[A_edge[1]],
-                B.vertices[B_edge[0]],
-                B.vertices[B_edge[1]])
-            if seg_x is not None:
-                if A_edge not in A_new_vert_lists:
-                    A_new_vert_lists[A_edge] = []
+    # Only the edges with overlapping bounding boxes can intersect.
+    for A_edge, B_edge in _candidate_edge_pairs(A, B):
+        seg_x = Vector2.where_segments_cross_inclusive(
+            A.vertices[A_edge[0]],
+            A.vertices[A_edge[1]],
+            B.vertices[B_edge[0]],
+            B.vertices[B_edge[1]])
+        if seg_x is not None:
+            if A_edge not in A_new_vert_lists:
+                A_new_vert_lists[A_edge] = []
 
-                if B_edge not in B_new_vert_lists:
-                    B_new_vert_lists[B_edge] = []
+            if B_edge not in B_new_vert_lists:
+                B_new_vert_lists[B_edge] = []
 
-                inters_index = len(intersection_verts)
-                intersection_verts.append(seg_x)
+            inters_index = len(intersection_verts)
+            intersection_verts.append(seg_x)
 
-                A_new_vert_lists[A_edge].append(inters_index)
-                B_new_vert_lists[B_edge].append(inters_index)
+            A_new_vert_lists[A_edge].append(inters_index)
+            B_new_vert_lists[B_edge].append(inters_index)
 
 
     # This list will hold indices into A's vertex buffer of all intersection verts that will be added to A.
@@ -173,10 +195,10 @@ def _concat_border_pieces(A, B, A_open, B_open, idx_map, tail_to_tail):
             B_pos, B_piece = B_found
             B_piece_iter = reversed(B_piece[1:-1]) if tail_to_tail else iter(B_piece[1:-1])
 
+            B_xs = B.vertices.x
+            B_ys = B.vertices.y
             for B_idx in B_piece_iter:
-                B_vrt = B.vertices[B_idx]
-                new_loop.append(len(A.vertices))
-                A.vertices.append(B_vrt)
+                new_loop.append(A.vertices.append_xy(B_xs[B_idx], B_ys[B_idx]))
             new_loop.append(idx_map[B_piece[0]] if tail_to_tail else idx_map[B_piece[-1]])
 
             del B_open[B_pos]
@@ -263,9 +285,9 @@ def _bool_do(A, B, op, canvas=None):
     # Create new polygon for each loop that is CCW
     # CW loops represent holes
     for loop in A_closed:
-        verts = list(A.vertices[idx] for idx in loop[:-1])
+        verts = A.vertices.take(loop[:-1])
         # if CCW
-        if Vector2.poly_signed_area(verts) > 0:
+        if verts.signed_area() > 0:
             new_polys.append(Polygon2d(verts, range(len(verts))))
         else:
             new_holes.append(verts)
@@ -275,9 +297,9 @@ def _bool_do(A, B, op, canvas=None):
     # CW (CCW if subtracting) loops represent holes
     flip = -1 if op == -1 else 1
     for loop in B_closed:
-        verts = list(B.vertices[idx] for idx in loop[:-1])
+        verts = B.vertices.take(loop[:-1])
         # if CW
-        if flip * Vector2.poly_signed_area(verts) > 0:
+        if flip * verts.signed_area() > 0:
             new_polys.append(Polygon2d(verts, range(len(verts))))
         else:
             new_holes.append(verts)
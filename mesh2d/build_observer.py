@@ -0,0 +1,112 @@
+from timeit import default_timer
+
+
+
+class _Stage(object):
+    def __init__(self, observer, name):
+        self.observer = observer
+        self.name = name
+
+
+    def __enter__(self):
+        self.observer.stage_started(self.name)
+        self.start = default_timer()
+        return self
+
+
+    def __exit__(self, *args):
+        self.observer.stage_finished(self.name, default_timer() - self.start)
+
+
+
+class BuildObserver(object):
+    '''
+    Receives events from the navmesh build (Mesh2d.break_into_convex).
+    This base class ignores all of them; subclasses override the methods they need.
+
+    Stages (they can be nested):
+        break_into_convex  - the whole build
+        get_portals        - portal search, including find_spikes
+        find_spikes        - detection of reflex vertices
+        portal_endpoints   - ray casting for portal endpoints that are new vertices
+        split_rooms        - splitting the border into convex rooms
+        room_graph         - building the room graph and the room locator
+        merge_rooms        - merging rooms across inessential portals (optional)
+
+    Counts:
+        spikes, portal_candidates, ray_casts, new_vertices, portals, rooms,
+        bridged_holes, removed_rooms, removed_portals
+    '''
+
+    def stage(self, name):
+        '''
+        Context manager that reports the start and the end of a stage.
+        '''
+        return _Stage(self, name)
+
+
+    def stage_started(self, name):
+        pass
+
+
+    def stage_finished(self, name, seconds):
+        pass
+
+
+    def count(self, name, value):
+        pass
+
+
+    def room_processed(self, num_vertices, num_loops):
+        '''
+        Called for every room taken from the queue of the splitting loop:
+        'num_vertices' in all of its 'num_loops' loops (outline plus holes).
+        '''
+        pass
+
+
+
+class TimingObserver(BuildObserver):
+    '''
+    Collects stage durations and counts. When it is passed to several
+    builds, durations and counts are summed up.
+    '''
+
+    def __init__(self):
+        self.durations = {}
+        self.counts = {}
+        self.largest_room = 0
+        self.rooms_processed = 0
+
+
+    def stage_finished(self, name, seconds):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+
+    def count(self, name, value):
+        self.counts[name] = self.counts.get(name, 0) + value
+
+
+    def room_processed(self, num_vertices, num_loops):
+        self.rooms_processed += 1
+        self.largest_room = max(self.largest_room, num_vertices)
+
+
+    def report(self):
+        '''
+        All the collected data as a dict (for logging or JSON).
+        '''
+        return {
+            'durations': dict(self.durations),
+            'counts': dict(self.counts),
+            'largest_room': self.largest_room,
+            'rooms_processed': self.rooms_processed,
+        }
+
+
+    def __str__(self):
+        lines = list("{:<20} {:.4f}s".format(name, seconds) \
+            for name, seconds in sorted(self.durations.items(), key=lambda item: -item[1]))
+        lines += list("{:<20} {}".format(name, value) for name, value in sorted(self.counts.items()))
+        lines.append("{:<20} {}".format("largest_room", self.largest_room))
+        return "\n".join(lines)
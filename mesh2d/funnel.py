@@ -0,0 +1,168 @@
+'''
+Funnel algorithm ("string pulling"): the shortest path from start to goal
+through a sequence of portals. Works on plain (x, y) tuples, so that
+smoothing a path does not create a Vector2 per waypoint.
+'''
+
+
+def _cross(apex, pt1, pt2):
+    '''
+    Cross product of (pt1 - apex) and (pt2 - apex).
+    Positive if pt2 is to the left of the apex -> pt1 direction.
+    '''
+    return (pt1[0] - apex[0]) * (pt2[1] - apex[1]) - (pt1[1] - apex[1]) * (pt2[0] - apex[0])
+
+
+
+def string_pull(start, goal, lefts, rights):
+    '''
+    'lefts' and 'rights' are the portal endpoints that lie on the left and on
+    the right hand side when walking from 'start' to 'goal' (in portal order).
+    Returns the list of waypoints (x, y), starting with 'start' and ending with 'goal'.
+    '''
+    # the start and the goal are portals of zero width
+    portal_lefts = [start] + list(lefts) + [goal]
+    portal_rights = [start] + list(rights) + [goal]
+    num_portals = len(portal_lefts)
+
+    waypoints = [start]
+
+    apex = left = right = start
+    apex_pos = left_pos = right_pos = 0
+
+    pos = 1
+    while pos < num_portals:
+        new_left = portal_lefts[pos]
+        new_right = portal_rights[pos]
+
+        # try to narrow the funnel from the right
+        if _cross(apex, right, new_right) >= 0.0:
+            if apex == right or _cross(apex, left, new_right) < 0.0:
+                right = new_right
+                right_pos = pos
+            else:
+                # right side crossed the left one: left point becomes the new apex
+                waypoints.append(left)
+                apex = right = left
+                apex_pos = right_pos = left_pos
+                pos = apex_pos + 1
+                continue
+
+        # try to narrow the funnel from the left
+        if _cross(apex, left, new_left) <= 0.0:
+            if apex == left or _cross(apex, right, new_left) > 0.0:
+                left = new_left
+                left_pos = pos
+            else:
+                # left side crossed the right one: right point becomes the new apex
+                waypoints.append(right)
+                apex = left = right
+                apex_pos = left_pos = right_pos
+                pos = apex_pos + 1
+                continue
+
+        pos += 1
+
+    if waypoints[-1] != goal:
+        waypoints.append(goal)
+
+    return waypoints
+
+
+
+def _inside_triangle(pt1, pt2, pt3, pt):
+    return _cross(pt1, pt2, pt) >= 0.0 and _cross(pt2, pt3, pt) >= 0.0 and _cross(pt3, pt1, pt) >= 0.0
+
+
+
+def triangulate(points):
+    '''
+    Ear clipping triangulation of a simple polygon given as a CCW list of (x, y) points.
+    Returns a list of triangles, CCW triples of positions in 'points'.
+    Takes O(k^2) for k points, so it is meant for single rooms.
+    '''
+    remaining = list(range(len(points)))
+    triangles = []
+
+    while len(remaining) > 3:
+        num = len(remaining)
+        ear = None
+        flattest = None
+        for pos in range(num):
+            prev = remaining[pos - 1]
+            cur = remaining[pos]
+            nxt = remaining[(pos + 1) % num]
+            turn = _cross(points[prev], points[cur], points[nxt])
+
+            # collinear corners are clipped last, if there is no real ear
+            if flattest is None or turn > flattest[0]: flattest = (turn, pos)
+            if turn <= 0.0: continue
+
+            if not any(_inside_triangle(points[prev], points[cur], points[nxt], points[other]) \
+                    for other in remaining if other not in (prev, cur, nxt) and \
+                        points[other] not in (points[prev], points[cur], points[nxt])):
+                ear = pos
+                break
+
+        if ear is None: ear = flattest[1]
+        triangles.append((remaining[ear - 1], remaining[ear], remaining[(ear + 1) % num]))
+        del remaining[ear]
+
+    triangles.append(tuple(remaining))
+    return triangles
+
+
+
+def triangle_portals(points, triangles, enter, leave):
+    '''
+    Diagonals of a triangulated room crossed on the way through it, as in string_pull:
+    a list of (left, right) pairs of positions in 'points'.
+    'enter' and 'leave' are either a room edge, given as the position of its first
+    point, or an (x, y) point inside the room (the start or the goal of the path).
+    '''
+    # directed edge (position, position) -> triangle
+    edge_triangles = {}
+    for tri_id, (pos1, pos2, pos3) in enumerate(triangles):
+        edge_triangles[(pos1, pos2)] = tri_id
+        edge_triangles[(pos2, pos3)] = tri_id
+        edge_triangles[(pos3, pos1)] = tri_id
+
+    num = len(points)
+
+    def find_triangle(where):
+        if not isinstance(where, tuple):
+            return edge_triangles[(where, (where + 1) % num)]
+
+        # the triangle that the point is furthest inside of
+        # (the point can be slightly out of all of them)
+        def depth(tri_id):
+            pos1, pos2, pos3 = triangles[tri_id]
+            return min(_cross(points[pos1], points[pos2], where),
+                _cross(points[pos2], points[pos3], where),
+                _cross(points[pos3], points[pos1], where))
+        return max(range(len(triangles)), key=depth)
+
+    first = find_triangle(enter)
+    last = find_triangle(leave)
+
+    # the triangles form a tree: walk it breadth first from the first triangle
+    came_from = {first: None}
+    queue = [first]
+    for tri_id in queue:
+        if tri_id == last: break
+        tri = triangles[tri_id]
+        for pos in range(3):
+            start = tri[pos]
+            end = tri[(pos + 1) % 3]
+            neighbour = edge_triangles.get((end, start))
+            if neighbour is None or neighbour in came_from: continue
+            came_from[neighbour] = (tri_id, start, end)
+            queue.append(neighbour)
+
+    # leaving a triangle through its CCW edge (start, end): 'end' is on the left
+    diagonals = []
+    tri_id = last
+    while came_from.get(tri_id) is not None:
+        tri_id, start, end = came_from[tri_id]
+        diagonals.append((end, start))
+    return diagonals[::-1]
@@ -0,0 +1,421 @@
+import heapq
+
+from .vector2 import Vector2
+
+
+
+class HalfEdgeMesh(object):
+    '''
+    Half-edge (doubly connected edge list) topology of the rooms of a Mesh2d.
+
+    Every room edge is a half-edge going CCW around its room. The half-edges
+    of room 'r' are offsets[r] ... offsets[r+1]-1, in the order of the room
+    loop. A half-edge on a portal has a twin: the half-edge of the neighbour
+    room that goes along the same portal the other way. A half-edge on a
+    wall has no twin.
+
+    Half-edges are integers. Their attributes are stored in lists, so every
+    step of a walk over the mesh is O(1).
+    '''
+
+    def __init__(self, offsets, origins, twins, portal_ids, xs, ys):
+        self.offsets = offsets
+
+        # half-edge -> start vertex, twin half-edge (-1 on walls), portal index (-1 on walls)
+        self._origin = origins
+        self._twin = twins
+        self._portal = portal_ids
+
+        # vertex coordinates, indexed by vertex index
+        self._xs = xs
+        self._ys = ys
+
+        num_edges = len(origins)
+        self._face = [0] * num_edges
+        self._next = [0] * num_edges
+        self._prev = [0] * num_edges
+
+        for room in range(len(offsets) - 1):
+            start = offsets[room]
+            end = offsets[room + 1]
+            for edge in range(start, end):
+                self._face[edge] = room
+                self._next[edge] = edge + 1 if edge + 1 < end else start
+                self._prev[edge] = edge - 1 if edge > start else end - 1
+
+        # half-edge for each directed edge (start vertex, end vertex)
+        self._edge_ids = dict(((origins[edge], origins[self._next[edge]]), edge) \
+            for edge in range(num_edges))
+
+        # rooms that have no reflex corners
+        self._convex = [True] * (len(offsets) - 1)
+        for edge in range(num_edges):
+            x1 = xs[origins[self._prev[edge]]]
+            y1 = ys[origins[self._prev[edge]]]
+            x2 = xs[origins[edge]]
+            y2 = ys[origins[edge]]
+            x3 = xs[origins[self._next[edge]]]
+            y3 = ys[origins[self._next[edge]]]
+            if (x2 - x1) * (y3 - y2) - (y2 - y1) * (x3 - x2) < -Vector2.tolerance:
+                self._convex[self._face[edge]] = False
+
+        # one outgoing half-edge per vertex, a wall one if there is such:
+        # walking around a vertex starts from it
+        self._vertex_edge = {}
+        for edge in range(num_edges):
+            vid = origins[edge]
+            if vid not in self._vertex_edge or twins[edge] == -1:
+                self._vertex_edge[vid] = edge
+
+
+
+    @staticmethod
+    def from_rooms(rooms, portals, vertices):
+        '''
+        Build the half-edges from room index loops (CCW) and portals given as pairs of vertex indices.
+        '''
+        offsets = [0]
+        origins = []
+        for room in rooms:
+            origins.extend(room)
+            offsets.append(len(origins))
+
+        # directed edge -> half-edge
+        edge_ids = {}
+        for room_id in range(len(rooms)):
+            start = offsets[room_id]
+            end = offsets[room_id + 1]
+            for edge in range(start, end):
+                nxt = edge + 1 if edge + 1 < end else start
+                edge_ids[(origins[edge], origins[nxt])] = edge
+
+        twins = [-1] * len(origins)
+        portal_ids = [-1] * len(origins)
+        for portal_id, (start_i, end_i) in enumerate(portals):
+            edge1 = edge_ids.get((start_i, end_i))
+            edge2 = edge_ids.get((end_i, start_i))
+            if edge1 is None or edge2 is None: continue
+
+            twins[edge1] = edge2
+            twins[edge2] = edge1
+            portal_ids[edge1] = portal_id
+            portal_ids[edge2] = portal_id
+
+        return HalfEdgeMesh(offsets, origins, twins, portal_ids,
+            vertices.x.tolist(), vertices.y.tolist())
+
+
+
+    @property
+    def num_rooms(self):
+        return len(self.offsets) - 1
+
+
+    @property
+    def num_edges(self):
+        return len(self._origin)
+
+
+
+    def origin(self, edge):
+        return self._origin[edge]
+
+
+    def dest(self, edge):
+        return self._origin[self._next[edge]]
+
+
+    def face(self, edge):
+        return self._face[edge]
+
+
+    def next(self, edge):
+        return self._next[edge]
+
+
+    def prev(self, edge):
+        return self._prev[edge]
+
+
+    def twin(self, edge):
+        '''
+        Half-edge on the other side of a portal, None for walls.
+        '''
+        twin = self._twin[edge]
+        return None if twin == -1 else twin
+
+
+    def portal(self, edge):
+        '''
+        Index of the portal (in Mesh2d.portals) of the half-edge, None for walls.
+        '''
+        portal_id = self._portal[edge]
+        return None if portal_id == -1 else portal_id
+
+
+    def is_wall(self, edge):
+        return self._twin[edge] == -1
+
+
+
+    def find_edge(self, start_i, end_i):
+        '''
+        Half-edge going from vertex start_i to vertex end_i, or None.
+        '''
+        return self._edge_ids.get((start_i, end_i))
+
+
+
+    def room_edges(self, room):
+        return range(self.offsets[room], self.offsets[room + 1])
+
+
+
+    def room_neighbours(self, room):
+        '''
+        Rooms that share a portal with the given room.
+        '''
+        twin = self._twin
+        face = self._face
+        return list(face[twin[edge]] for edge in self.room_edges(room) if twin[edge] != -1)
+
+
+
+    def edge_faces(self, start_i, end_i):
+        '''
+        Rooms on the left and on the right of the edge going from vertex start_i to vertex end_i.
+        None on the side where there is no room (outside of the mesh).
+        '''
+        left = self._edge_ids.get((start_i, end_i))
+        right = self._edge_ids.get((end_i, start_i))
+        return (None if left is None else self._face[left],
+            None if right is None else self._face[right])
+
+
+
+    def vertex_edges(self, vid):
+        '''
+        Outgoing half-edges of the vertex in CCW order.
+        '''
+        start = self._vertex_edge.get(vid)
+        if start is None: return []
+
+        edges = [start]
+        edge = self._twin[self._prev[start]]
+        while edge != -1 and edge != start:
+            edges.append(edge)
+            edge = self._twin[self._prev[edge]]
+        return edges
+
+
+
+    def vertex_rooms(self, vid):
+        '''
+        Rooms that have the vertex as a corner.
+        '''
+        return list(self._face[edge] for edge in self.vertex_edges(vid))
+
+
+
+    def vertex_portals(self, vid):
+        '''
+        Portals that start or end at the vertex.
+        '''
+        portal = self._portal
+        return list(portal[edge] for edge in self.vertex_edges(vid) if portal[edge] != -1)
+
+
+
+    def next_wall(self, edge):
+        '''
+        For a wall half-edge, the next wall half-edge along the same border loop.
+        '''
+        edge = self._next[edge]
+        while self._twin[edge] != -1:
+            edge = self._next[self._twin[edge]]
+        return edge
+
+
+
+    def border_loop(self, edge):
+        '''
+        Vertices of the border loop that contains the given wall half-edge.
+        '''
+        loop = []
+        cur = edge
+        while True:
+            loop.append(self._origin[cur])
+            cur = self.next_wall(cur)
+            if cur == edge: return loop
+
+
+
+    def _exit_edge(self, room, x, y, tolerance):
+        '''
+        Edge of the convex room that the point is furthest outside of, or None if the point is inside.
+        '''
+        xs = self._xs
+        ys = self._ys
+        origin = self._origin
+        nxt = self._next
+
+        exit_edge = None
+        exit_cross = -tolerance
+        for edge in self.room_edges(room):
+            x1 = xs[origin[edge]]
+            y1 = ys[origin[edge]]
+            x2 = xs[origin[nxt[edge]]]
+            y2 = ys[origin[nxt[edge]]]
+            cross = (x2 - x1) * (y - y1) - (y2 - y1) * (x - x1)
+            if cross < exit_cross:
+                exit_cross = cross
+                exit_edge = edge
+
+        return exit_edge
+
+
+
+    def _contains(self, room, x, y, tolerance):
+        '''
+        Check if the point is inside the room or on its border.
+        Rooms with reflex corners are tested by the number of crossings of a horizontal ray.
+        '''
+        if self._convex[room]: return self._exit_edge(room, x, y, tolerance) is None
+
+        xs = self._xs
+        ys = self._ys
+        origin = self._origin
+        nxt = self._next
+
+        inside = False
+        for edge in self.room_edges(room):
+            if self._edge_dist(edge, x, y) <= tolerance: return True
+
+            y1 = ys[origin[edge]]
+            y2 = ys[origin[nxt[edge]]]
+            if (y1 > y) != (y2 > y):
+                x1 = xs[origin[edge]]
+                x2 = xs[origin[nxt[edge]]]
+                if x < x1 + (y - y1) * (x2 - x1) / (y2 - y1): inside = not inside
+
+        return inside
+
+
+
+    def _edge_dist(self, edge, x, y):
+        '''
+        Distance from point (x, y) to the edge.
+        '''
+        x1 = self._xs[self._origin[edge]]
+        y1 = self._ys[self._origin[edge]]
+        x2 = self._xs[self._origin[self._next[edge]]]
+        y2 = self._ys[self._origin[self._next[edge]]]
+
+        dx = x2 - x1
+        dy = y2 - y1
+        len_sq = dx * dx + dy * dy
+        along = ((x - x1) * dx + (y - y1) * dy) / len_sq if len_sq > 0. else 0.
+        along = min(max(along, 0.), 1.)
+        return ((x - x1 - along * dx) ** 2 + (y - y1 - along * dy) ** 2) ** .5
+
+
+
+    def locate_walk(self, x, y, start_room=0, tolerance=Vector2.tolerance):
+        '''
+        Find the room that contains point (x, y) by walking from room to room
+        through the portals, starting at 'start_room'. The rooms behind the portals
+        closest to the point are visited first, so the walk goes straight towards
+        the point and only turns aside where a wall (or a hole) is in the way.
+        Returns None if no room that can be reached from 'start_room' contains the point:
+        the point is outside of the mesh. Then all the reachable rooms are visited.
+        '''
+        twin = self._twin
+        face = self._face
+
+        visited = set([start_room])
+        queue = [(0., start_room)]
+        while len(queue) > 0:
+            _, room = heapq.heappop(queue)
+            if self._contains(room, x, y, tolerance): return room
+
+            for edge in self.room_edges(room):
+                if twin[edge] == -1: continue
+                neighbour = face[twin[edge]]
+                if neighbour in visited: continue
+
+                visited.add(neighbour)
+                heapq.heappush(queue, (self._edge_dist(edge, x, y), neighbour))
+
+        return None
+
+
+
+    def _segment_exit(self, room, x1, y1, x2, y2, min_t, tolerance):
+        '''
+        Edge through which the segment from (x1, y1) to (x2, y2) leaves the room
+        after parameter 'min_t' (along the segment), and the parameter where it does,
+        or (None, min_t) if the end of the segment is inside the room.
+        At a corner the segment leaves through two edges at once: a portal is taken then.
+        '''
+        xs = self._xs
+        ys = self._ys
+        origin = self._origin
+        nxt = self._next
+        twin = self._twin
+
+        dx = x2 - x1
+        dy = y2 - y1
+        length = (dx * dx + dy * dy) ** .5
+        t_tolerance = tolerance / length if length > tolerance else tolerance
+
+        exit_edge = None
+        exit_t = None
+        for edge in self.room_edges(room):
+            ex1 = xs[origin[edge]]
+            ey1 = ys[origin[edge]]
+            ex2 = xs[origin[nxt[edge]]]
+            ey2 = ys[origin[nxt[edge]]]
+            side2 = (ex2 - ex1) * (y2 - ey1) - (ey2 - ey1) * (x2 - ex1)
+            if side2 >= -tolerance: continue
+
+            # the segment goes out over the line of the edge...
+            side1 = (ex2 - ex1) * (y1 - ey1) - (ey2 - ey1) * (x1 - ex1)
+            if side1 <= side2: continue
+            t = side1 / (side1 - side2)
+            if t < min_t - t_tolerance: continue
+            if exit_edge is not None and t > exit_t + t_tolerance: continue
+
+            # ...at a point of the edge (edges of a room can be on one line)
+            edge_len = ((ex2 - ex1) ** 2 + (ey2 - ey1) ** 2) ** .5
+            along = ((x1 + t * dx - ex1) * (ex2 - ex1) + (y1 + t * dy - ey1) * (ey2 - ey1)) / edge_len
+            if along < -tolerance or along > edge_len + tolerance: continue
+
+            if exit_edge is None or t < exit_t - t_tolerance or \
+                    (twin[exit_edge] == -1 and twin[edge] != -1):
+                exit_edge = edge
+                exit_t = t
+
+        if exit_edge is None: return None, min_t
+        return exit_edge, max(exit_t, min_t)
+
+
+
+    def walk_segment(self, start_room, x1, y1, x2, y2, tolerance=Vector2.tolerance):
+        '''
+        Walk from room to room along the segment from (x1, y1) to (x2, y2), starting
+        at 'start_room' (the room that contains (x1, y1)) and crossing the portals on the way.
+        Only the rooms that the segment goes through are visited, each in O(k) for a room with k corners.
+        Returns the room that contains (x2, y2), or None if the segment leaves the rooms
+        through a wall (or the walk runs in a cycle).
+        '''
+        room = start_room
+        min_t = 0.
+        for step in range(self.num_rooms):
+            edge, min_t = self._segment_exit(room, x1, y1, x2, y2, min_t, tolerance)
+            if edge is None: return room
+
+            twin = self._twin[edge]
+            if twin == -1: return None
+            room = self._face[twin]
+
+        return None
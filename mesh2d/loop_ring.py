@@ -0,0 +1,336 @@
+class LoopRing(object):
+    '''
+    Closed loops of vertex indices (polygon outline and holes) stored as doubly linked rings.
+
+    The links and the loop of every vertex are kept in lists indexed by the vertex index,
+    so finding the loop of a vertex, checking an edge and inserting a vertex into an edge
+    are O(1). Every vertex can be in one loop only.
+
+    List views of the loops (and the positions of the vertices in them) are built
+    on demand and cached until the loop changes. They must not be modified.
+
+    A ring made with from_arrays keeps the given index arrays and only links
+    its loops when it is first walked or changed.
+    '''
+
+    def __init__(self, loops=()):
+        # vertex index -> next / previous vertex in its loop, -1 if the vertex is not in a loop
+        self._next = []
+        self._prev = []
+
+        # vertex index -> loop id, -1 if the vertex is not in a loop
+        self._loop = []
+
+        # loop id -> first vertex of the list view, number of vertices, cached list view,
+        # cached dict: vertex index -> position in the list view
+        self._heads = []
+        self._sizes = []
+        self._views = []
+        self._positions = []
+
+        # first loop id -> cached list of the list views from that loop on
+        self._tails = {}
+
+        # loop id -> index array, until the links are built (see from_arrays)
+        self._arrays = None
+
+        for loop in loops:
+            self.add_loop(loop)
+
+
+
+    @staticmethod
+    def from_arrays(loops):
+        '''
+        Make a ring of loops given as numpy index arrays, without checking them.
+        The arrays are kept as they are: list views are made from them when they are
+        asked for, and the links are built on the first walk or change of the ring.
+        '''
+        ring = LoopRing()
+        ring._arrays = list(loops)
+        ring._heads = [None] * len(ring._arrays)
+        ring._sizes = list(len(loop) for loop in ring._arrays)
+        ring._views = [None] * len(ring._arrays)
+        ring._positions = [None] * len(ring._arrays)
+        return ring
+
+
+
+    def _build_links(self):
+        views = list(self.as_list(loop_id) for loop_id in range(self.num_loops))
+        self._arrays = None
+
+        if len(views) > 0: self._reserve(max(max(view) for view in views))
+        for loop_id, view in enumerate(views):
+            self._link(loop_id, view)
+
+
+
+    def _reserve(self, vid):
+        missing = vid + 1 - len(self._next)
+        if missing > 0:
+            self._next.extend([-1] * missing)
+            self._prev.extend([-1] * missing)
+            self._loop.extend([-1] * missing)
+
+
+
+    def _check(self, indices, loop_id=-1):
+        '''
+        Check that the vertices can form a loop: only vertices that are
+        not in any loop (or are in loop 'loop_id') can be used, each one once.
+        '''
+        if len(indices) < 3:
+            raise ValueError("LoopRing: a loop needs at least 3 vertices")
+        if len(set(indices)) != len(indices):
+            raise ValueError("LoopRing: a vertex appears in the loop more than once")
+
+        self._reserve(max(indices))
+        for vid in indices:
+            if self._loop[vid] != -1 and self._loop[vid] != loop_id:
+                raise ValueError("LoopRing: vertex {} is already in a loop".format(vid))
+
+
+
+    def _link(self, loop_id, indices):
+        for vid in indices:
+            self._loop[vid] = loop_id
+
+        prev = indices[-1]
+        for vid in indices:
+            self._next[prev] = vid
+            self._prev[vid] = prev
+            prev = vid
+
+        self._touch(loop_id)
+        self._heads[loop_id] = indices[0]
+        self._sizes[loop_id] = len(indices)
+        self._views[loop_id] = list(indices)
+
+
+
+    def _touch(self, loop_id):
+        '''
+        Drop the cached views of a loop that has changed.
+        '''
+        self._views[loop_id] = None
+        self._positions[loop_id] = None
+        self._tails = {}
+
+
+
+    def _unlink(self, loop_id):
+        for vid in self.as_list(loop_id):
+            self._next[vid] = -1
+            self._prev[vid] = -1
+            self._loop[vid] = -1
+
+
+
+    @property
+    def num_loops(self):
+        return len(self._heads)
+
+
+
+    def add_loop(self, indices):
+        '''
+        Add a new loop, return its id.
+        '''
+        if self._arrays is not None: self._build_links()
+        indices = list(indices)
+        self._check(indices)
+
+        loop_id = len(self._heads)
+        self._heads.append(None)
+        self._sizes.append(0)
+        self._views.append(None)
+        self._positions.append(None)
+        self._link(loop_id, indices)
+
+        return loop_id
+
+
+
+    def set_loop(self, loop_id, indices):
+        '''
+        Replace the vertices of the given loop.
+        '''
+        if self._arrays is not None: self._build_links()
+        indices = list(indices)
+        self._check(indices, loop_id)
+
+        self._unlink(loop_id)
+        self._link(loop_id, indices)
+
+
+
+    def remove_loop(self, loop_id):
+        '''
+        Remove the given loop. Ids of the loops after it are shifted down by one.
+        '''
+        if self._arrays is not None: self._build_links()
+        self._unlink(loop_id)
+        del self._heads[loop_id]
+        del self._sizes[loop_id]
+        del self._views[loop_id]
+        del self._positions[loop_id]
+        self._tails = {}
+
+        for later_id in range(loop_id, len(self._heads)):
+            for vid in self.as_list(later_id):
+                self._loop[vid] = later_id
+
+
+
+    def loop_of(self, vid):
+        '''
+        Id of the loop that contains the vertex, or None.
+        '''
+        if self._arrays is not None: self._build_links()
+        if vid >= len(self._loop) or self._loop[vid] == -1: return None
+        return self._loop[vid]
+
+
+
+    def next(self, vid):
+        if self._arrays is not None: self._build_links()
+        return self._next[vid]
+
+
+
+    def prev(self, vid):
+        if self._arrays is not None: self._build_links()
+        return self._prev[vid]
+
+
+
+    def size(self, loop_id):
+        return self._sizes[loop_id]
+
+
+
+    def has_edge(self, vid1, vid2):
+        '''
+        Check if the two vertices are neighbours in a loop (in any order).
+        '''
+        if self.loop_of(vid1) is None: return False
+        return self._next[vid1] == vid2 or self._prev[vid1] == vid2
+
+
+
+    def insert(self, vid1, vid2, new_vid):
+        '''
+        Insert vertex 'new_vid' between the neighbour vertices 'vid1' and 'vid2'.
+        '''
+        if self._arrays is not None: self._build_links()
+        if not self.has_edge(vid1, vid2):
+            raise ValueError("LoopRing: ({}, {}) is not an edge".format(vid1, vid2))
+
+        # make vid1 -> vid2 the direction of the loop
+        if self._next[vid1] != vid2: vid1, vid2 = vid2, vid1
+
+        self._reserve(new_vid)
+        if self._loop[new_vid] != -1:
+            raise ValueError("LoopRing: vertex {} is already in a loop".format(new_vid))
+
+        loop_id = self._loop[vid1]
+        self._loop[new_vid] = loop_id
+        self._next[vid1] = new_vid
+        self._prev[new_vid] = vid1
+        self._next[new_vid] = vid2
+        self._prev[vid2] = new_vid
+
+        self._sizes[loop_id] += 1
+        self._touch(loop_id)
+
+
+
+    def reverse_between(self, vid1, vid2):
+        '''
+        Reverse the order of the vertices strictly between 'vid1' and 'vid2' (going along
+        the loop from vid1), or of the ones between vid2 and vid1 if there are fewer of them:
+        both give the same loop, in opposite directions.
+        Takes O(k) for k reversed vertices.
+        '''
+        if self._arrays is not None: self._build_links()
+        loop_id = self.loop_of(vid1)
+        if loop_id is None or vid1 == vid2 or self.loop_of(vid2) != loop_id:
+            raise ValueError("LoopRing: {} and {} are not two vertices of one loop".format(vid1, vid2))
+
+        nxt = self._next
+        prv = self._prev
+
+        # walk both parts at once until the shorter one ends
+        vid = nxt[vid1]
+        other = nxt[vid2]
+        while vid != vid2 and other != vid1:
+            vid = nxt[vid]
+            other = nxt[other]
+        if vid != vid2: vid1, vid2 = vid2, vid1
+
+        first = nxt[vid1]
+        last = prv[vid2]
+        if first == vid2: return
+
+        vid = first
+        while True:
+            following = nxt[vid]
+            nxt[vid], prv[vid] = prv[vid], following
+            if vid == last: break
+            vid = following
+
+        nxt[vid1] = last
+        prv[last] = vid1
+        nxt[first] = vid2
+        prv[vid2] = first
+        self._touch(loop_id)
+
+
+
+    def as_list(self, loop_id):
+        '''
+        Vertices of the loop in order, as a list (cached, do not modify it).
+        '''
+        view = self._views[loop_id]
+        if view is None and self._arrays is not None:
+            view = self._arrays[loop_id].tolist()
+            self._views[loop_id] = view
+        elif view is None:
+            nxt = self._next
+            vid = self._heads[loop_id]
+            view = []
+            for step in range(self._sizes[loop_id]):
+                view.append(vid)
+                vid = nxt[vid]
+            self._views[loop_id] = view
+        return view
+
+
+
+    def as_lists(self, first_id=0):
+        '''
+        List views of the loops from 'first_id' on, as a list (cached, do not modify it).
+        '''
+        views = self._tails.get(first_id)
+        if views is None:
+            views = list(self.as_list(loop_id) for loop_id in range(first_id, self.num_loops))
+            self._tails[first_id] = views
+        return views
+
+
+
+    def position(self, vid):
+        '''
+        Position of the vertex in the list view of its loop.
+        The positions are indexed when the first one is asked for, until the loop changes.
+        '''
+        loop_id = self.loop_of(vid)
+        if loop_id is None:
+            raise ValueError("LoopRing: vertex {} is not in a loop".format(vid))
+
+        positions = self._positions[loop_id]
+        if positions is None:
+            positions = dict((idx, pos) for pos, idx in enumerate(self.as_list(loop_id)))
+            self._positions[loop_id] = positions
+        return positions[vid]
@@ -1,13 +1,23 @@
 import math
 import random
+import bisect
+import numpy as np
 
 from collections import deque
 from operator import itemgetter
 from itertools import chain
-from copy import deepcopy
 from rtree import index
 
 from .vector2 import Vector2, ZeroSegmentError
+from .vertex_buffer import VertexBuffer
+from .spatial import SegmentIndex, PortalIndex
+from .sweep import overlapping_segment_pairs
+from .room_graph import RoomGraph
+from .room_locator import RoomLocator
+from .build_observer import BuildObserver
+from .loop_ring import LoopRing
+from .half_edge import HalfEdgeMesh
+from .funnel import string_pull, triangulate, triangle_portals
 from .utils import debug_draw_room
 
 
@@ -39,33 +49,102 @@ def chain_index_buffers(loops):
 class Polygon2d(object):
     def __init__(self, vertices, indices):
 
+        # copy vertices into a new buffer
+        self.vertices = VertexBuffer(vertices)
+
         # need to find self-intersections
-        if Polygon2d.check_ccw(vertices, indices):
-            self.outline = indices[:]
+        if Polygon2d.check_ccw(self.vertices, indices):
+            outline = indices[:]
         else:
-            self.outline = indices[::-1]
-
-        self.vertices = vertices[:]
+            outline = indices[::-1]
 
-        self.rti = index.Index()
-        self.rti.interleaved = True
+        # border loops: the outline is loop 0, holes are the loops after it
+        self._loops = LoopRing([outline])
 
-        # insert vertices into spatial index
-        for vid in self.outline:
-            vert = self.vertices[vid]
-            self.rti.insert(vid, (vert.x, vert.y, vert.x, vert.y))
+        # spatial indices of border vertices and edges are built on first use
+        self._rti = None
+        self._edge_index = None
 
         # resolve self-intersections (sinters)
         self._resolve_sinters()
 
-        self.holes = []
+
+
+    @staticmethod
+    def from_loops(vertices, outline, holes=()):
+        '''
+        Wrap a vertex buffer and the loops of a valid polygon (CCW outline, CW holes,
+        no self-intersections) without the checks done by the constructor.
+        '''
+        poly = Polygon2d.__new__(Polygon2d)
+        poly.vertices = vertices
+        poly._loops = LoopRing(chain([outline], holes))
+        poly._rti = None
+        poly._edge_index = None
+        return poly
+
+
+
+    @staticmethod
+    def from_loop_arrays(vertices, outline, holes=()):
+        '''
+        Same as from_loops, for loops given as numpy index arrays. The arrays are kept
+        and the loops are only turned into lists and linked when they are first used.
+        '''
+        poly = Polygon2d.__new__(Polygon2d)
+        poly.vertices = vertices
+        poly._loops = LoopRing.from_arrays(chain([outline], holes))
+        poly._rti = None
+        poly._edge_index = None
+        return poly
+
+
+
+    def __getstate__(self):
+        '''
+        rtree indices cannot be pickled: they are left out and
+        rebuilt on first use after unpickling.
+        '''
+        state = self.__dict__.copy()
+        state['_rti'] = None
+        state['_edge_index'] = None
+        return state
+
+
+
+    @property
+    def outline(self):
+        '''
+        Index buffer of the outline (CCW). This is a cached view, it must not be modified.
+        '''
+        return self._loops.as_list(0)
+
+
+    @outline.setter
+    def outline(self, indices):
+        self._loops.set_loop(0, indices)
+
+
+
+    @property
+    def holes(self):
+        '''
+        List of index buffers of the holes (CW). The list and the index buffers in it
+        are cached views, they must not be modified.
+        '''
+        return self._loops.as_lists(1)
+
+
+    @holes.setter
+    def holes(self, holes):
+        self._loops = LoopRing(chain([self.outline], holes))
 
 
 
     def copy(self):
         res = Polygon2d(self.vertices, self.outline)
         for hole in self.holes:
-            res.add_hole((self.vertices[idx] for idx in hole))
+            res.add_hole(self.vertices.take(hole))
         return res
 
 
@@ -84,33 +163,167 @@ class Polygon2d(object):
 
 
     def get_adjacent_edges(self, index):
-        vert_loc = self.outline.index(index)
-        prev_idx = self.outline[(vert_loc - 1)]
-        next_idx = self.outline[(vert_loc + 1) % len(self.outline)]
+        if self._loops.loop_of(index) is None:
+            raise ValueError("{} is not a border vertex".format(index))
+        prev_idx = self._loops.prev(index)
+        next_idx = self._loops.next(index)
         return (prev_idx, index), (index, next_idx)
 
 
 
+    @property
+    def rti(self):
+        '''
+        Spatial index of border vertices.
+        '''
+        if self._rti is None:
+            self._build_vertex_index()
+        return self._rti
+
+
+
+    @property
+    def edge_index(self):
+        '''
+        Spatial index of border edges.
+        '''
+        if self._edge_index is None:
+            self._build_edge_index()
+        return self._edge_index
+
+
+
     def find_verts_in_bbox(self, vect_min, vect_max):
         return self.rti.intersection((vect_min.x, vect_min.y, vect_max.x, vect_max.y))
 
 
 
+    def nearest_verts(self, x, y, batch=8):
+        '''
+        Generator of (index, distance) pairs of border vertices sorted by the distance from (x, y).
+        The R-tree is asked for more and more nearest vertices, so stopping early is cheap.
+        '''
+        xs = self.vertices.x
+        ys = self.vertices.y
+        num_verts = sum(self._loops.size(loop_id) for loop_id in range(self._loops.num_loops))
+
+        seen = set()
+        num = batch
+        while True:
+            # with ties, the R-tree can return more than 'num' items
+            found = list(self.rti.nearest((x, y, x, y), num))
+
+            for vid in found:
+                if vid in seen: continue
+                seen.add(vid)
+                dx = xs[vid] - x
+                dy = ys[vid] - y
+                yield vid, math.sqrt(dx*dx + dy*dy)
+
+            if len(found) < num or len(seen) >= num_verts: return
+            num *= 2
+
+
+
+    def _border_position(self, vid):
+        '''
+        Position of a border vertex in the chain of the outline and the holes.
+        '''
+        return self._loops.loop_of(vid), self._loops.position(vid)
+
+
+
+    def find_edges_in_bbox(self, vect_min, vect_max):
+        '''
+        Returns border edges (index pairs) whose bounding boxes intersect the given box.
+        '''
+        return self.edge_index.intersection(vect_min.x, vect_min.y, vect_max.x, vect_max.y)
+
+
+
+    def _build_vertex_index(self):
+        xs = self.vertices.x
+        ys = self.vertices.y
+
+        self._rti = index.Index()
+        self._rti.interleaved = True
+        for vid in chain(self.outline, *self.holes):
+            self._rti.insert(vid, (xs[vid], ys[vid], xs[vid], ys[vid]))
+
+
+
+    def _index_vertex(self, vid):
+        if self._rti is None: return
+        vert = self.vertices[vid]
+        self._rti.insert(vid, (vert.x, vert.y, vert.x, vert.y))
+
+
+
+    def _build_edge_index(self):
+        self._edge_index = SegmentIndex()
+        for edge in Polygon2d.get_segments(chain([self.outline], self.holes)):
+            self._index_edge(edge)
+
+
+
+    def _index_edge(self, edge):
+        xs = self.vertices.x
+        ys = self.vertices.y
+        self._edge_index.insert(edge, xs[edge[0]], ys[edge[0]], xs[edge[1]], ys[edge[1]])
+
+
+
+    def _split_indexed_edge(self, e1_idx, e2_idx, new_idx):
+        '''
+        Replace edge (e1_idx, e2_idx) in the edge index with the 2 edges
+        that appear after inserting new_idx between its endpoints.
+        '''
+        if self._edge_index is None: return
+
+        if (e1_idx, e2_idx) not in self._edge_index:
+            # edge is either stored the other way round or is not a border edge
+            if (e2_idx, e1_idx) not in self._edge_index: return
+            e1_idx, e2_idx = e2_idx, e1_idx
+
+        self._edge_index.remove((e1_idx, e2_idx))
+        self._index_edge((e1_idx, new_idx))
+        self._index_edge((new_idx, e2_idx))
+
+
+
     def add_hole(self, vertices):
-        hole = []
-        for vert in vertices:
-            new_idx = len(self.vertices)
-            self.vertices.append(vert)
-            hole.append(new_idx)
+        start = self.vertices.extend(vertices)
+        hole = range(start, len(self.vertices))
 
-            # add vertex to spatial index:
-            self.rti.insert(new_idx, (vert.x, vert.y, vert.x, vert.y))
+        # add vertices to spatial index:
+        for new_idx in hole:
+            self._index_vertex(new_idx)
 
         # Holes must be CW
         if Polygon2d.check_ccw(self.vertices, hole):
             hole = hole[::-1]
 
-        self.holes.append(hole)
+        self._loops.add_loop(hole)
+
+        if self._edge_index is not None:
+            for edge in Polygon2d.get_segments([hole]):
+                self._index_edge(edge)
+
+
+
+    def remove_hole(self, hole_id):
+        '''
+        Remove the hole at the given position in self.holes.
+        Its vertices stay in the vertex buffer, but are no longer a part of the border.
+        '''
+        if hole_id < 0 or hole_id >= self._loops.num_loops - 1:
+            raise IndexError("Hole {} does not exist".format(hole_id))
+
+        self._loops.remove_loop(hole_id + 1)
+
+        # spatial indices are rebuilt on next use
+        self._rti = None
+        self._edge_index = None
 
 
 
@@ -124,26 +337,38 @@ class Polygon2d(object):
 
 
 
-    def _find_first_sinter(self, segments):
-        # first segment with every other
-        seg1 = segments[0]
-        num_seg = len(segments)
-        for j in range(2, num_seg - 1):
-            seg2 = segments[j]
+    def _find_sinters(self):
+        '''
+        Find all crossings between non-adjacent edges of the outline.
+        Candidate pairs come from a sweep over the edges, only those are
+        tested exactly.
+        Returns a list of (edge1, edge2, intersection) sorted by position of the edges in the outline.
+        '''
+        segments = Polygon2d.get_segments([self.outline])
+        sinters = []
+
+        for pos1, pos2 in overlapping_segment_pairs(self.vertices.x, self.vertices.y, segments):
+            seg1 = segments[pos1]
+            seg2 = segments[pos2]
+
+            # skip adjacent edges
+            if seg1[0] in seg2 or seg1[1] in seg2: continue
+
             seg_x = self._segments_cross_helper(seg1, seg2)
             if seg_x is not None:
-                return (seg1, seg2, seg_x)
+                sinters.append((pos1, pos2, seg1, seg2, seg_x))
 
-        # remaining segments
-        for i in range(1, num_seg - 2):
-            for j in range(i+2, num_seg):
-                seg1 = segments[i]
-                seg2 = segments[j]
-                seg_x = self._segments_cross_helper(seg1, seg2)
-                if seg_x is not None:
-                    return (seg1, seg2, seg_x)
+        sinters.sort(key=itemgetter(0, 1))
+        return list(sinter[2:] for sinter in sinters)
 
-        return (None, None, None)
+
+
+    def _orient_outline_edge(self, edge):
+        '''
+        Returns the edge in the current direction of the outline.
+        '''
+        if self._loops.next(edge[0]) == edge[1]: return edge
+        return (edge[1], edge[0])
 
 
 
@@ -171,31 +396,42 @@ class Polygon2d(object):
 
 
     def _resolve_sinters(self):
+        '''
+        Resolve all self-intersections of the outline.
+        Each sweep finds the crossings of the current outline and resolves all of them:
+        an edge crossed several times is split at every crossing, in order along the edge.
+        Another sweep only checks that pulling the vertices apart did not make new crossings.
+        '''
         while True:
-            segments = Polygon2d.get_segments([self.outline])
-            (seg1, seg2, seg_x) = self._find_first_sinter(segments)
+            sinters = self._find_sinters()
 
             # stop when there are no more sinters
-            if seg_x is None: break
+            if len(sinters) == 0: break
 
-            # pull vertices apart:
-            # determine direction:
-            pull_dir = self._pull_direction(seg1, seg2, seg_x)
-            nv1 = seg_x + pull_dir * .5
-            nv2 = seg_x - pull_dir * .5
+            # crossings resolved so far on each edge of this sweep: sorted (param, new vertices)
+            splits = {}
 
-            # insert 2 new vertices at the intersection
-            new_idx1 = self.add_vertex_to_outline(nv1, seg1)
-            new_idx2 = self.add_vertex_to_outline(nv2, seg2)
+            for (seg1, seg2, seg_x) in sinters:
+                key1 = tuple(sorted(seg1))
+                key2 = tuple(sorted(seg2))
+                t1 = self._edge_param(key1, seg_x)
+                t2 = self._edge_param(key2, seg_x)
 
-            # reverse indices:
-            self.outline = self._mirror_indices(self.outline, new_idx1, new_idx2)
+                # the parts of the edges that contain the crossing now
+                part1 = self._edge_part(key1, splits.get(key1, []), t1)
+                part2 = self._edge_part(key2, splits.get(key2, []), t2)
+                if part1 is None or part2 is None: continue
 
+                # pulling apart earlier crossings moves the ends of the parts a little
+                seg_x = self._segments_cross_helper(part1, part2)
+                if seg_x is None: continue
 
-            # flip new verts if necessary:
-            if self._segments_cross_helper((seg1[0], new_idx1), (new_idx2, seg2[1])):
-                self.vertices[new_idx1], self.vertices[new_idx2] = \
-                self.vertices[new_idx2], self.vertices[new_idx1]
+                # earlier fixes may have reversed parts of the outline
+                new_idx1, new_idx2 = self._pull_apart(
+                    self._orient_outline_edge(part1), self._orient_outline_edge(part2), seg_x)
+
+                bisect.insort(splits.setdefault(key1, []), (t1, (new_idx1, new_idx2)))
+                bisect.insort(splits.setdefault(key2, []), (t2, (new_idx1, new_idx2)))
 
 
         # check that points are ccw, if not - reverse
@@ -204,9 +440,79 @@ class Polygon2d(object):
 
 
 
+    def _edge_param(self, edge, point):
+        '''
+        Position of the point projected onto the edge, 0 at edge[0] and 1 at edge[1].
+        '''
+        start = self.vertices[edge[0]]
+        vec = self.vertices[edge[1]] - start
+        return (point - start).dot_product(vec) / vec.dot_product(vec)
+
+
+
+    def _edge_part(self, edge, splits, t):
+        '''
+        Find the current outline edge that is the part of the original edge containing
+        the point at param t. splits are the sorted (param, new vertices) of the crossings
+        already resolved on the edge, each of them left one of its new vertices on each side.
+        Returns None if there is no such edge.
+        '''
+        pos = bisect.bisect(splits, (t,))
+        left = splits[pos - 1][1] if pos > 0 else (edge[0],)
+        right = splits[pos][1] if pos < len(splits) else (edge[1],)
+
+        for vid1 in left:
+            for vid2 in right:
+                if self._loops.has_edge(vid1, vid2): return (vid1, vid2)
+        return None
+
+
+
+    def _pull_apart(self, seg1, seg2, seg_x):
+        '''
+        Resolve crossing of outline edges seg1 and seg2 (both in the direction of the outline).
+        Returns the indices of the two new vertices.
+        '''
+        # pull vertices apart:
+        # determine direction:
+        pull_dir = self._pull_direction(seg1, seg2, seg_x)
+        nv1 = seg_x + pull_dir * .5
+        nv2 = seg_x - pull_dir * .5
+
+        # insert 2 new vertices at the intersection
+        new_idx1 = self.add_vertex_to_outline(nv1, seg1)
+        new_idx2 = self.add_vertex_to_outline(nv2, seg2)
+
+        # reverse the part of the outline between the new vertices (the shorter part:
+        # the other one gives the same outline in the opposite direction)
+        loops = self._loops
+        loops.reverse_between(new_idx1, new_idx2)
+
+        def new_neighbour(vid):
+            return loops.next(vid) if loops.next(vid) in (new_idx1, new_idx2) else loops.prev(vid)
+
+        # flip new verts if necessary:
+        if self._segments_cross_helper((seg1[0], new_neighbour(seg1[0])), (new_neighbour(seg2[1]), seg2[1])):
+            vert1 = self.vertices[new_idx1]
+            vert2 = self.vertices[new_idx2]
+            self.vertices[new_idx1], self.vertices[new_idx2] = vert2, vert1
+
+            # keep the vertex index in sync with the swapped positions
+            if self._rti is not None:
+                self._rti.delete(new_idx1, (vert1.x, vert1.y, vert1.x, vert1.y))
+                self._rti.delete(new_idx2, (vert2.x, vert2.y, vert2.x, vert2.y))
+                self._index_vertex(new_idx1)
+                self._index_vertex(new_idx2)
+
+        return new_idx1, new_idx2
+
+
+
 
     def add_vertex_to_outline(self, vertex, edge):
-        return self.add_vertex_to_loop(vertex, edge, self.outline)
+        if self._loops.loop_of(edge[0]) != 0:
+            raise ValueError("Adding vertex to outline: invalid edge")
+        return self.add_vertex_to_loop(vertex, edge)
 
 
 
@@ -215,13 +521,10 @@ class Polygon2d(object):
         Add the given vertex to the given edge of the polygon border.
         The exact loop that contains the edge is determined automatically.
         '''
-        wanted_loop = next((loop for loop in chain([self.outline], self.holes) \
-                if edge[0] in loop and edge[1] in loop), None)
-
-        if wanted_loop is not None:
-            return self.add_vertex_to_loop(vertex, edge, wanted_loop)
+        if not self._loops.has_edge(edge[0], edge[1]):
+            raise ValueError("Adding vertex to borders: invalid edge")
 
-        raise ValueError("Adding vertex to borders: invalid edge")
+        return self.add_vertex_to_loop(vertex, edge)
 
 
 
@@ -232,63 +535,47 @@ class Polygon2d(object):
         The exact loop that contains the edge is determined automatically.
         This function returns a list of new indices for the list of vertices in the same order.
         '''
-        wanted_loop = next((loop for loop in chain([self.outline], self.holes) \
-                if edge[0] in loop and edge[1] in loop), None)
-
-        if wanted_loop is not None:
-
-            # sort vertices by distance from smaller-index end of edge
-            sorted_pos_verts = sorted(enumerate(vertices),
-                key = lambda elem: Vector2.distance(elem[1], self.vertices[edge[0]]))
+        if not self._loops.has_edge(edge[0], edge[1]):
+            raise ValueError("Adding vertex to borders: invalid edge")
 
-            new_ids = [0]*len(vertices)
+        # sort vertices by distance from smaller-index end of edge
+        sorted_pos_verts = sorted(enumerate(vertices),
+            key = lambda elem: Vector2.distance(elem[1], self.vertices[edge[0]]))
 
-            last_added_idx = edge[0]
-            for (pos, vert) in sorted_pos_verts:
-                last_added_idx = self.add_vertex_to_loop(vert, (last_added_idx, edge[1]), wanted_loop)
-                new_ids[pos] = last_added_idx
+        new_ids = [0]*len(vertices)
 
-            return new_ids 
+        last_added_idx = edge[0]
+        for (pos, vert) in sorted_pos_verts:
+            last_added_idx = self.add_vertex_to_loop(vert, (last_added_idx, edge[1]))
+            new_ids[pos] = last_added_idx
 
-        raise ValueError("Adding vertex to borders: invalid edge")
+        return new_ids 
 
 
 
 
-    def add_vertex_to_loop(self, vertex, edge, loop):
+    def add_vertex_to_loop(self, vertex, edge):
         '''
-        Add vertex to the index buffer passed as 'loop' argument.
+        Add vertex to the given edge of a border loop.
+        The loop is found from the edge in O(1).
         '''
         e1_idx = edge[0]
         e2_idx = edge[1]
 
-        e1_pos = loop.index(e1_idx)
-        e2_pos = loop.index(e2_idx)
-
-        # e1_pos and e2_pos can either differ by 1
-        # or loop around the index buffer
-        if e1_pos > e2_pos: e1_pos, e2_pos = e2_pos, e1_pos
-
-        if e1_pos == e2_pos: raise ValueError("Adding vertex to loop: invalid edge")
-
-        if e2_pos - e1_pos > 1:
-            if e1_pos != 0: raise ValueError("Adding vertex to loop: invalid edge")
-            insert_at = e2_pos + 1
-
-        else:
-            insert_at = e2_pos
+        if e1_idx == e2_idx or not self._loops.has_edge(e1_idx, e2_idx):
+            raise ValueError("Adding vertex to loop: invalid edge")
 
         # check if this vertex is too close to a segment endpoint
         if vertex == self.vertices[e1_idx]: return e1_idx
         if vertex == self.vertices[e2_idx]: return e2_idx
 
-        new_vert_index = len(self.vertices)
-        self.vertices.append(vertex)
-        loop.insert(insert_at, new_vert_index)
+        new_vert_index = self.vertices.append_xy(vertex.x, vertex.y)
+        self._loops.insert(e1_idx, e2_idx, new_vert_index)
 
         # add new vertex to spatial index:
-        self.rti.insert(new_vert_index,
-            (vertex.x, vertex.y, vertex.x, vertex.y))
+        self._index_vertex(new_vert_index)
+
+        self._split_indexed_edge(e1_idx, e2_idx, new_vert_index)
 
         return new_vert_index
 
@@ -303,7 +590,7 @@ class Polygon2d(object):
 
         # if splitting the outline (it comes first in 'loops'):
         if index_1 in loops[0] and index_2 in loops[0]:
-            outline1, outline2 = Polygon2d._split_index_buffer(loops[0], index_1, index_2)
+            outline1, outline2 = self._split_loop(loops[0], index_1, index_2)
 
             # if we tried to split using an existing edge, return None, None
             if len(outline1) < 3 or len(outline2) < 3:
@@ -377,6 +664,9 @@ class Polygon2d(object):
 
     @staticmethod
     def point_inside_loop(vertices, indices, point):
+        if isinstance(vertices, VertexBuffer):
+            return vertices.point_inside_loop(indices, point)
+
         verts = list(vertices[idx] - point for idx in indices)
         nverts = len(verts)
         num_inters = 0
@@ -429,6 +719,60 @@ class Polygon2d(object):
 
 
 
+    def _split_loop(self, loop, index_1, index_2):
+        '''
+        Split the loop along the cut from index_1 to index_2, like _split_index_buffer.
+        A loop with bridged holes has the bridge ends more than once: the cut
+        goes from the copy of each end that has the other end inside of its corner.
+        '''
+        at_1 = list(loc for loc, index in enumerate(loop) if index == index_1)
+        at_2 = list(loc for loc, index in enumerate(loop) if index == index_2)
+        if len(at_1) == 1 and len(at_2) == 1:
+            return Polygon2d._split_index_buffer(loop, index_1, index_2)
+
+        loc_1 = self._corner_towards(loop, at_1, index_2)
+        loc_2 = self._corner_towards(loop, at_2, index_1)
+
+        if loc_1 > loc_2:
+            loc_1, loc_2 = loc_2, loc_1
+            index_1, index_2 = index_2, index_1
+
+        return (loop[:loc_1] + [index_1, index_2] + loop[loc_2 + 1:],
+            loop[loc_1 + 1:loc_2] + [index_2, index_1])
+
+
+
+    def _corner_towards(self, loop, locations, index):
+        '''
+        The first of the given locations in the loop whose corner contains vertex 'index'.
+        '''
+        for loc in locations:
+            if Polygon2d.inside_corner(
+                    self.vertices[loop[loc - 1]],
+                    self.vertices[loop[loc]],
+                    self.vertices[loop[(loc + 1) % len(loop)]],
+                    self.vertices[index]):
+                return loc
+        return locations[0]
+
+
+
+    @staticmethod
+    def inside_corner(prev_v, vert, next_v, point):
+        '''
+        Check if the direction from 'vert' to 'point' goes into the free space
+        at the border corner prev_v -> vert -> next_v (the free space is on the left of the border).
+        '''
+        to_point = point - vert
+        left_of_next = Vector2.cross(next_v - vert, to_point) >= 0
+        left_of_prev = Vector2.cross(to_point, prev_v - vert) >= 0
+
+        if Vector2.cross(vert - prev_v, next_v - vert) >= 0:
+            return left_of_next and left_of_prev
+        return left_of_next or left_of_prev
+
+
+
     @staticmethod
     def _merge_loops(loop1, loop2, index1, index2):
         '''
@@ -470,6 +814,8 @@ class Polygon2d(object):
 
     @staticmethod
     def signed_area(vertices, indices):
+        if isinstance(vertices, VertexBuffer):
+            return vertices.signed_area(indices)
         return Vector2.poly_signed_area((vertices[idx] for idx in indices))
 
 
@@ -502,18 +848,99 @@ class Mesh2d(Polygon2d):
         super(Mesh2d, self).__init__(vertices, indices)
         self.rooms = []
         self.portals = []
+        self.room_graph = None
+        self.room_locator = None
+        self.build_threshold = None
+        self._half_edges = None
+        self._room_triangles = {}
 
 
 
     @staticmethod
     def from_polygon(poly):
+        poly.__class__ = Mesh2d
         poly.rooms = []
         poly.portals = []
-        poly.__class__ = Mesh2d
+        poly.room_graph = None
+        poly.room_locator = None
+        poly.build_threshold = None
+        poly._half_edges = None
+        poly._room_triangles = {}
         return poly
 
 
 
+    @property
+    def rooms(self):
+        '''
+        Index loops of the convex rooms (CCW).
+        Rooms set with set_room_arrays are turned into lists on first use.
+        '''
+        if self._rooms is None:
+            offsets, indices = self._room_arrays
+            offsets = offsets.tolist()
+            indices = indices.tolist()
+            self._rooms = list(indices[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1))
+            self._room_arrays = None
+        return self._rooms
+
+
+    @rooms.setter
+    def rooms(self, rooms):
+        self._rooms = rooms
+        self._room_arrays = None
+
+
+
+    @property
+    def portals(self):
+        '''
+        Portals between the rooms, as pairs of vertex indices.
+        Portals set with set_room_arrays are turned into a list on first use.
+        '''
+        if self._portals is None:
+            portals = self._portal_array
+            self._portals = list(zip(portals[:, 0].tolist(), portals[:, 1].tolist()))
+            self._portal_array = None
+        return self._portals
+
+
+    @portals.setter
+    def portals(self, portals):
+        self._portals = portals
+        self._portal_array = None
+
+
+
+    def set_room_arrays(self, room_offsets, room_indices, portals):
+        '''
+        Use rooms and portals stored in numpy arrays: room loop 'i' is
+        room_indices[room_offsets[i]:room_offsets[i+1]], portals is an N x 2 array.
+        The arrays are kept until 'rooms' or 'portals' is first used.
+        The room graph and the room locator are not changed.
+        '''
+        self._rooms = None
+        self._room_arrays = (room_offsets, room_indices)
+        self._portals = None
+        self._portal_array = portals
+        self._half_edges = None
+        self._room_triangles = {}
+
+
+
+    @property
+    def half_edges(self):
+        '''
+        Half-edge topology of the rooms (HalfEdgeMesh), built on first use.
+        '''
+        if self._half_edges is None:
+            if self.room_graph is None:
+                raise RuntimeError("Mesh must be broken into convex rooms before building half-edges")
+            self._half_edges = HalfEdgeMesh.from_rooms(self.rooms, self.portals, self.vertices)
+        return self._half_edges
+
+
+
     def dump(self):
         return self.__dict__
 
@@ -526,8 +953,48 @@ class Mesh2d(Polygon2d):
 
 
 
-    def break_into_convex(self, threshold = 0.0, cv=None):
-        portals = self.get_portals(threshold=threshold)
+    def break_into_convex(self, threshold = 0.0, cv=None, observer=None, merge=False, prune_portals=False):
+        '''
+        Split the mesh into convex rooms connected by portals.
+        With 'prune_portals', portals that become unnecessary are removed during
+        the portal search (see get_portals).
+        With 'merge', rooms are merged across inessential portals afterwards (see merge_rooms).
+        'observer' (a BuildObserver) receives stage timings and counts.
+        '''
+        if observer is None: observer = BuildObserver()
+        self.build_threshold = threshold
+
+        with observer.stage('break_into_convex'):
+            with observer.stage('get_portals'):
+                portals = self.get_portals(threshold=threshold, observer=observer,
+                    prune_portals=prune_portals)
+
+            with observer.stage('portal_endpoints'):
+                self._create_portal_endpoints(portals, cv, observer)
+
+            with observer.stage('split_rooms'):
+                self._split_into_rooms(portals, observer)
+
+            with observer.stage('room_graph'):
+                self._build_room_graph()
+
+            if merge:
+                self.merge_rooms(observer)
+
+            observer.count('portals', len(self.portals))
+            observer.count('rooms', len(self.rooms))
+
+
+
+    def _build_room_graph(self):
+        self.room_graph = RoomGraph.from_rooms(self.rooms, self.portals, self.vertices)
+        self.room_locator = RoomLocator.from_rooms(self.rooms, self.vertices)
+        self._half_edges = None
+        self._room_triangles = {}
+
+
+
+    def _create_portal_endpoints(self, portals, cv=None, observer=None):
         '''
         For all the portals that require creating new vertices, create new vertices.
         Multiple portals may have the same endpoint. If we have 5 portals that converge
@@ -535,6 +1002,8 @@ class Mesh2d(Polygon2d):
         This is why some portals have a 'parent_portal' attribute - we create the endpoint
         for the parent portal only, and all the other portals use its index.
         '''
+        num_ray_casts = 0
+        num_new_vertices = len(self.vertices)
 
         for portal in portals:
             if portal['end_index'] is None and 'parent_portal' not in portal:
@@ -543,6 +1012,7 @@ class Mesh2d(Polygon2d):
                 start_i = portal['start_index']
 
                 intersection = self.trace_ray(self.vertices[start_i], new_vrt)
+                num_ray_casts += 1
 
                 if intersection is None:
                     raise RuntimeError("Ray casting failed to find portal endpoint")
@@ -568,19 +1038,48 @@ class Mesh2d(Polygon2d):
             if portal['end_index'] is None and 'parent_portal' in portal:
                 portal['end_index'] = portal['parent_portal']['end_index']
 
+        if observer is not None:
+            observer.count('ray_casts', num_ray_casts)
+            observer.count('new_vertices', len(self.vertices) - num_new_vertices)
+
 
-        # Now break the mesh border into convex rooms
 
-        # queue of rooms
+    def _split_into_rooms(self, portals, observer=None):
+        '''
+        Break the mesh border into convex rooms along the portals.
+
+        Every queued room keeps the portals that still have to be created inside of it
+        (positions in 'portals', in list order). When a room is split, its pending portals
+        are routed to the part that has both of their endpoints, so each portal is only
+        ever tested against the room that contains it.
+        Which queued rooms have a vertex is kept in one map for all the rooms: a split
+        only moves the vertices of the smaller part to the new room.
+        '''
+
+        # queue of rooms: (room id, border loops, positions of the pending portals)
         room_q = deque()
 
-        # append a copy of the entire outline plus all the holes
-        room_q.append([self.outline[:]] + deepcopy(self.holes))
+        # start with the outline that has all the holes bridged into it
+        loops, num_bridged = self._bridge_holes(portals)
+        if observer is not None: observer.count('bridged_holes', num_bridged)
+
+        # vertex index -> {queued room id: number of times the vertex is in the room}
+        vid_rooms = {}
+        for vid in chain(*loops):
+            rooms = vid_rooms.setdefault(vid, {})
+            rooms[0] = rooms.get(0, 0) + 1
+        num_room_ids = 1
+
+        pending = list(pos for pos in range(len(portals)) if 'created' not in portals[pos])
+        room_q.append((0, loops, pending))
 
         while len(room_q) > 0:
-            room = room_q.popleft()
+            room_id, room, pending = room_q.popleft()
+
+            if observer is not None:
+                observer.room_processed(sum(len(loop) for loop in room), len(room))
 
-            room1, room2, new_portal = self._break_in_two(room, portals)
+            room1, room2, new_portal, rest = self._break_in_two(room, portals, pending)
 
             # if could not split this room, finalize it
             if room1 is None:
@@ -589,129 +1088,1055 @@ class Mesh2d(Polygon2d):
 
             # otherwise add new rooms to the queue
             else:
-                room_q.append(room1)
-                if room2 is not None: room_q.append(room2)
+                if room2 is None:
+                    # a hole joined to the outer loop: the room keeps its id,
+                    # the ends of the portal are in it once more
+                    for vid in new_portal: vid_rooms[vid][room_id] += 1
+                    room_q.append((room_id, room1, self._route_portals(portals, rest, vid_rooms, room_id)))
+
+                else:
+                    # the larger part keeps the id of the room
+                    room_id1 = room_id
+                    room_id2 = num_room_ids
+                    num_room_ids += 1
+                    if sum(len(loop) for loop in room1) < sum(len(loop) for loop in room2):
+                        room_id1, room_id2 = room_id2, room_id1
+                        Mesh2d._move_to_room(vid_rooms, room1, new_portal, room_id, room_id1)
+                    else:
+                        Mesh2d._move_to_room(vid_rooms, room2, new_portal, room_id, room_id2)
+
+                    room_q.append((room_id1, room1, self._route_portals(portals, rest, vid_rooms, room_id1)))
+                    room_q.append((room_id2, room2, self._route_portals(portals, rest, vid_rooms, room_id2)))
+
                 self.portals.append(new_portal)
 
 
 
-    def _break_in_two(self, loops, portals):
-        indices = list(chain(*loops))
+    def _bridge_holes(self, portals):
+        '''
+        Connect the holes to the outline through the portals between different loops,
+        all in one pass before any room is split.
+
+        Portals are taken in list order; a portal is a bridge if its endpoints are in
+        loops that are not connected yet (union-find over the loops). The loops are kept
+        as rings of nodes, so every bridge is O(1): the two ends of the bridge get copies
+        that take the other side of the cut, as in earcut's hole elimination.
+        Bridges are marked as created and added to self.portals.
 
-        # iterate over portals trying to find the first portal that belongs to this polygon
+        Returns the border loops (the outline with the bridged holes first, then the
+        holes that no portal reaches) and the number of bridged holes.
+        '''
+        loops = [self.outline] + self.holes
+
+        # ring of nodes: node -> vertex index, next node, previous node
+        node_vid = []
+        node_next = []
+        node_prev = []
+
+        # vertex index -> its nodes, loop of the vertex
+        vid_nodes = {}
+        vid_loop = {}
+        first_nodes = []
+
+        for loop_id, loop in enumerate(loops):
+            first = len(node_vid)
+            first_nodes.append(first)
+            for loc, vid in enumerate(loop):
+                node_vid.append(vid)
+                node_next.append(first + (loc + 1) % len(loop))
+                node_prev.append(first + (loc - 1) % len(loop))
+                vid_nodes[vid] = [first + loc]
+                vid_loop[vid] = loop_id
+
+        parent = list(range(len(loops)))
+
+        def find(loop_id):
+            while parent[loop_id] != loop_id:
+                parent[loop_id] = parent[parent[loop_id]]
+                loop_id = parent[loop_id]
+            return loop_id
+
+        def corner_node(vid, other):
+            nodes = vid_nodes[vid]
+            if len(nodes) == 1: return nodes[0]
+
+            for node in nodes:
+                if Polygon2d.inside_corner(
+                        self.vertices[node_vid[node_prev[node]]],
+                        self.vertices[vid],
+                        self.vertices[node_vid[node_next[node]]],
+                        self.vertices[other]):
+                    return node
+            return nodes[0]
+
+        num_bridged = 0
         for portal in portals:
-
-            # if this portal has already been created, skip it
             if 'created' in portal: continue
 
-            room1 = []
-            room2 = []
-
             start_i = portal['start_index']
             end_i = portal['end_index']
+            if start_i not in vid_loop or end_i not in vid_loop: continue
 
-            # if this portal starts outside of this polygon, skip it
-            if start_i not in indices or end_i not in indices:
-                continue
-
-            # split index buffer of the outline of this room using the portal
-            # room1, room2 = Polygon2d._split_index_buffer(indices, start_i, end_i)
+            root_1 = find(vid_loop[start_i])
+            root_2 = find(vid_loop[end_i])
+            if root_1 == root_2: continue
 
-            room1, room2 = self._split_border(loops, start_i, end_i)
+            node_a = corner_node(start_i, end_i)
+            node_b = corner_node(end_i, start_i)
 
-            if room1 is None and room2 is None: continue
+            # a -> b -> ... (the loop of b) ... -> b2 -> a2 -> ... (the loop of a) ... -> a
+            node_a2 = len(node_vid)
+            node_b2 = node_a2 + 1
+            node_vid.extend([start_i, end_i])
+            node_next.extend([0, 0])
+            node_prev.extend([0, 0])
 
-            # mark this portal as created
-            portal['created'] = True
+            after_a = node_next[node_a]
+            before_b = node_prev[node_b]
 
-            return room1, room2, (start_i, end_i)
+            node_next[node_a] = node_b
+            node_prev[node_b] = node_a
 
-        # if we did not find any portals to split, this room must be convex
-        return None, None, None
+            node_next[node_a2] = after_a
+            node_prev[after_a] = node_a2
 
+            node_next[node_b2] = node_a2
+            node_prev[node_a2] = node_b2
 
-    # def get_triangle_coords(self, triangle):
+            node_next[before_b] = node_b2
+            node_prev[node_b2] = before_b
 
-    #     v1 = self.vertices[triangle[0]]
-    #     v2 = self.vertices[triangle[1]]
-    #     v3 = self.vertices[triangle[2]]
-    #     return [v1.x, v1.y, v2.x, v2.y, v3.x, v3.y, v1.x, v1.y]
+            vid_nodes[start_i].append(node_a2)
+            vid_nodes[end_i].append(node_b2)
 
+            parent[max(root_1, root_2)] = min(root_1, root_2)
+            num_bridged += 1
 
+            portal['created'] = True
+            self.portals.append((start_i, end_i))
 
-    @staticmethod
-    def check_convex(indices, vertices):
+        if num_bridged == 0:
+            return list(list(loop) for loop in loops), 0
 
-        vrt = vertices
-        num_indices = len(indices)
+        # walk the rings: one loop per group of connected loops, the outline first
+        result = []
+        for loop_id in range(len(loops)):
+            if find(loop_id) != loop_id: continue
 
-        is_convex = True
+            first = first_nodes[loop_id]
+            merged = [node_vid[first]]
+            node = node_next[first]
+            while node != first:
+                merged.append(node_vid[node])
+                node = node_next[node]
+            result.append(merged)
 
-        for cur_pos in range(num_indices):
-            next_pos = plus_wrap(cur_pos, num_indices)
-            nnext_pos = plus_wrap(next_pos, num_indices)
+        return result, num_bridged
 
-            cur_ind = indices[cur_pos]
-            next_ind = indices[next_pos]
-            nnext_ind = indices[nnext_pos]
-            if Vector2.double_signed_area(vrt[cur_ind], vrt[next_ind], vrt[nnext_ind]) < 0:
-                is_convex = False
-                break
 
-        return is_convex
 
+    def _break_in_two(self, loops, portals, pending=None):
+        '''
+        Split the room along the first portal in 'pending' (positions in 'portals')
+        that can split it. Without 'pending', every portal that has both endpoints in the room is tried.
+        Returns the two parts (the second one is None if the portal joined a hole
+        to the outer loop), the new portal and the positions of the portals left to create.
+        '''
+        if pending is None:
+            indices = set(chain(*loops))
+            pending = list(pos for pos in range(len(portals)) \
+                if 'created' not in portals[pos] \
+                    and portals[pos]['start_index'] in indices and portals[pos]['end_index'] in indices)
 
+        # iterate over the pending portals trying to find the first one that splits this polygon
+        for num, pos in enumerate(pending):
+            portal = portals[pos]
 
-    def find_spikes(self, threshold = 0.0):
-        vrt = self.vertices
-        borders = [self.outline] + self.holes
-        segments = Polygon2d.get_segments(borders)
-        num_segs = len(segments)
+            # if this portal has already been created, skip it
+            if 'created' in portal: continue
 
-        # find spikes:
-        spikes = []
-        start_seg = segments[0]
-        for cur_pos in range(num_segs):
+            start_i = portal['start_index']
+            end_i = portal['end_index']
 
-            cur_seg = segments[cur_pos]
-            next_seg = segments[(cur_pos + 1) % num_segs]
+            # split index buffer of the outline of this room using the portal
+            room1, room2 = self._split_border(loops, start_i, end_i)
 
-            # check if we are at the end of the border
-            if cur_seg[1] != next_seg[0]:
-                next_seg, start_seg = start_seg, next_seg
+            if room1 is None and room2 is None: continue
 
-            prev_ind = cur_seg[0]
-            cur_ind = cur_seg[1]
-            next_ind = next_seg[1]
+            # mark this portal as created
+            portal['created'] = True
 
-            prev_v = vrt[prev_ind]
-            cand_v = vrt[cur_ind]
-            next_v = vrt[next_ind]
+            return room1, room2, (start_i, end_i), pending[:num] + pending[num + 1:]
 
-            signed_area = Vector2.double_signed_area(prev_v, cand_v, next_v)
-            if signed_area < 0.0:
+        # if we did not find any portals to split, this room must be convex
+        return None, None, None, []
 
-                side1 = cand_v - prev_v
-                side2 = next_v - cand_v
-                try:
-                    external_angle = Vector2.angle(side1, side2)
 
-                except ValueError as ve:
-                    print(ve)
-                    print("tried to find angle between vectors: {}, {}".format(side1, side2))
-                    raise ve
 
-                external_angle = external_angle*180.0 / math.pi
+    @staticmethod
+    def _move_to_room(vid_rooms, part, split, old_id, new_id):
+        '''
+        Move the vertices of 'part' (border loops of a room split along the 'split' portal)
+        from room 'old_id' to the new room 'new_id' in the map vertex -> queued rooms.
+        The ends of the split are in both parts: one of their copies in 'part' is new.
+        '''
+        added = list(split)
+        for vid in chain(*part):
+            rooms = vid_rooms[vid]
+            rooms[new_id] = rooms.get(new_id, 0) + 1
+
+            if vid in added:
+                added.remove(vid)
+                continue
+
+            rooms[old_id] -= 1
+            if rooms[old_id] == 0: del rooms[old_id]
+
+
+
+    @staticmethod
+    def _route_portals(portals, pending, vid_rooms, room_id):
+        '''
+        Select the pending portals of a split room that have both endpoints in its part 'room_id'.
+        Portals that do not fit into either part are dropped: they cross the split and can never be created.
+        '''
+        # vertices on the split (and on bridges to holes) belong to both parts:
+        # such a portal is tried in both, the first one to create it wins
+        return list(pos for pos in pending \
+            if room_id in vid_rooms.get(portals[pos]['start_index'], ()) \
+                and room_id in vid_rooms.get(portals[pos]['end_index'], ()))
+
+
+
+    def merge_rooms(self, observer=None):
+        '''
+        Remove inessential portals (Hertel-Mehlhorn): two rooms are merged across a portal
+        if their union is still convex. Portals are tried in order, each one once.
+        Returns the number of removed rooms and the number of removed portals
+        (these differ when 2 rooms share more than one portal).
+        '''
+        if self.room_graph is None:
+            raise RuntimeError("Mesh must be broken into convex rooms before merging rooms")
+
+        if observer is None: observer = BuildObserver()
+
+        with observer.stage('merge_rooms'):
+            loops = list(self.rooms)
+
+            # union-find over room ids, merged rooms live at their root
+            parents = list(range(len(loops)))
+
+            def find_root(room_id):
+                while parents[room_id] != room_id:
+                    parents[room_id] = parents[parents[room_id]]
+                    room_id = parents[room_id]
+                return room_id
+
+            portal_rooms = self.room_graph.portal_rooms.tolist()
+            kept = []
+            for portal_id, (start_i, end_i) in enumerate(self.portals):
+                room1, room2 = portal_rooms[portal_id]
+                if room1 < 0 or room2 < 0:
+                    kept.append(portal_id)
+                    continue
+
+                room1 = find_root(room1)
+                room2 = find_root(room2)
+
+                # the rooms have been merged across another portal they share
+                if room1 == room2: continue
+
+                merged = Mesh2d._merge_rooms(loops[room1], loops[room2], start_i, end_i)
+                if merged is None or not Mesh2d.check_convex(merged, self.vertices):
+                    kept.append(portal_id)
+                    continue
+
+                parents[room2] = room1
+                loops[room1] = merged
+                loops[room2] = None
+
+            # a kept portal may have ended up inside a merged room
+            kept = list(portal_id for portal_id in kept if portal_rooms[portal_id][0] < 0 or \
+                find_root(portal_rooms[portal_id][0]) != find_root(portal_rooms[portal_id][1]))
+
+            num_rooms = len(self.rooms)
+            num_portals = len(self.portals)
+
+            self.rooms = list(loop for loop in loops if loop is not None)
+            self.portals = list(self.portals[portal_id] for portal_id in kept)
+            self._build_room_graph()
+
+        removed_rooms = num_rooms - len(self.rooms)
+        removed_portals = num_portals - len(self.portals)
+        observer.count('removed_rooms', removed_rooms)
+        observer.count('removed_portals', removed_portals)
+
+        return removed_rooms, removed_portals
+
+
+
+    @staticmethod
+    def _merge_rooms(room1, room2, start_i, end_i):
+        '''
+        Border of the union of 2 rooms (CCW index loops) that share the edge (start_i, end_i).
+        Other edges that the rooms share are removed too. Returns None if the edge is not shared.
+        '''
+        # make room1 go along the edge from start_i to end_i, and room2 the other way
+        pos1 = room1.index(start_i) if start_i in room1 else None
+        if pos1 is None or room1[pos1 - len(room1) + 1] != end_i:
+            room1, room2 = room2, room1
+            pos1 = room1.index(start_i) if start_i in room1 else None
+            if pos1 is None or room1[pos1 - len(room1) + 1] != end_i: return None
+
+        pos2 = room2.index(end_i) if end_i in room2 else None
+        if pos2 is None or room2[pos2 - len(room2) + 1] != start_i: return None
+
+        # room1 from end_i round to start_i, then room2 from after start_i round to before end_i
+        part1 = room1[pos1 + 1:] + room1[:pos1 + 1]
+        part2 = room2[pos2 + 1:] + room2[:pos2 + 1]
+        merged = part1 + part2[1:-1]
+
+        # remove spikes left by the other shared edges: ... a, b, a ... becomes ... a ...
+        pos = 0
+        while pos < len(merged) and len(merged) > 2:
+            num = len(merged)
+            if merged[pos - 1] == merged[(pos + 1) % num]:
+                if pos + 1 < num:
+                    del merged[pos:pos + 2]
+                else:
+                    del merged[pos]
+                    del merged[0]
+                pos = max(0, pos - 2)
+            else:
+                pos += 1
+
+        return merged
+
+
+
+    def add_obstacle(self, obstacle, threshold=None):
+        '''
+        Add a hole to the mesh. 'obstacle' is a Polygon2d (its outline is used) or a list of Vector2;
+        it must be inside the mesh and must not touch the mesh border.
+        If the mesh has been broken into convex rooms, only the rooms that the obstacle overlaps
+        are merged into a polygon, broken into convex rooms again and spliced back into the mesh.
+        'threshold' defaults to the one the mesh was built with.
+        Returns the id of the new hole (its position in self.holes). Room and portal ids may change.
+        '''
+        if isinstance(obstacle, Polygon2d):
+            obstacle = obstacle.vertices.take(obstacle.outline)
+        obstacle = list(obstacle)
+
+        self._check_obstacle(obstacle)
+        hole_id = len(self.holes)
+
+        if self.room_graph is None:
+            self.add_hole(obstacle)
+            return hole_id
+
+        if threshold is None: threshold = self.build_threshold or 0.0
+        room_ids = self._rooms_overlapping(obstacle)
+
+        try:
+            region, region_vids = self._region_mesh(room_ids)
+            region.add_hole(obstacle)
+            region.break_into_convex(threshold)
+
+        except (ValueError, RuntimeError, ZeroSegmentError):
+            # the region cannot be broken into rooms on its own, rebuild everything
+            self.add_hole(obstacle)
+            self._rebuild_rooms(threshold)
+            return hole_id
+
+        self._splice_region(room_ids, region, region_vids)
+        return hole_id
+
+
+
+    def remove_obstacle(self, hole_id, threshold=None):
+        '''
+        Remove the hole at the given position in self.holes.
+        If the mesh has been broken into convex rooms, only the rooms around the hole
+        are merged (together with the space of the hole), broken into convex rooms again
+        and spliced back into the mesh.
+        Ids of the holes after it are shifted down by one. Room and portal ids may change.
+        '''
+        hole = self.holes[hole_id]
+
+        if self.room_graph is None:
+            self.remove_hole(hole_id)
+            return
+
+        if threshold is None: threshold = self.build_threshold or 0.0
+
+        hole_verts = set(hole)
+        room_ids = list(room_id for room_id, room in enumerate(self.rooms) \
+            if any(vid in hole_verts for vid in room))
+
+        try:
+            region, region_vids = self._region_mesh(room_ids, Polygon2d.get_segments([hole]))
+            region.break_into_convex(threshold)
+
+        except (ValueError, RuntimeError, ZeroSegmentError):
+            self.remove_hole(hole_id)
+            self._rebuild_rooms(threshold)
+            return
+
+        self.remove_hole(hole_id)
+        self._splice_region(room_ids, region, region_vids)
+
+
+
+    def _rebuild_rooms(self, threshold):
+        self.rooms = []
+        self.portals = []
+        self.break_into_convex(threshold)
+
+
+
+    def _check_obstacle(self, obstacle):
+        '''
+        Raise ValueError if the obstacle is not inside the mesh, or touches the mesh border.
+        '''
+        num = len(obstacle)
+        if num < 3:
+            raise ValueError("Obstacle must have at least 3 vertices")
+
+        for vert in obstacle:
+            if not self.point_inside(vert):
+                raise ValueError("Obstacle must be inside the mesh")
+
+        obstacle_verts = VertexBuffer(obstacle)
+        obstacle_loop = range(num)
+        vect_min = Vector2(min(vert.x for vert in obstacle), min(vert.y for vert in obstacle))
+        vect_max = Vector2(max(vert.x for vert in obstacle), max(vert.y for vert in obstacle))
+
+        for vid in self.find_verts_in_bbox(vect_min, vect_max):
+            if obstacle_verts.point_inside_loop(obstacle_loop, self.vertices[vid]):
+                raise ValueError("Obstacle must not overlap the mesh border")
+
+        for edge in self.find_edges_in_bbox(vect_min, vect_max):
+            seg1 = self.vertices[edge[0]]
+            seg2 = self.vertices[edge[1]]
+            for pos in range(num):
+                if Vector2.where_segments_cross_inclusive(seg1, seg2,
+                        obstacle[pos], obstacle[(pos + 1) % num]) is not None:
+                    raise ValueError("Obstacle must not touch the mesh border")
+
+
+
+    def _rooms_overlapping(self, obstacle):
+        '''
+        Ids of the rooms that overlap the given polygon (a list of Vector2).
+        '''
+        num = len(obstacle)
+        obstacle_verts = VertexBuffer(obstacle)
+        obstacle_loop = range(num)
+        obstacle_edges = list((obstacle[pos], obstacle[(pos + 1) % num]) for pos in range(num))
+
+        # points of the obstacle that are inside every room it overlaps, together with the room corners
+        probes = obstacle + list((seg1 + seg2) * .5 for seg1, seg2 in obstacle_edges)
+
+        bbox = (min(vert.x for vert in obstacle), min(vert.y for vert in obstacle),
+            max(vert.x for vert in obstacle), max(vert.y for vert in obstacle))
+
+        room_ids = []
+        for room_id in sorted(self.room_locator.rti.intersection(bbox)):
+            room = self.rooms[room_id]
+            corners = list(self.vertices[vid] for vid in room)
+            center = sum(corners[1:], corners[0]) * (1. / len(corners))
+
+            overlaps = any(self.room_locator.contains(room_id, pt.x, pt.y) for pt in probes) or \
+                any(obstacle_verts.point_inside_loop(obstacle_loop, pt) for pt in corners + [center]) or \
+                any(Vector2.where_segments_cross_exclusive(corners[pos - 1], corners[pos], seg1, seg2) \
+                    is not None for pos in range(len(corners)) for seg1, seg2 in obstacle_edges)
+
+            if overlaps: room_ids.append(room_id)
+
+        return room_ids
+
+
+
+    def _region_mesh(self, room_ids, removed_edges=()):
+        '''
+        Merge the given rooms into a polygon with holes and return it as a new Mesh2d
+        plus the list that maps its vertex indices to the vertex indices of this mesh.
+        Edges in 'removed_edges' (border edges of a hole that is being removed) are dropped.
+        Raises ValueError if the rooms do not make a single polygon.
+        '''
+        edges = set()
+        for room_id in room_ids:
+            room = self.rooms[room_id]
+            prev = room[-1]
+            for cur in room:
+                edges.add((prev, cur))
+                prev = cur
+
+        removed_edges = set(removed_edges)
+
+        # edges that are not shared by 2 rooms of the region make its border
+        next_vid = {}
+        for start_i, end_i in edges:
+            if (end_i, start_i) in edges: continue
+            if (start_i, end_i) in removed_edges or (end_i, start_i) in removed_edges: continue
+            if start_i in next_vid:
+                raise ValueError("Region border touches itself")
+            next_vid[start_i] = end_i
+
+        loops = []
+        while len(next_vid) > 0:
+            start_i = min(next_vid)
+            loop = [start_i]
+            cur = next_vid.pop(start_i)
+            while cur != start_i:
+                if cur not in next_vid:
+                    raise ValueError("Region border is not closed")
+                loop.append(cur)
+                cur = next_vid.pop(cur)
+            loops.append(loop)
+
+        outlines = list(loop for loop in loops if self.vertices.signed_area(loop) > 0.)
+        if len(outlines) != 1:
+            raise ValueError("Region must have exactly one outline")
+        holes = list(loop for loop in loops if loop is not outlines[0])
+
+        region_vids = list(chain(outlines[0], *holes))
+        local = dict((vid, pos) for pos, vid in enumerate(region_vids))
+
+        region = Mesh2d.from_polygon(Polygon2d.from_loops(
+            self.vertices.take(region_vids),
+            list(local[vid] for vid in outlines[0]),
+            list(list(local[vid] for vid in hole) for hole in holes)))
+
+        return region, region_vids
+
+
+
+    def _splice_region(self, room_ids, region, region_vids):
+        '''
+        Replace the given rooms with the rooms of the region mesh (see _region_mesh).
+        Vertices that the region build added to its border are added either to the
+        border of this mesh or, where the region border is a portal, to the room on its other side.
+        '''
+        affected = set(room_ids)
+        num_old = len(region_vids)
+        local_to_global = region_vids + [None] * (len(region.vertices) - num_old)
+
+        # directed edges of the rooms around the region
+        outside_rooms = set()
+        for room_id in room_ids:
+            outside_rooms.update(int(room) for room in self.room_graph.room_neighbours(room_id))
+        outside_rooms -= affected
+
+        outside_edges = {}
+        for room_id in outside_rooms:
+            room = self.rooms[room_id]
+            prev = room[-1]
+            for cur in room:
+                outside_edges[(prev, cur)] = room_id
+                prev = cur
+
+        for loop_id in range(region._loops.num_loops):
+            loop = region._loops.as_list(loop_id)
+            first = next((pos for pos, vid in enumerate(loop) if vid < num_old), None)
+
+            # the new hole: all of its vertices are new
+            if first is None:
+                start = len(self.vertices)
+                self.add_hole(region.vertices.take(loop))
+                for pos, vid in enumerate(loop):
+                    local_to_global[vid] = start + pos
+                continue
+
+            # new vertices between 2 old ones were added to the edge between them
+            loop = loop[first:] + loop[:first + 1]
+            prev_old = loop[0]
+            new_vids = []
+            for vid in loop[1:]:
+                if vid >= num_old:
+                    new_vids.append(vid)
+                    continue
+
+                if len(new_vids) > 0:
+                    global_ids = self._split_region_edge(region_vids[prev_old], region_vids[vid],
+                        list(region.vertices[new_vid] for new_vid in new_vids), outside_edges)
+                    for new_vid, global_id in zip(new_vids, global_ids):
+                        local_to_global[new_vid] = global_id
+
+                prev_old = vid
+                new_vids = []
+
+        new_rooms = list(list(local_to_global[vid] for vid in room) for room in region.rooms)
+        new_portals = list((local_to_global[start_i], local_to_global[end_i]) \
+            for start_i, end_i in region.portals)
+
+        # portals between the new rooms and the rooms around the region
+        outside_walls = set()
+        for room_id in outside_rooms:
+            room = self.rooms[room_id]
+            outside_walls.update(zip(room, room[1:] + room[:1]))
+
+        for room in new_rooms:
+            prev = room[-1]
+            for cur in room:
+                if (cur, prev) in outside_walls:
+                    new_portals.append((prev, cur))
+                prev = cur
+
+        portal_rooms = self.room_graph.portal_rooms.tolist()
+        self.portals = list(portal for portal_id, portal in enumerate(self.portals) \
+            if portal_rooms[portal_id][0] not in affected and portal_rooms[portal_id][1] not in affected)
+        self.portals.extend(new_portals)
+
+        self.rooms = list(room for room_id, room in enumerate(self.rooms) if room_id not in affected)
+        self.rooms.extend(new_rooms)
+
+        self._build_room_graph()
+
+
+
+    def _split_region_edge(self, start_i, end_i, vertices, outside_edges):
+        '''
+        Add vertices (ordered from start_i to end_i) to the edge (start_i, end_i) of the region border.
+        The edge is either a wall, or a portal to a room outside of the region.
+        Returns indices of the new vertices.
+        '''
+        if self._loops.has_edge(start_i, end_i):
+            new_ids = []
+            prev = start_i
+            for vert in vertices:
+                prev = self.add_vertex_to_loop(vert, (prev, end_i))
+                new_ids.append(prev)
+            return new_ids
+
+        room_id = outside_edges.get((end_i, start_i))
+        if room_id is None:
+            raise RuntimeError("Region border edge is neither a wall nor a portal")
+
+        new_ids = list(self.vertices.append_xy(vert.x, vert.y) for vert in vertices)
+
+        # the room goes along the edge the other way
+        room = self.rooms[room_id]
+        pos = room.index(start_i)
+        room[pos:pos] = new_ids[::-1]
+        return new_ids
+
+
+
+    def point_inside_room(self, room_id, point):
+        '''
+        Check if the point is inside the given convex room or on its border.
+        '''
+        if self.room_locator is not None:
+            return self.room_locator.contains(room_id, point.x, point.y)
+
+        room = self.rooms[room_id]
+        xs = self.vertices.x[room]
+        ys = self.vertices.y[room]
+        edge_x = np.roll(xs, -1) - xs
+        edge_y = np.roll(ys, -1) - ys
+        cross = edge_x * (point.y - ys) - edge_y * (point.x - xs)
+        return bool(np.all(cross >= -Vector2.tolerance))
+
+
+
+    def locate_room(self, point):
+        '''
+        Returns id of the room that contains the point, or None if the point is outside the mesh.
+        '''
+        if self.room_locator is None:
+            raise RuntimeError("Mesh must be broken into convex rooms before point location")
+        return self.room_locator.locate(point.x, point.y)
+
+
+
+    def locate_rooms(self, points):
+        '''
+        Vectorized version of locate_room.
+        'points' is an (N, 2) array of positions.
+        Returns an array of N room ids, -1 for points outside the mesh.
+        '''
+        if self.room_locator is None:
+            raise RuntimeError("Mesh must be broken into convex rooms before point location")
+        return self.room_locator.locate_many(points)
+
+
+
+    def raycast_walk(self, start, goal):
+        '''
+        Check if point 'goal' can be seen from point 'start'.
+        The segment between them is walked from room to room through the portals
+        (see HalfEdgeMesh.walk_segment), so only the rooms it crosses are tested
+        instead of the border edges along it, as trace_ray does.
+        A segment that only touches a corner of the border is not blocked by it.
+        Returns False if either point is outside the mesh.
+        '''
+        start_room = self.locate_room(start)
+        if start_room is None: return False
+        return self.half_edges.walk_segment(start_room, start.x, start.y, goal.x, goal.y) is not None
+
+
+
+    def raycast_walks(self, starts, goals):
+        '''
+        Batched version of raycast_walk.
+        'starts' and 'goals' are (N, 2) arrays of positions.
+        Returns a boolean array of N values.
+        '''
+        starts = np.asarray(starts, dtype=np.float64).reshape(-1, 2)
+        goals = np.asarray(goals, dtype=np.float64).reshape(-1, 2)
+        if len(starts) != len(goals):
+            raise ValueError("Number of start and goal points must be equal")
+
+        start_rooms = self.locate_rooms(starts).tolist()
+        half_edges = self.half_edges
+
+        starts = starts.tolist()
+        goals = goals.tolist()
+        visible = np.zeros(len(starts), dtype=bool)
+        for pos in range(len(starts)):
+            if start_rooms[pos] == -1: continue
+            x1, y1 = starts[pos]
+            x2, y2 = goals[pos]
+            visible[pos] = half_edges.walk_segment(start_rooms[pos], x1, y1, x2, y2) is not None
+
+        return visible
+
+
+
+    def closest_point(self, point):
+        '''
+        Closest point of the mesh to 'point' and the id of the room it is in, as a tuple.
+        A point inside the mesh is returned as it is. A point outside is moved to the
+        closest border edge: the edge index is searched by distance to the edge bounding boxes.
+        Returns (None, None) if the mesh has no border edges.
+        '''
+        room_id = self.locate_room(point)
+        if room_id is not None: return point.copy(), room_id
+
+        vrt = self.vertices
+
+        closest_pt = None
+        closest_dist = None
+        closest_edge = None
+
+        for seg, box_dist in self.edge_index.nearest(point.x, point.y):
+
+            # no remaining edge can be closer than the one we already have
+            if closest_dist is not None and box_dist >= closest_dist: break
+
+            dist, proj = Vector2.vertex_to_segment_dist(point, vrt[seg[0]], vrt[seg[1]])
+            if closest_dist is None or dist < closest_dist:
+                closest_dist = dist
+                closest_pt = proj
+                closest_edge = seg
+
+        if closest_edge is None: return None, None
+        return closest_pt.copy(), self._border_edge_room(closest_edge, closest_pt)
+
+
+
+    def closest_points(self, points):
+        '''
+        Vectorized version of closest_point.
+        'points' is an (N, 2) array of positions.
+        Returns an (N, 2) array of the closest points of the mesh and an array of N room ids.
+        For every point outside of the mesh, the edges with bounding boxes closer than
+        the edge of the nearest box are candidates; all the candidates are measured at once.
+        '''
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        rooms = self.locate_rooms(points)
+        result = points.copy()
+
+        outside = np.flatnonzero(rooms == -1)
+        if len(outside) == 0 or len(self.edge_index) == 0: return result, rooms
+
+        vrt = self.vertices
+
+        # candidate (point, edge) pairs from the edge index
+        pair_points = []
+        pair_edges = []
+        for pos in outside.tolist():
+            x, y = points[pos].tolist()
+            seg = next(self.edge_index.nearest(x, y))[0]
+            reach = Vector2.vertex_to_segment_dist(Vector2(x, y), vrt[seg[0]], vrt[seg[1]])[0] + \
+                Vector2.tolerance
+            found = self.edge_index.intersection(x - reach, y - reach, x + reach, y + reach)
+            pair_points.extend([pos] * len(found))
+            pair_edges.extend(found)
+
+        pair_points = np.array(pair_points, dtype=np.int64)
+        pair_edges = np.array(pair_edges, dtype=np.int64)
+
+        near_x, near_y, dist = self.segments_closest_points(
+            vrt.x[pair_edges[:, 0]], vrt.y[pair_edges[:, 0]],
+            vrt.x[pair_edges[:, 1]], vrt.y[pair_edges[:, 1]],
+            points[pair_points, 0], points[pair_points, 1])
+
+        # the closest candidate of every point comes first in its group
+        order = np.lexsort((dist, pair_points))
+        first = order[np.flatnonzero(np.diff(pair_points[order], prepend=-1) != 0)]
+
+        result[pair_points[first], 0] = near_x[first]
+        result[pair_points[first], 1] = near_y[first]
+        for pair in first.tolist():
+            room_id = self._border_edge_room(tuple(pair_edges[pair].tolist()),
+                Vector2(near_x[pair], near_y[pair]))
+            if room_id is not None: rooms[pair_points[pair]] = room_id
+
+        return result, rooms
+
+
+
+    def _border_edge_room(self, edge, point):
+        '''
+        The room that has the border edge as a wall ('point' is on the edge).
+        '''
+        left, right = self.half_edges.edge_faces(edge[0], edge[1])
+        if left is not None: return left
+        if right is not None: return right
+        return self.locate_room(point)
+
+
+
+    @staticmethod
+    def segments_closest_points(seg1_x, seg1_y, seg2_x, seg2_y, x, y):
+        '''
+        Vectorized Vector2.vertex_to_segment_dist: closest points (x and y arrays)
+        of the segments to the points (x, y), and the distances to them.
+        '''
+        seg_x = seg2_x - seg1_x
+        seg_y = seg2_y - seg1_y
+        len_sq = seg_x * seg_x + seg_y * seg_y
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            along = ((x - seg1_x) * seg_x + (y - seg1_y) * seg_y) / len_sq
+        along = np.where(len_sq > 0., np.clip(along, 0., 1.), 0.)
+
+        near_x = seg1_x + along * seg_x
+        near_y = seg1_y + along * seg_y
+        return near_x, near_y, np.hypot(x - near_x, y - near_y)
+
+
+
+    def find_path(self, start, goal):
+        '''
+        Find a sequence of rooms leading from point 'start' to point 'goal'.
+        Returns a list of room ids (starting with the room that contains 'start'),
+        or None if either point is outside the mesh or the rooms are not connected.
+        '''
+        if self.room_graph is None:
+            raise RuntimeError("Mesh must be broken into convex rooms before path search")
+
+        start_room = self.locate_room(start)
+        goal_room = self.locate_room(goal)
+        if start_room is None or goal_room is None: return None
+
+        return self.room_graph.find_room_path(start_room, goal_room, start, goal)
+
+
+
+    def smooth_path(self, start, goal, corridor=None):
+        '''
+        Shortest path from 'start' to 'goal' through the given corridor of rooms
+        (found with find_path if not given), computed with the funnel algorithm.
+        Returns an (N, 2) array of waypoints or None if there is no path.
+        '''
+        if corridor is None:
+            corridor = self.find_path(start, goal)
+            if corridor is None: return None
+
+        start = (start.x, start.y)
+        goal = (goal.x, goal.y)
+        lefts, rights = self._corridor_portals(corridor, start, goal)
+        return np.array(string_pull(start, goal, lefts, rights), dtype=np.float64)
+
+
+
+    def smooth_paths(self, starts, goals, corridors=None):
+        '''
+        Batched version of smooth_path.
+        'starts' and 'goals' are (N, 2) arrays of positions, 'corridors' is an
+        optional list of N room sequences.
+        Returns a list of N waypoint arrays (None for pairs that have no path).
+        '''
+        starts = np.asarray(starts, dtype=np.float64).tolist()
+        goals = np.asarray(goals, dtype=np.float64).tolist()
+        if len(starts) != len(goals):
+            raise ValueError("Number of start and goal points must be equal")
+
+        paths = []
+        for pos in range(len(starts)):
+            start = tuple(starts[pos])
+            goal = tuple(goals[pos])
+
+            if corridors is not None:
+                corridor = corridors[pos]
+            else:
+                corridor = self.find_path(Vector2(*start), Vector2(*goal))
+
+            if corridor is None:
+                paths.append(None)
+                continue
+
+            lefts, rights = self._corridor_portals(corridor, start, goal)
+            paths.append(np.array(string_pull(start, goal, lefts, rights), dtype=np.float64))
+
+        return paths
+
+
+
+    def _corridor_portals(self, corridor, start, goal):
+        '''
+        Left and right portal endpoints along the corridor for string_pull (see RoomGraph.corridor_portals).
+        Rooms with reflex corners are crossed through the diagonals of their triangulation,
+        so that the path goes around the reflex corners instead of cutting through the walls.
+        '''
+        lefts, rights = self.room_graph.corridor_portals(corridor)
+
+        convex = self.room_locator.convex
+        if all(convex[room_id] for room_id in corridor): return lefts, rights
+
+        graph = self.room_graph
+        new_lefts = []
+        new_rights = []
+        enter = start
+        for pos, room_id in enumerate(corridor):
+            if pos + 1 < len(corridor):
+                entry = graph.find_entry(room_id, corridor[pos + 1])
+                left_i = int(graph.lefts[entry])
+                right_i = int(graph.rights[entry])
+
+            if not convex[room_id]:
+                room = self.rooms[room_id]
+                points, triangles = self._get_room_triangles(room_id)
+
+                # the room goes along the exit portal from its right end to its left end
+                leave = room.index(right_i) if pos + 1 < len(corridor) else goal
+                for left, right in triangle_portals(points, triangles, enter, leave):
+                    new_lefts.append(points[left])
+                    new_rights.append(points[right])
+
+            if pos + 1 < len(corridor):
+                new_lefts.append(lefts[pos])
+                new_rights.append(rights[pos])
+
+                # and the next room goes along it from the left end
+                if not convex[corridor[pos + 1]]:
+                    enter = self.rooms[corridor[pos + 1]].index(left_i)
+
+        return new_lefts, new_rights
+
+
+
+    def _get_room_triangles(self, room_id):
+        '''
+        Corner points of the room and its triangulation (see funnel.triangulate), cached.
+        '''
+        if room_id not in self._room_triangles:
+            room = self.rooms[room_id]
+            points = list(zip(self.vertices.x[room].tolist(), self.vertices.y[room].tolist()))
+            self._room_triangles[room_id] = (points, triangulate(points))
+        return self._room_triangles[room_id]
+
 
-                if external_angle > threshold:
-                    spikes.append((prev_ind, cur_ind, next_ind))
+    # def get_triangle_coords(self, triangle):
+
+    #     v1 = self.vertices[triangle[0]]
+    #     v2 = self.vertices[triangle[1]]
+    #     v3 = self.vertices[triangle[2]]
+    #     return [v1.x, v1.y, v2.x, v2.y, v3.x, v3.y, v1.x, v1.y]
+
+
+
+    @staticmethod
+    def check_convex(indices, vertices):
+
+        vrt = vertices
+        num_indices = len(indices)
+
+        is_convex = True
+
+        for cur_pos in range(num_indices):
+            next_pos = plus_wrap(cur_pos, num_indices)
+            nnext_pos = plus_wrap(next_pos, num_indices)
+
+            cur_ind = indices[cur_pos]
+            next_ind = indices[next_pos]
+            nnext_ind = indices[nnext_pos]
+            if Vector2.double_signed_area(vrt[cur_ind], vrt[next_ind], vrt[nnext_ind]) < 0:
+                is_convex = False
+                break
+
+        return is_convex
+
+
+
+    def find_spikes(self, threshold = 0.0):
+        """
+        Reflex border vertices whose external angle is above the threshold (in degrees),
+        as a list of (previous index, spike index, next index).
+        """
+        return list(tuple(spike) for spike in self.find_spikes_array(threshold).tolist())
+
+
+
+    def _border_triples(self):
+        """
+        Arrays of (previous, current, next) vertex indices for all border vertices.
+        Loops come in order (outline first); every loop starts from its second vertex.
+        """
+        loops = [self.outline] + self.holes
+        sizes = np.array([len(loop) for loop in loops], dtype=np.int64)
+        indices = np.fromiter(chain(*loops), dtype=np.int64, count=int(sizes.sum()))
+
+        loop_starts = np.repeat(np.cumsum(sizes) - sizes, sizes)
+        loop_sizes = np.repeat(sizes, sizes)
+        pos = np.arange(len(indices)) - loop_starts
+
+        prev_i = indices
+        cur_i = indices[loop_starts + (pos + 1) % loop_sizes]
+        next_i = indices[loop_starts + (pos + 2) % loop_sizes]
+        return prev_i, cur_i, next_i
 
-        return spikes
 
 
+    def find_spikes_array(self, threshold = 0.0):
+        """
+        Vectorized spike search over all border loops.
+        Returns an (N, 3) array of (previous index, spike index, next index).
+        """
+        prev_i, cur_i, next_i = self._border_triples()
+        xs = self.vertices.x
+        ys = self.vertices.y
+
+        prev_x = xs[prev_i]
+        prev_y = ys[prev_i]
+        cur_x = xs[cur_i]
+        cur_y = ys[cur_i]
+        next_x = xs[next_i]
+        next_y = ys[next_i]
+
+        # same as Vector2.double_signed_area(prev, cur, next)
+        signed_area = ((cur_x - prev_x) * (next_y - prev_y) - (next_x - prev_x) * (cur_y - prev_y)) / 2.0
+        reflex = np.flatnonzero(signed_area < 0.0)
+
+        # external angles of the reflex vertices, as in Vector2.angle
+        side1_x = cur_x[reflex] - prev_x[reflex]
+        side1_y = cur_y[reflex] - prev_y[reflex]
+        side2_x = next_x[reflex] - cur_x[reflex]
+        side2_y = next_y[reflex] - cur_y[reflex]
+
+        cos_angle = (side1_x * side2_x + side1_y * side2_y) / \
+            (np.sqrt(side1_x * side1_x + side1_y * side1_y) * np.sqrt(side2_x * side2_x + side2_y * side2_y))
+        external_angle = np.arccos(np.clip(cos_angle, -1.0, 1.0)) * 180.0 / math.pi
+
+        spikes = reflex[external_angle > threshold]
+        return np.column_stack((prev_i[spikes], cur_i[spikes], next_i[spikes]))
 
 
-    def get_portals(self, threshold = 0.0, tolerance = 0.000001):
+
+    def get_portals(self, threshold = 0.0, tolerance = 0.000001, observer=None, prune_portals=False):
 
         """
         This function uses algorithm from R. Oliva and N. Pelechano - 
@@ -720,32 +2145,69 @@ class Mesh2d(Polygon2d):
         The endpoints of portals can be new vertices,
         but they are guaranteed to lie on the polygon boundary (not inside the polygon)
 
-        TODO This function is slightly less complex right now
+        By default portals are placed greedily: every spike gets a portal and
+        portals are never reconsidered. With 'prune_portals', the necessity of portals
+        is evaluated as in the paper: a spike that is already resolved by a portal
+        ending at it gets no portal of its own, and when a new portal attaches to
+        an existing one, the older portal is removed if it is no longer needed.
         """
-        spikes = self.find_spikes(threshold)
+        if observer is None:
+            spikes = self.find_spikes_array(threshold)
+        else:
+            with observer.stage('find_spikes'):
+                spikes = self.find_spikes_array(threshold)
+            observer.count('spikes', len(spikes))
+
         portals = []
 
+        # R-tree over the portals created so far
+        portal_index = PortalIndex()
+
+        # spike -> (left, tip, right) of its sector
+        sectorvecs1, sectorvecs2 = self.get_sectors(spikes, threshold)
+        spike_ids = spikes[:, 1].tolist()
+        tip_coords = self.vertices.coords(spike_ids).tolist()
+        sectors = {}
+        for spike_i, (x, y), (x1, y1), (x2, y2) in \
+                zip(spike_ids, tip_coords, sectorvecs1.tolist(), sectorvecs2.tolist()):
+            sectors[spike_i] = (Vector2(x + x2, y + y2), Vector2(x, y), Vector2(x + x1, y + y1))
+
+        spikes = spikes.tolist()
+
+        # vertex -> portals that start or end at it, id of a portal -> portals that have it
+        # as 'parent_portal', ids of the removed portals (only kept when pruning)
+        incident = {}
+        children = {}
+        removed = set()
+        num_pruned = 0
+
         for spike in spikes:
 
-            prev_i = spike[0]
             spike_i = spike[1]
-            next_i = spike[2]
+            left, tip, right = sectors[spike_i]
 
-            sectorvec1, sectorvec2 = self.get_sector(prev_i, spike_i, next_i, threshold)
-            tip = self.vertices[spike_i]
-            left = tip + sectorvec2
-            right = tip + sectorvec1
+            # the spike has been resolved by a portal that ends at it
+            if prune_portals and any(self._portal_resolves(other, spike_i, sectors) \
+                    for other in incident.get(spike_i, ())):
+                num_pruned += 1
+                continue
 
             # find closest edge
             closest_seg, closest_seg_point, closest_seg_dst = \
                 self.find_closest_edge(left, tip, right)
 
-            # find closest vertex
-            closest_vert_i, closest_vert_dst = self.find_closest_vert(left, tip, right)
+            # find closest vertex (one farther than the closest edge is never used)
+            closest_vert_i, closest_vert_dst = self.find_closest_vert(left, tip, right, closest_seg_dst)
+
+            # find closest portal (one farther than the closest edge or vertex is never used,
+            # unless it is close enough to be snapped to the tip)
+            max_dist = closest_seg_dst
+            if closest_vert_dst is not None and (max_dist is None or closest_vert_dst < max_dist):
+                max_dist = closest_vert_dst
+            if max_dist is not None: max_dist = max(max_dist, tolerance)
 
-            # find closest portal
             closest_portal, closest_portal_point, closest_portal_dst = \
-                self.find_closest_portal(left, tip, right, portals)
+                self.find_closest_portal(left, tip, right, portal_index, max_dist)
 
             # remove tiny difference between points
             if closest_portal is not None:
@@ -779,7 +2241,7 @@ class Mesh2d(Polygon2d):
                 
 
             # check if there is a portal closer than the previous closest element
-            # TODO When attaching to an existing portal, need to reconsider the necessity of the older portal
+            # (with 'prune_portals', the older portal is reconsidered below)
             if closest_portal_dst is not None and closest_portal_dst < closest_dst:
                 closest_dst = closest_portal_dst
 
@@ -853,50 +2315,144 @@ class Mesh2d(Polygon2d):
                 # save reference to the portal that we are snapping to
                 portal['parent_portal'] = closest_portal
 
-            for new_portal in new_portals:
+            new_portals = list(new_portal for new_portal in new_portals \
+                if not new_portal['end_point'] == tip)
+            portals.extend(new_portals)
 
-                if not new_portal['end_point'] == tip:
-                    portals.append(new_portal)
+            for new_portal in new_portals:
+                end_point = new_portal['end_point']
+                portal_index.insert(new_portal, tip.x, tip.y, end_point.x, end_point.y)
+
+            if prune_portals:
+                for new_portal in new_portals:
+                    for vid in (new_portal['start_index'], new_portal['end_index']):
+                        if vid is not None: incident.setdefault(vid, []).append(new_portal)
+                    if 'parent_portal' in new_portal:
+                        children.setdefault(id(new_portal['parent_portal']), []).append(new_portal)
+
+                # older portals at the spikes that the new portals connect
+                for new_portal in new_portals:
+                    for vid in (new_portal['start_index'], new_portal['end_index']):
+                        if vid not in sectors: continue
+                        for other in list(incident[vid]):
+                            if any(other is fresh for fresh in new_portals): continue
+                            if self._portal_needed(other, sectors, incident): continue
+                            self._remove_portal(other, removed, incident, children)
+                            portal_index.remove(other)
+                            num_pruned += 1
+
+        if len(removed) > 0:
+            portals = list(portal for portal in portals if id(portal) not in removed)
+
+        if observer is not None:
+            observer.count('portal_candidates', len(portals))
+            if prune_portals: observer.count('pruned_portals', num_pruned)
 
         return portals
 
 
 
+    def _portal_resolves(self, portal, spike_i, sectors):
+        '''
+        Check if the portal (that starts or ends at the spike) leaves the spike inside of its sector,
+        so that it splits the spike angle into parts that are convex enough.
+        '''
+        left, tip, right = sectors[spike_i]
+        if portal['start_index'] == spike_i:
+            other = portal['end_point']
+        else:
+            other = self.vertices[portal['start_index']]
+        return self._inside_sector_inclusive(other, left, tip, right)
+
+
+
+    def _portal_needed(self, portal, sectors, incident):
+        '''
+        A portal is needed if one of its endpoints is a spike that no other portal resolves.
+        '''
+        for vid in (portal['start_index'], portal['end_index']):
+            if vid not in sectors: continue
+            if not any(other is not portal and self._portal_resolves(other, vid, sectors) \
+                    for other in incident[vid]):
+                return True
+        return False
+
 
-    def find_closest_vert(self, left, tip, right):
-        vrt = self.vertices
 
-        borders = [self.outline] + self.holes
+    def _remove_portal(self, portal, removed, incident, children):
+        '''
+        Remove a portal candidate: its id is added to 'removed' and it is taken out
+        of 'incident' (portals are compared by identity). Portals that share its new endpoint
+        (see _create_portal_endpoints) are given a new parent, as listed in 'children'.
+        '''
+        removed.add(id(portal))
+        for vid in (portal['start_index'], portal['end_index']):
+            if vid is not None:
+                incident[vid] = list(other for other in incident[vid] if other is not portal)
+
+        heir = None
+        for other in children.pop(id(portal), ()):
+            if id(other) in removed: continue
+
+            if other['end_index'] is not None:
+                del other['parent_portal']
+
+            # the first child creates the endpoint, the others use it
+            elif heir is None:
+                heir = other
+                del other['parent_portal']
+            else:
+                other['parent_portal'] = heir
+                children.setdefault(id(heir), []).append(other)
+
+
+
+
+    def find_closest_vert(self, left, tip, right, max_dist=None):
+        '''
+        Closest border vertex inside the sector (inclusive) and its distance from the tip,
+        or (None, None) if there is no such vertex (not farther than 'max_dist', if given).
+        Vertices are visited in the order of distance from the tip, so the search
+        stops at the first vertex that is inside the sector.
+        '''
+        vrt = self.vertices
 
-        closest_ind = None
+        closest = []
         closest_dst = None
 
-        for cur_i in chain(*borders):
+        for cur_i, dst in self.nearest_verts(tip.x, tip.y):
+            if closest_dst is not None and dst > closest_dst: break
+            if max_dist is not None and dst > max_dist: break
+
             cur_v = vrt[cur_i]
 
             if cur_v == tip: continue
 
-            if self._inside_sector_inclusive(vrt[cur_i], left, tip, right):
-                dst = Vector2.distance(vrt[cur_i], tip)
-                if closest_dst is None or dst < closest_dst:
-                    closest_dst = dst
-                    closest_ind = cur_i
+            if self._inside_sector_inclusive(cur_v, left, tip, right):
+                closest_dst = dst
+                closest.append(cur_i)
 
+        if closest_dst is None: return None, None
+
+        # of equally close vertices, take the first one along the border
+        closest_ind = min(closest, key=self._border_position) if len(closest) > 1 else closest[0]
         return closest_ind, closest_dst
 
 
 
     def find_closest_edge(self, left, tip, right):
         vrt = self.vertices
-        borders = [self.outline] + self.holes
-
-        segments = Polygon2d.get_segments(borders)
 
         closest_pt = None
         closest_dist = None
         closest_edge = None
 
-        for seg in segments:
+        # visit edges in the order of distance from the tip to their bounding boxes
+        for seg, box_dist in self.edge_index.nearest(tip.x, tip.y):
+
+            # no remaining edge can be closer than the one we already have
+            if closest_dist is not None and box_dist >= closest_dist: break
+
             seg_i1 = seg[0]
             seg_i2 = seg[1]
 
@@ -921,25 +2477,44 @@ class Mesh2d(Polygon2d):
 
 
 
-    def find_closest_portal(self, left, tip, right, portals):
+    def find_closest_portal(self, left, tip, right, portals, max_dist=None):
+        '''
+        Closest portal that has a point inside the sector, that point and its distance from the tip.
+        'portals' is a list of portal dicts, or a PortalIndex over them: then only
+        the portals whose bounding boxes are close enough to the tip are tested.
+        Portals farther than 'max_dist' (if given) are not reported.
+        Of equally close portals the first one (in the list or in the insertion order) is taken.
+        '''
+        if isinstance(portals, PortalIndex):
+            candidates = portals.nearest(tip.x, tip.y)
+        else:
+            candidates = ((portal, 0.0, order) for order, portal in enumerate(portals))
 
         closest_portal = None
         closest_dist = None
         closest_pt = None
+        closest_order = None
 
-        for portal in portals:
+        for portal, box_dist, order in candidates:
+
+            # the distance to the bounding box is a lower bound of the distance to the portal
+            if closest_dist is not None and box_dist > closest_dist: break
+            if max_dist is not None and box_dist > max_dist: break
 
             port1 = self.vertices[portal['start_index']]
             port2 = portal['end_point']
 
             candid_pt, candid_dist = self.segment_closest_point_inside_sector(port1, port2, left, tip, right)
             if candid_pt is None: continue
+            if max_dist is not None and candid_dist > max_dist: continue
 
             # update closest portal
-            if closest_dist is None or candid_dist < closest_dist:
+            if closest_dist is None or candid_dist < closest_dist or \
+                    (candid_dist == closest_dist and order < closest_order):
                 closest_dist = candid_dist
                 closest_pt = candid_pt
                 closest_portal = portal
+                closest_order = order
 
         return closest_portal, closest_pt, closest_dist
 
@@ -1014,35 +2589,534 @@ class Mesh2d(Polygon2d):
 
 
 
+    def get_sectors(self, spikes, threshold=0.0):
+        '''
+        Vectorized get_sector for an (N, 3) array of spikes (see find_spikes_array).
+        Returns 2 (N, 2) arrays with the unit vectors of the sector rays (same pairs as get_sector).
+        '''
+        spikes = np.asarray(spikes, dtype=np.int64).reshape(-1, 3)
+        xs = self.vertices.x
+        ys = self.vertices.y
+
+        spike_x = xs[spikes[:, 1]]
+        spike_y = ys[spikes[:, 1]]
+
+        vec1_x = spike_x - xs[spikes[:, 0]]
+        vec1_y = spike_y - ys[spikes[:, 0]]
+        vec2_x = spike_x - xs[spikes[:, 2]]
+        vec2_y = spike_y - ys[spikes[:, 2]]
+
+        length1 = np.sqrt(vec1_x * vec1_x + vec1_y * vec1_y)
+        length2 = np.sqrt(vec2_x * vec2_x + vec2_y * vec2_y)
+        vec1_x = vec1_x / length1
+        vec1_y = vec1_y / length1
+        vec2_x = vec2_x / length2
+        vec2_y = vec2_y / length2
+
+        sector_angle = np.arccos(np.clip(vec1_x * vec2_x + vec1_y * vec2_y, -1.0, 1.0))
+
+        # limit sector opening to 180 degrees
+        clearance = math.pi * threshold / 180.0
+        sector_angle_plus = np.minimum(sector_angle + clearance, math.pi)
+        clearance = (sector_angle_plus - sector_angle) / 2.0
+
+        cosine = np.cos(clearance)
+        sine = np.sin(clearance)
+
+        vecs1 = np.column_stack((cosine * vec1_x + sine * vec1_y, -sine * vec1_x + cosine * vec1_y))
+        vecs2 = np.column_stack((cosine * vec2_x - sine * vec2_y, sine * vec2_x + cosine * vec2_y))
+        return vecs1, vecs2
+
+
+
+
+    def _ray_chunks(self, ray1, ray2):
+        '''
+        Cut the ray into consecutive pieces of growing length, up to the point
+        where it leaves the bounding box of the border.
+        Yields (bbox of the piece, distance from ray1 to the end of the piece).
+        '''
+        bounds = self.edge_index.bounds()
+        if bounds is None: return
+
+        ray_dir = ray2 - ray1
+        ray_len = ray_dir.length()
+        if ray_len == 0: return
+        dir_x = ray_dir.x / ray_len
+        dir_y = ray_dir.y / ray_len
+
+        # farthest distance at which the ray can still hit an edge
+        max_dist = max(Vector2.distance(ray1, Vector2(bx, by)) \
+            for bx in (bounds[0], bounds[2]) for by in (bounds[1], bounds[3]))
+
+        # start with steps about the size of an average edge
+        step = max(max_dist / math.sqrt(len(self.edge_index)), Vector2.tolerance)
+        tol = Vector2.tolerance
+
+        dist0 = 0.0
+        while dist0 <= max_dist:
+            dist1 = dist0 + step
+            x0 = ray1.x + dir_x * dist0
+            y0 = ray1.y + dir_y * dist0
+            x1 = ray1.x + dir_x * dist1
+            y1 = ray1.y + dir_y * dist1
+            yield (min(x0, x1) - tol, min(y0, y1) - tol, max(x0, x1) + tol, max(y0, y1) + tol), dist1
+
+            dist0 = dist1
+            step *= 2.0
+
+
+
     def trace_ray(self, ray1, ray2):
+        '''
+        Find the closest intersection of the ray with the border.
+        Returns a tuple (intersection point, edge) or None.
+        Only the edges that lie near the ray are tested: the ray is walked
+        piece by piece through the edge index until a hit is found.
+        '''
         vrt = self.vertices
-        borders = [self.outline] + self.holes
-        segments = Polygon2d.get_segments(borders)
 
-        intersections = []
-        for seg in segments:
-            seg_i1 = seg[0]
-            seg_i2 = seg[1]
+        tested = set()
+        closest = None
+        closest_dist = None
 
-            seg1 = vrt[seg_i1]
-            seg2 = vrt[seg_i2]
-            # ignore edges that are adjacent to the ray's starting point
-            if seg1 == ray1 or seg2 == ray1:
-                continue
+        for chunk_box, chunk_end in self._ray_chunks(ray1, ray2):
+            for seg in self.edge_index.intersection(*chunk_box):
+                if seg in tested: continue
+                tested.add(seg)
+
+                seg_i1 = seg[0]
+                seg_i2 = seg[1]
+
+                seg1 = vrt[seg_i1]
+                seg2 = vrt[seg_i2]
+                # ignore edges that are adjacent to the ray's starting point
+                if seg1 == ray1 or seg2 == ray1:
+                    continue
+
+                inter_pt = Vector2.where_segment_crosses_ray(seg1, seg2, ray1, ray2)
+                if inter_pt is not None:
+                    dist = Vector2.distance(ray1, inter_pt)
+                    if closest_dist is None or dist < closest_dist:
+                        # a tuple of a vertex and an edge
+                        closest = (inter_pt, (seg_i1, seg_i2))
+                        closest_dist = dist
+
+            # intersections further along the ray can not be closer than this one
+            if closest_dist is not None and closest_dist <= chunk_end:
+                break
 
-            inter_pt = Vector2.where_segment_crosses_ray(seg1, seg2, ray1, ray2)
-            if inter_pt is not None:
-                # append a tuple of a vertex and an edge
-                intersections.append((inter_pt, (seg_i1, seg_i2)))
+        return closest
 
 
-        if len(intersections) == 0:
-            return None
 
-        # find closest intersection:
-        inter_dist = ((inter, Vector2.distance(ray1, inter[0])) for inter in intersections)
-        res = min(inter_dist, key=itemgetter(1))[0]
-        return res
+    def trace_rays(self, origins, targets):
+        '''
+        Trace many rays at once, as trace_ray does for one ray.
+        'origins' and 'targets' are (N, 2) arrays: ray i starts at origins[i]
+        and goes through targets[i].
+
+        Returns two arrays: (N, 2) closest intersection points (NaN where a ray
+        hits nothing) and (N, 2) edges that were hit (-1 where a ray hits nothing).
+
+        The rays walk together through a uniform grid over the edges (the grid of
+        the edge index): every round tests the edges in the current cell of each
+        ray that has no hit yet, all at once.
+        '''
+        origins = np.asarray(origins, dtype=np.float64).reshape(-1, 2)
+        targets = np.asarray(targets, dtype=np.float64).reshape(-1, 2)
+        if origins.shape != targets.shape:
+            raise ValueError("trace_rays: origins and targets must have the same shape")
+
+        num_rays = len(origins)
+        points = np.full((num_rays, 2), np.nan)
+        edges = np.full((num_rays, 2), -1, dtype=np.int64)
+
+        grid = self.edge_index.grid
+        if grid is None or num_rays == 0: return points, edges
+
+        # rays of zero length hit nothing
+        dir_x = targets[:, 0] - origins[:, 0]
+        dir_y = targets[:, 1] - origins[:, 1]
+        ray_len = np.sqrt(dir_x * dir_x + dir_y * dir_y)
+        valid = np.flatnonzero(ray_len > 0)
+
+        ray1_x = origins[valid, 0]
+        ray1_y = origins[valid, 1]
+        ray2_x = targets[valid, 0]
+        ray2_y = targets[valid, 1]
+
+        closest_dist = np.full(len(valid), np.inf)
+        valid_points = np.full((len(valid), 2), np.nan)
+        valid_edges = np.full((len(valid), 2), -1, dtype=np.int64)
+
+        walk = grid.walk_rays(ray1_x, ray1_y, dir_x[valid] / ray_len[valid], dir_y[valid] / ray_len[valid],
+            closest_dist)
+
+        for rays, cell_end, cand_rays, cand_segs in walk:
+            if len(cand_segs) == 0: continue
+            self._closest_ray_hits(cand_rays, grid.keys[cand_segs], ray1_x, ray1_y, ray2_x, ray2_y,
+                closest_dist, valid_points, valid_edges)
+
+        points[valid] = valid_points
+        edges[valid] = valid_edges
+        return points, edges
+
+
+
+    def _closest_ray_hits(self, cand_rays, cand_edges, ray1_x, ray1_y, ray2_x, ray2_y,
+            closest_dist, points, edges):
+        '''
+        Test the candidate (ray, edge) pairs and keep the closest hit of every ray
+        in 'closest_dist', 'points' and 'edges'. Ties go to the hit found first.
+        '''
+        xs = self.vertices.x
+        ys = self.vertices.y
+        tol = Vector2.tolerance
+
+        seg1_x = xs[cand_edges[:, 0]]
+        seg1_y = ys[cand_edges[:, 0]]
+        seg2_x = xs[cand_edges[:, 1]]
+        seg2_y = ys[cand_edges[:, 1]]
+        start_x = ray1_x[cand_rays]
+        start_y = ray1_y[cand_rays]
+
+        hit, hit_x, hit_y = Mesh2d.where_segments_cross_rays(seg1_x, seg1_y, seg2_x, seg2_y,
+            start_x, start_y, ray2_x[cand_rays], ray2_y[cand_rays])
+
+        # ignore edges that are adjacent to the ray's starting point
+        hit &= ~((np.abs(seg1_x - start_x) < tol) & (np.abs(seg1_y - start_y) < tol))
+        hit &= ~((np.abs(seg2_x - start_x) < tol) & (np.abs(seg2_y - start_y) < tol))
+
+        hits = np.flatnonzero(hit)
+        if len(hits) == 0: return
+
+        dx = start_x[hits] - hit_x[hits]
+        dy = start_y[hits] - hit_y[hits]
+        dist = np.sqrt(dx * dx + dy * dy)
+
+        # closest hit of every ray, the first one of equally close hits
+        order = np.lexsort((hits, dist, cand_rays[hits]))
+        hit_rays, first = np.unique(cand_rays[hits][order], return_index=True)
+        best = order[first]
+
+        closer = dist[best] < closest_dist[hit_rays]
+        best = best[closer]
+        hit_rays = hit_rays[closer]
+
+        closest_dist[hit_rays] = dist[best]
+        points[hit_rays, 0] = hit_x[hits[best]]
+        points[hit_rays, 1] = hit_y[hits[best]]
+        edges[hit_rays] = cand_edges[hits[best]]
+
+
+
+    @staticmethod
+    def where_segments_cross_rays(seg1_x, seg1_y, seg2_x, seg2_y, ray1_x, ray1_y, ray2_x, ray2_y):
+        '''
+        Vector2.where_segment_crosses_ray for arrays of segments and rays, element by element.
+        Returns (hit mask, x, y) of the intersections.
+        Segments that lie on the line of their ray are not hit.
+        '''
+        # as in Vector2.lines_intersect
+        r1_x = seg2_x - seg1_x
+        r1_y = seg2_y - seg1_y
+        r2_x = ray2_x - ray1_x
+        r2_y = ray2_y - ray1_y
+
+        r1r2 = r1_x * r2_y - r2_x * r1_y
+        r1s1 = r1_x * seg1_y - seg1_x * r1_y
+        r1s2 = r1_x * ray1_y - ray1_x * r1_y
+
+        def between(x, y, x1, y1, x2, y2):
+            # Vector2.point_between_inclusive
+            along_x = np.abs(x1 - x2) > np.abs(y1 - y2)
+            return np.where(along_x,
+                (x >= np.minimum(x1, x2)) & (x <= np.maximum(x1, x2)),
+                (y >= np.minimum(y1, y2)) & (y <= np.maximum(y1, y2)))
+
+        # parallel lines give NaN coordinates, they fail all the checks
+        with np.errstate(divide='ignore', invalid='ignore'):
+            b = (r1s1 - r1s2) / r1r2
+            line_x = ray1_x + b * r2_x
+            line_y = ray1_y + b * r2_y
+
+            hit = (r1r2 != 0) & between(line_x, line_y, seg1_x, seg1_y, seg2_x, seg2_y)
+
+            # Vector2.vertex_on_ray
+            hit &= between(line_x, line_y, ray1_x, ray1_y, ray2_x, ray2_y) | \
+                between(ray2_x, ray2_y, ray1_x, ray1_y, line_x, line_y)
+
+        return hit, line_x, line_y
+
+
+
+    def visibility_polygon(self, point, max_range=None, direction=None, fov=None, arc_step=10.0):
+        '''
+        Region of the mesh visible from 'point', as a list of Vector2 (CCW).
+
+        The border vertices are swept by angle around the point. At every vertex that
+        can be seen, the boundary of the visible region can jump along the ray through it:
+        the ray is traced on (with trace_rays, all the vertices at once) until it is blocked
+        on each side. Between two such angles the boundary follows a single border edge.
+
+        'max_range' clips the region to a circle; arcs are made of segments of at most
+        'arc_step' degrees. Only the vertices and edges within range are swept.
+        'direction' (Vector2) and 'fov' (in degrees) clip the region to a view cone;
+        the point itself is then the first vertex of the polygon.
+        '''
+        if not self.point_inside(point):
+            raise ValueError("Visibility can only be computed from a point inside the mesh")
+
+        cone = direction is not None and fov is not None and fov < 360.
+        if cone and direction.length() == 0:
+            raise ValueError("View direction must not be zero")
+
+        # angles are measured from the start of the cone (or from -pi)
+        if cone:
+            start_angle = math.atan2(direction.y, direction.x) - math.radians(fov) / 2.
+            span = math.radians(fov)
+        else:
+            start_angle = -math.pi
+            span = 2. * math.pi
+
+        sweep_x, sweep_y, aims = self._visibility_sweep(point, max_range)
+
+        offsets = np.mod(np.arctan2(sweep_y, sweep_x) - start_angle, 2. * math.pi)
+        inside = np.flatnonzero((offsets > 0.) & (offsets < span))
+        order = inside[np.argsort(offsets[inside], kind='mergesort')]
+
+        # rays along the sides of the cone come first; without a cone, one ray at the start
+        # of the sweep makes sure that there is a boundary point even with no vertex in range
+        end_angle = start_angle + span
+        dirs = np.vstack(([[math.cos(start_angle), math.sin(start_angle)],
+            [math.cos(end_angle), math.sin(end_angle)]], np.column_stack((sweep_x[order], sweep_y[order]))))
+        dirs /= np.sqrt((dirs * dirs).sum(axis=1))[:, None]
+
+        # (before point, its edge, after point, its edge) for every ray that is not blocked
+        events = self._visibility_events(point, dirs, [None, None] + list(aims[pos] for pos in order), max_range)
+        first, last = events[:2]
+        events = list(event for event in events[2:] if event is not None)
+
+        if cone:
+            # only the side inside of the cone counts on its boundary rays
+            events = [(None, None) + first[2:]] + events + [last[:2] + (None, None)]
+        else:
+            events = [first] + events
+
+        visible = []
+        num_events = len(events)
+        for num in range(num_events):
+            before, before_edge, after, after_edge = events[num]
+
+            if before is not None:
+                self._add_visible_point(visible, self._clip_to_range(point, before, max_range))
+            if after is not None:
+                self._add_visible_point(visible, self._clip_to_range(point, after, max_range))
+
+            if max_range is None or after is None: continue
+
+            # boundary up to the next event: along an edge, or along the circle
+            next_before, next_edge = events[(num + 1) % num_events][:2]
+            for vert in self._visible_span(point, max_range, after, after_edge,
+                    next_before, next_edge, arc_step, num_events == 1):
+                self._add_visible_point(visible, vert)
+
+        if cone:
+            visible.insert(0, point.copy())
+        if len(visible) > 1 and visible[0] == visible[-1]:
+            visible.pop()
+
+        return visible
+
+
+
+    def _visibility_sweep(self, point, max_range=None):
+        '''
+        Directions (x and y arrays) from the point to sweep for visibility_polygon,
+        and what each of them aims at: (vertex index or None, distance).
+        These are the border vertices in range, and, with a range, the points where
+        border edges cross the circle (the boundary goes between an edge and the circle there).
+        '''
+        if max_range is None:
+            vids = list(chain(self.outline, *self.holes))
+        else:
+            corner = Vector2(max_range, max_range)
+            vids = list(self.find_verts_in_bbox(point - corner, point + corner))
+
+        vids = np.array(sorted(vids), dtype=np.int64)
+        sweep_x = self.vertices.x[vids] - point.x
+        sweep_y = self.vertices.y[vids] - point.y
+        dist = np.sqrt(sweep_x * sweep_x + sweep_y * sweep_y)
+
+        keep = dist > Vector2.tolerance
+        if max_range is not None: keep &= dist <= max_range
+        sweep_x = sweep_x[keep]
+        sweep_y = sweep_y[keep]
+        aims = list(zip(vids[keep].tolist(), dist[keep].tolist()))
+
+        if max_range is None: return sweep_x, sweep_y, aims
+
+        edges = np.array(list(self.find_edges_in_bbox(point - corner, point + corner)), dtype=np.int64)
+        if len(edges) == 0: return sweep_x, sweep_y, aims
+
+        start_x = self.vertices.x[edges[:, 0]] - point.x
+        start_y = self.vertices.y[edges[:, 0]] - point.y
+        seg_x = self.vertices.x[edges[:, 1]] - point.x - start_x
+        seg_y = self.vertices.y[edges[:, 1]] - point.y - start_y
+
+        # |start + t * seg| = max_range
+        a = seg_x * seg_x + seg_y * seg_y
+        b = 2. * (start_x * seg_x + start_y * seg_y)
+        c = start_x * start_x + start_y * start_y - max_range * max_range
+        disc = b * b - 4. * a * c
+        cross = disc > 0.
+        roots = np.concatenate(((-b[cross] - np.sqrt(disc[cross])) / (2. * a[cross]),
+            (-b[cross] + np.sqrt(disc[cross])) / (2. * a[cross])))
+        start_x = np.tile(start_x[cross], 2)
+        start_y = np.tile(start_y[cross], 2)
+        seg_x = np.tile(seg_x[cross], 2)
+        seg_y = np.tile(seg_y[cross], 2)
+
+        on_edge = (roots > 0.) & (roots < 1.)
+        cross_x = start_x[on_edge] + roots[on_edge] * seg_x[on_edge]
+        cross_y = start_y[on_edge] + roots[on_edge] * seg_y[on_edge]
+
+        return np.concatenate((sweep_x, cross_x)), np.concatenate((sweep_y, cross_y)), \
+            aims + [(None, max_range)] * len(cross_x)
+
+
+
+    def _visibility_events(self, point, dirs, aims, max_range=None):
+        '''
+        Trace the rays from 'point' along 'dirs' past the vertices they meet, until they are
+        blocked on both sides: on the CW side (the boundary just before the ray in the CCW sweep)
+        and on the CCW side (just after it).
+        aims[i] is None or (vertex index or None, distance): if something blocks ray i
+        before that distance, the ray gets no event; otherwise the ray is known to reach the vertex.
+        Returns a list of (before point, before edge, after point, after edge) or None
+        for every ray. Edges are None for points beyond 'max_range'.
+        '''
+        num_rays = len(dirs)
+        events = list([None, None, None, None] for ray in range(num_rays))
+
+        origins = np.tile([point.x, point.y], (num_rays, 1))
+        aims = list(aims)
+        active = list(range(num_rays))
+
+        while len(active) > 0:
+            points, edges = self.trace_rays(origins[active], origins[active] + dirs[active])
+
+            still_active = []
+            for pos, ray in enumerate(active):
+                event = events[ray]
+                aim = aims[ray]
+                aims[ray] = None
+
+                start = Vector2(origins[ray, 0], origins[ray, 1])
+
+                if np.isnan(points[pos, 0]):
+                    # a ray aimed at a convex corner can slip past it outside of the mesh
+                    if aim is None or aim[0] is None:
+                        if aim is not None: events[ray] = None
+                        continue
+                    hit = self.vertices[aim[0]]
+                    edge = None
+                else:
+                    hit = Vector2(points[pos, 0], points[pos, 1])
+                    edge = tuple(edges[pos].tolist())
+
+                # the ray reaches the vertex it is aimed at unless something is in the way:
+                # hits at the vertex itself are not exact
+                if aim is not None and Vector2.distance(start, hit) < aim[1] - Vector2.tolerance:
+                    events[ray] = None
+                    continue
+
+                if aim is not None and aim[0] is not None:
+                    vid = aim[0]
+
+                elif max_range is not None and Vector2.distance(point, hit) > max_range + Vector2.tolerance:
+                    # beyond the range the exact boundary does not matter
+                    edge = None
+                    vid = None
+
+                else:
+                    vid = next((idx for idx in edge if self.vertices[idx] == hit), None)
+
+                if vid is None:
+                    # a wall blocks both sides
+                    if event[0] is None: event[0], event[1] = hit, edge
+                    if event[2] is None: event[2], event[3] = hit, edge
+                    continue
+
+                # an edge of the vertex on a side of the ray blocks that side; with both edges
+                # on one side, the one that turns back further towards the point is seen
+                ray_dir = Vector2(*dirs[ray])
+                vert = self.vertices[vid]
+                blocking = [None, None]
+                for other in (self._loops.prev(vid), self._loops.next(vid)):
+                    edge_dir = self.vertices[other] - vert
+                    side = Vector2.cross(ray_dir, edge_dir)
+                    if abs(side) <= Vector2.tolerance: continue
+
+                    cos_angle = ray_dir.dot_product(edge_dir) / edge_dir.length()
+                    which = 0 if side < 0 else 1
+                    if blocking[which] is None or cos_angle < blocking[which][0]:
+                        blocking[which] = (cos_angle, other)
+
+                if event[0] is None and blocking[0] is not None:
+                    event[0], event[1] = vert, (vid, blocking[0][1])
+                if event[2] is None and blocking[1] is not None:
+                    event[2], event[3] = vert, (vid, blocking[1][1])
+
+                if event[0] is None or event[2] is None:
+                    # the ray goes on past the vertex
+                    origins[ray] = (vert.x, vert.y)
+                    still_active.append(ray)
+
+            active = still_active
+
+        return list(None if event is None else tuple(event) for event in events)
+
+
+
+    @staticmethod
+    def _clip_to_range(point, vert, max_range):
+        if max_range is None: return vert
+        dist = Vector2.distance(point, vert)
+        if dist <= max_range: return vert
+        return point + (vert - point) * (max_range / dist)
+
+
+
+    @staticmethod
+    def _add_visible_point(visible, vert):
+        if len(visible) == 0 or visible[-1] != vert:
+            visible.append(vert)
+
+
+
+    def _visible_span(self, point, max_range, start, start_edge, end, end_edge, arc_step, around=False):
+        '''
+        Points of the boundary of the visible region clipped to the circle, strictly between
+        'start' (on start_edge) and 'end' (on end_edge), going CCW around 'point'.
+        Edges cross the circle only at the ends of spans, so the boundary either goes straight
+        along one edge, or along the circle. With 'around', the span goes all the way around the point.
+        '''
+        # along the edge: both ends on it, the edge goes CCW around the point and stays in range
+        if start_edge is not None and end_edge is not None and set(start_edge) == set(end_edge) and \
+                Vector2.cross(start - point, end - point) >= 0 and \
+                Vector2.distance(point, (start + end) * .5) <= max_range + Vector2.tolerance:
+            return []
+
+        angle1 = math.atan2(start.y - point.y, start.x - point.x)
+        angle2 = math.atan2(end.y - point.y, end.x - point.x)
+        delta = (angle2 - angle1) % (2. * math.pi)
+        if around and delta == 0.: delta = 2. * math.pi
+
+        num = int(math.ceil(delta / math.radians(arc_step)))
+        return list(point + Vector2(math.cos(angle1 + delta * k / num), math.sin(angle1 + delta * k / num)) * max_range \
+            for k in range(1, num))
 
 
 
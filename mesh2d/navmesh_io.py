@@ -0,0 +1,174 @@
+'''
+Binary navmesh files.
+
+Layout (all numbers are little-endian):
+
+    header          magic (8 bytes), format version (uint32), number of sections (uint32)
+    section table   one entry per section: name (16 bytes), numpy dtype (8 bytes),
+                    data offset, number of dimensions, 2 dimension sizes (uint64 each)
+    section data    raw array data, every section starts at a 64 byte boundary
+
+Loops (outline, holes, rooms) are stored as an offset array plus a flat index array:
+the indices of loop 'i' are indices[offsets[i]:offsets[i+1]].
+The 'build_threshold' section (one float) is optional: files without it load
+with no build threshold.
+
+The file is memory-mapped on loading and the arrays are views of the mapping,
+so opening a navmesh does not read it and processes that open the same file share its pages.
+'''
+
+import struct
+
+import numpy as np
+
+from .mesh2d import Mesh2d, Polygon2d
+from .vertex_buffer import VertexBuffer
+from .room_graph import RoomGraph
+from .room_locator import RoomLocator
+
+
+MAGIC = b'MESH2DNV'
+VERSION = 1
+
+_header = struct.Struct('<8sII')
+_section = struct.Struct('<16s8sQQQQ')
+_align = 64
+
+
+
+def _loops_to_csr(loops):
+    offsets = np.zeros(len(loops) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(loop) for loop in loops])
+    indices = np.fromiter((idx for loop in loops for idx in loop),
+        dtype=np.int64, count=int(offsets[-1]))
+    return offsets, indices
+
+
+
+def _csr_to_arrays(offsets, indices):
+    offsets = offsets.tolist()
+    return list(indices[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1))
+
+
+
+def save_navmesh(mesh, path):
+    '''
+    Write the mesh (its border, and its rooms and portals if it has been broken into convex rooms)
+    into a binary navmesh file.
+    '''
+    vertices = mesh.vertices
+    columns = np.vstack((vertices.x, vertices.y))
+
+    hole_offsets, hole_indices = _loops_to_csr(mesh.holes)
+
+    sections = [
+        ('vertices', columns.astype('<f8')),
+        ('outline', np.array(mesh.outline, dtype='<i8')),
+        ('hole_offsets', hole_offsets),
+        ('hole_indices', hole_indices),
+    ]
+
+    graph = getattr(mesh, 'room_graph', None)
+    if graph is not None:
+        room_offsets, room_indices = _loops_to_csr(mesh.rooms)
+        sections += [
+            ('room_offsets', room_offsets),
+            ('room_indices', room_indices),
+            ('portals', np.array(mesh.portals, dtype='<i8').reshape(-1, 2)),
+            ('portal_rooms', graph.portal_rooms),
+            ('graph_offsets', graph.offsets),
+            ('graph_portals', graph.portal_ids),
+            ('graph_neighbours', graph.neighbours),
+            ('graph_lefts', graph.lefts),
+            ('graph_rights', graph.rights),
+        ]
+
+    if mesh.build_threshold is not None:
+        sections.append(('build_threshold', np.array([mesh.build_threshold], dtype='<f8')))
+
+    table = []
+    offset = _header.size + _section.size * len(sections)
+    for name, arr in sections:
+        arr = np.ascontiguousarray(arr, dtype=arr.dtype.newbyteorder('<'))
+        offset = (offset + _align - 1) // _align * _align
+        shape = arr.shape + (0,) * (2 - arr.ndim)
+        table.append((name, arr, offset, shape))
+        offset += arr.nbytes
+
+    with open(path, 'wb') as outf:
+        outf.write(_header.pack(MAGIC, VERSION, len(sections)))
+        for name, arr, offset, shape in table:
+            outf.write(_section.pack(name.encode('ascii'), arr.dtype.str.encode('ascii'),
+                offset, arr.ndim, shape[0], shape[1]))
+
+        for name, arr, offset, shape in table:
+            outf.write(b'\0' * (offset - outf.tell()))
+            outf.write(arr.tobytes())
+
+
+
+def read_sections(path):
+    '''
+    Memory-map a navmesh file and return a dict: section name -> array.
+    The arrays are copy-on-write views of the file.
+    '''
+    data = np.memmap(path, dtype=np.uint8, mode='c')
+
+    if len(data) < _header.size:
+        raise ValueError("{} is not a navmesh file".format(path))
+
+    magic, version, num_sections = _header.unpack(data[:_header.size].tobytes())
+    if magic != MAGIC:
+        raise ValueError("{} is not a navmesh file".format(path))
+    if version != VERSION:
+        raise ValueError("Unsupported navmesh format version {}".format(version))
+
+    sections = {}
+    for pos in range(num_sections):
+        start = _header.size + pos * _section.size
+        name, dtype, offset, ndim, dim0, dim1 = \
+            _section.unpack(data[start:start + _section.size].tobytes())
+
+        dtype = np.dtype(dtype.rstrip(b'\0').decode('ascii'))
+        shape = (dim0, dim1)[:ndim]
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+
+        if offset + nbytes > len(data):
+            raise ValueError("Navmesh file {} is truncated".format(path))
+
+        sections[name.rstrip(b'\0').decode('ascii')] = \
+            data[offset:offset + nbytes].view(dtype).reshape(shape)
+
+    return sections
+
+
+
+def load_navmesh(path):
+    '''
+    Load a Mesh2d from a binary navmesh file.
+    The vertex buffer, the border loops, the rooms and the portals use the mapped memory
+    directly; their list views and the spatial indices are built on first use.
+    '''
+    sections = read_sections(path)
+
+    vertices = VertexBuffer.from_columns(sections['vertices'])
+
+    # the file contains a valid polygon, so there is no need for the checks in Polygon2d.__init__
+    mesh = Mesh2d.from_polygon(Polygon2d.from_loop_arrays(vertices, sections['outline'],
+        _csr_to_arrays(sections['hole_offsets'], sections['hole_indices'])))
+
+    if 'room_offsets' in sections:
+        room_offsets = sections['room_offsets']
+        room_indices = sections['room_indices']
+
+        mesh.set_room_arrays(room_offsets, room_indices, sections['portals'])
+
+        mesh.room_graph = RoomGraph(
+            sections['graph_offsets'], sections['graph_portals'], sections['graph_neighbours'],
+            sections['graph_lefts'], sections['graph_rights'], sections['portal_rooms'], vertices)
+        mesh.room_locator = RoomLocator(room_offsets, room_indices, vertices)
+
+    if 'build_threshold' in sections:
+        mesh.build_threshold = float(sections['build_threshold'][0])
+
+    return mesh
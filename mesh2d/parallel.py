@@ -0,0 +1,69 @@
+'''
+Building navmeshes for many polygons in parallel.
+'''
+
+import multiprocessing
+
+import numpy as np
+
+from .mesh2d import Mesh2d, Polygon2d
+from .vertex_buffer import VertexBuffer
+
+
+
+def _polygon_geometry(poly):
+    '''
+    The part of a polygon that is shipped to a worker process:
+    vertex coordinates as a (2, N) array and the index loops.
+    '''
+    columns = np.vstack((poly.vertices.x, poly.vertices.y))
+    return columns, list(poly.outline), list(list(hole) for hole in poly.holes)
+
+
+
+def _build_one(job):
+    columns, outline, holes, threshold, return_errors = job
+
+    mesh = Mesh2d.from_polygon(Polygon2d.from_loops(
+        VertexBuffer.from_columns(columns), outline, holes))
+
+    try:
+        mesh.break_into_convex(threshold)
+    except Exception as ex:
+        if not return_errors: raise
+        return ex
+
+    return mesh
+
+
+
+def build_many(polygons, threshold=0.0, workers=None, return_errors=False):
+    '''
+    Break every polygon (Polygon2d or Mesh2d) into convex rooms.
+    The input polygons are not changed: the geometry is copied to a pool
+    of 'workers' processes (default: one per CPU) and the built meshes are
+    sent back in the input order.
+    With workers=1 everything is done in this process.
+
+    If 'return_errors' is set, a polygon that fails to decompose gets the
+    exception in its place of the result list instead of stopping the whole batch.
+    '''
+    jobs = list(_polygon_geometry(poly) + (threshold, return_errors) for poly in polygons)
+
+    if workers is None: workers = multiprocessing.cpu_count()
+    workers = max(1, min(workers, len(jobs)))
+
+    if workers == 1:
+        return list(_build_one(job) for job in jobs)
+
+    # a few chunks per worker balance the load without too much messaging
+    chunk_size = max(1, len(jobs) // (workers * 4))
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        results = pool.map(_build_one, jobs, chunk_size)
+    finally:
+        pool.close()
+        pool.join()
+
+    return results
@@ -0,0 +1,217 @@
+import heapq
+import math
+
+import numpy as np
+
+
+
+class RoomGraph(object):
+    '''
+    Adjacency of the convex rooms of a Mesh2d, stored in compressed sparse row form.
+
+    For room 'r', the entries offsets[r] ... offsets[r+1]-1 of the other arrays
+    describe the portals of that room:
+
+        portal_ids[entry]  - index of the portal in Mesh2d.portals
+        neighbours[entry]  - room on the other side of the portal
+        lefts[entry]       - vertex index of the portal endpoint on the left and
+        rights[entry]      - on the right when leaving room 'r' through the portal
+
+    portal_rooms[p] holds the two rooms connected by portal 'p' (-1 if the portal
+    could not be matched to a room).
+    '''
+
+    def __init__(self, offsets, portal_ids, neighbours, lefts, rights, portal_rooms, vertices):
+        self.offsets = offsets
+        self.portal_ids = portal_ids
+        self.neighbours = neighbours
+        self.lefts = lefts
+        self.rights = rights
+        self.portal_rooms = portal_rooms
+
+        # coordinates of portal endpoints
+        self.left_x = vertices.x[lefts]
+        self.left_y = vertices.y[lefts]
+        self.right_x = vertices.x[rights]
+        self.right_y = vertices.y[rights]
+
+        # portal midpoints are the nodes of the path search
+        self.mid_x = (self.left_x + self.right_x) / 2.0
+        self.mid_y = (self.left_y + self.right_y) / 2.0
+
+        # per-room lists of (entry, neighbour, mid x, mid y), built on first search
+        self._adjacency = None
+
+        # per-entry (x, y) tuples of portal endpoints, built on first use
+        self._left_pts = None
+        self._right_pts = None
+
+
+
+    @staticmethod
+    def from_rooms(rooms, portals, vertices):
+        '''
+        Build the graph from room index loops (CCW) and portals given as pairs of vertex indices.
+        '''
+        # every directed edge of every room -> room
+        edge_rooms = {}
+        for room_id, room in enumerate(rooms):
+            prev = room[-1]
+            for cur in room:
+                edge_rooms[(prev, cur)] = room_id
+                prev = cur
+
+        portal_rooms = np.full((len(portals), 2), -1, dtype=np.int64)
+        entries = []
+
+        for portal_id, (start_i, end_i) in enumerate(portals):
+            # rooms are CCW, so each room goes along the portal in its own direction
+            room1 = edge_rooms.get((start_i, end_i), -1)
+            room2 = edge_rooms.get((end_i, start_i), -1)
+            portal_rooms[portal_id] = (room1, room2)
+
+            if room1 < 0 or room2 < 0: continue
+
+            # (room, portal, neighbour, left, right)
+            entries.append((room1, portal_id, room2, end_i, start_i))
+            entries.append((room2, portal_id, room1, start_i, end_i))
+
+        entries.sort(key=lambda entry: entry[0])
+
+        if len(entries) > 0:
+            entry_rooms, portal_ids, neighbours, lefts, rights = \
+                (np.array(column, dtype=np.int64) for column in zip(*entries))
+        else:
+            entry_rooms, portal_ids, neighbours, lefts, rights = \
+                (np.zeros(0, dtype=np.int64) for i in range(5))
+
+        offsets = np.zeros(len(rooms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(entry_rooms, minlength=len(rooms)))
+
+        return RoomGraph(offsets, portal_ids, neighbours, lefts, rights, portal_rooms, vertices)
+
+
+
+    @property
+    def num_rooms(self):
+        return len(self.offsets) - 1
+
+
+
+    def room_entries(self, room):
+        '''
+        Range of entries that belong to the given room.
+        '''
+        return range(self.offsets[room], self.offsets[room + 1])
+
+
+
+    def room_neighbours(self, room):
+        return self.neighbours[self.offsets[room]:self.offsets[room + 1]].tolist()
+
+
+
+    def find_entry(self, room, neighbour):
+        '''
+        Entry of the portal that leads from 'room' to 'neighbour', or None.
+        '''
+        for entry in self.room_entries(room):
+            if self.neighbours[entry] == neighbour:
+                return entry
+        return None
+
+
+
+    def corridor_portals(self, corridor):
+        '''
+        Returns 2 lists with the left and the right (x, y) endpoints of the portals
+        crossed when walking through the given sequence of rooms.
+        '''
+        if self._left_pts is None:
+            self._left_pts = zip(self.left_x.tolist(), self.left_y.tolist())
+            self._right_pts = zip(self.right_x.tolist(), self.right_y.tolist())
+
+        lefts = []
+        rights = []
+        for room1, room2 in zip(corridor[:-1], corridor[1:]):
+            entry = self.find_entry(room1, room2)
+            if entry is None:
+                raise ValueError("Rooms {} and {} are not connected".format(room1, room2))
+            lefts.append(self._left_pts[entry])
+            rights.append(self._right_pts[entry])
+
+        return lefts, rights
+
+
+
+    def _get_adjacency(self):
+        if self._adjacency is None:
+            offsets = self.offsets.tolist()
+            neighbours = self.neighbours.tolist()
+            mid_x = self.mid_x.tolist()
+            mid_y = self.mid_y.tolist()
+
+            self._adjacency = list(
+                list((entry, neighbours[entry], mid_x[entry], mid_y[entry]) \
+                    for entry in range(offsets[room], offsets[room + 1])) \
+                for room in range(self.num_rooms))
+
+        return self._adjacency
+
+
+
+    def find_room_path(self, start_room, goal_room, start, goal):
+        '''
+        A* search from the room that contains point 'start' to the room
+        that contains point 'goal'. Search nodes are the portal midpoints.
+        Returns a list of room ids from start_room to goal_room, or None if
+        there is no connection.
+        '''
+        if start_room == goal_room: return [start_room]
+
+        adjacency = self._get_adjacency()
+        goal_x = goal.x
+        goal_y = goal.y
+
+        def heuristic(x, y):
+            dx = goal_x - x
+            dy = goal_y - y
+            return math.sqrt(dx*dx + dy*dy)
+
+        # search node: a room, placed at the midpoint of the portal
+        # through which it was entered on the cheapest known way
+        costs = {start_room: 0.0}
+        came_from = {start_room: None}
+        positions = {start_room: (start.x, start.y)}
+
+        queue = [(heuristic(start.x, start.y), 0.0, start_room)]
+        closed = set()
+
+        while len(queue) > 0:
+            _, cost, room = heapq.heappop(queue)
+            if room in closed: continue
+            closed.add(room)
+
+            if room == goal_room:
+                path = []
+                while room is not None:
+                    path.append(room)
+                    room = came_from[room]
+                return path[::-1]
+
+            cur_x, cur_y = positions[room]
+
+            for entry, neighbour, mid_x, mid_y in adjacency[room]:
+                if neighbour in closed: continue
+
+                dx = mid_x - cur_x
+                dy = mid_y - cur_y
+                new_cost = cost + math.sqrt(dx*dx + dy*dy)
+
+                if neighbour not in costs or new_cost < costs[neighbour]:
+                    costs[neighbour] = new_cost
+                    came_from[neighbour] = room
+                    positions[neighbour] = (mid_x, mid_y)
+                    heapq.heappush(queue, (new_cost + heuristic(mid_x, mid_y), new_cost, neighbour))
+
+        return None
@@ -0,0 +1,269 @@
+import numpy as np
+
+from rtree import index
+
+from .vector2 import Vector2
+
+
+
+class RoomLocator(object):
+    '''
+    Point location over the rooms of a Mesh2d.
+
+    An R-tree over room bounding boxes gives the candidate rooms for a point,
+    and each candidate is tested with a binary search over the fan of triangles
+    (room[0], room[i], room[i+1]), which is O(log k) for a room with k vertices.
+    Rooms are not always convex: with a nonzero threshold, break_into_convex leaves
+    shallow reflex corners in them. Such rooms are tested with a full
+    point-in-polygon test, in O(k).
+
+    Room corners are stored back to back in 'xs', 'ys'; the corners of room 'r'
+    are at offsets[r] ... offsets[r+1]-1, in CCW order.
+    '''
+
+    def __init__(self, offsets, corners, vertices, tolerance=Vector2.tolerance):
+        self.tolerance = tolerance
+        self.offsets = offsets
+        self.xs = vertices.x[corners]
+        self.ys = vertices.y[corners]
+
+        # position of the next corner of the same room, for every corner
+        self.next_corners = np.arange(1, len(self.xs) + 1, dtype=np.int64)
+        self.next_corners[offsets[1:] - 1] = offsets[:-1]
+
+        # room bounding boxes (xmin, ymin, xmax, ymax), and rooms that have no reflex corners
+        self.boxes = np.zeros((self.num_rooms, 4), dtype=np.float64)
+        self.convex = np.ones(self.num_rooms, dtype=bool)
+        if self.num_rooms > 0:
+            starts = self.offsets[:-1]
+            self.boxes[:, 0] = np.minimum.reduceat(self.xs, starts)
+            self.boxes[:, 1] = np.minimum.reduceat(self.ys, starts)
+            self.boxes[:, 2] = np.maximum.reduceat(self.xs, starts)
+            self.boxes[:, 3] = np.maximum.reduceat(self.ys, starts)
+
+            nxt = self.next_corners
+            prv = np.empty_like(nxt)
+            prv[nxt] = np.arange(len(nxt))
+            turn = (self.xs - self.xs[prv]) * (self.ys[nxt] - self.ys) - \
+                (self.ys - self.ys[prv]) * (self.xs[nxt] - self.xs)
+            self.convex = ~np.logical_or.reduceat(turn < -tolerance, starts)
+
+        # R-tree over the boxes, built on first query
+        self._rti = None
+
+
+
+    @staticmethod
+    def from_rooms(rooms, vertices):
+        '''
+        Build the locator from room index loops (CCW).
+        '''
+        sizes = np.array([len(room) for room in rooms], dtype=np.int64)
+        offsets = np.zeros(len(rooms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(sizes)
+
+        corners = np.fromiter(
+            (idx for room in rooms for idx in room),
+            dtype=np.int64, count=int(offsets[-1]))
+
+        return RoomLocator(offsets, corners, vertices)
+
+
+
+    def __getstate__(self):
+        # the R-tree is rebuilt on first query after unpickling
+        state = self.__dict__.copy()
+        state['_rti'] = None
+        return state
+
+
+
+    @property
+    def rti(self):
+        if self._rti is None:
+            if self.num_rooms > 0:
+                # bulk loading is much faster than inserting the boxes one by one
+                self._rti = index.Index(
+                    ((room_id, box, None) for room_id, box in enumerate(self.boxes.tolist())),
+                    interleaved=True)
+            else:
+                self._rti = index.Index(interleaved=True)
+        return self._rti
+
+
+
+    @property
+    def num_rooms(self):
+        return len(self.offsets) - 1
+
+
+
+    def _candidates(self, x, y):
+        tol = self.tolerance
+        return sorted(self.rti.intersection((x - tol, y - tol, x + tol, y + tol)))
+
+
+
+    def contains(self, room_id, x, y):
+        '''
+        Check if point (x, y) is inside the given room or on its border.
+        '''
+        if not self.convex[room_id]:
+            return bool(self._polygon_contains(np.array([room_id]), np.array([[x, y]]))[0])
+
+        start = self.offsets[room_id]
+        num = self.offsets[room_id + 1] - start
+        xs = self.xs
+        ys = self.ys
+        tol = -self.tolerance
+
+        x0 = xs[start]
+        y0 = ys[start]
+        px = x - x0
+        py = y - y0
+
+        def fan_cross(pos):
+            return (xs[start + pos] - x0) * py - (ys[start + pos] - y0) * px
+
+        # outside of the fan
+        if fan_cross(1) < tol or fan_cross(num - 1) > -tol: return False
+
+        # find the fan triangle whose sector contains the point
+        lo = 1
+        hi = num - 1
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if fan_cross(mid) >= 0.0:
+                lo = mid
+            else:
+                hi = mid
+
+        # check the room edge opposite to room[0]
+        x1 = xs[start + lo]
+        y1 = ys[start + lo]
+        x2 = xs[start + hi]
+        y2 = ys[start + hi]
+        return (x2 - x1) * (y - y1) - (y2 - y1) * (x - x1) >= tol
+
+
+
+    def locate(self, x, y):
+        '''
+        Returns id of the room that contains point (x, y), or None if there is no such room.
+        If the point is on a portal, the room with the lowest id is returned.
+        '''
+        for room_id in self._candidates(x, y):
+            if self.contains(room_id, x, y):
+                return room_id
+        return None
+
+
+
+    def locate_many(self, points):
+        '''
+        Vectorized version of locate.
+        'points' is an (N, 2) array of positions.
+        Returns an array of N room ids, -1 for points that are not inside any room.
+        '''
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        num_points = len(points)
+        result = np.full(num_points, -1, dtype=np.int64)
+        if num_points == 0 or self.num_rooms == 0: return result
+
+        # candidate (point, room) pairs from the R-tree
+        pair_points = []
+        pair_rooms = []
+        for pos, (x, y) in enumerate(points.tolist()):
+            candidates = self._candidates(x, y)
+            pair_points.extend([pos] * len(candidates))
+            pair_rooms.extend(candidates)
+
+        if len(pair_points) == 0: return result
+
+        pair_points = np.array(pair_points, dtype=np.int64)
+        pair_rooms = np.array(pair_rooms, dtype=np.int64)
+
+        xs = self.xs
+        ys = self.ys
+        tol = -self.tolerance
+
+        start = self.offsets[pair_rooms]
+        num = self.offsets[pair_rooms + 1] - start
+
+        x0 = xs[start]
+        y0 = ys[start]
+        px = points[pair_points, 0] - x0
+        py = points[pair_points, 1] - y0
+
+        def fan_cross(pos):
+            return (xs[start + pos] - x0) * py - (ys[start + pos] - y0) * px
+
+        inside = (fan_cross(1) >= tol) & (fan_cross(num - 1) <= -tol)
+
+        # binary search for all the pairs at once
+        lo = np.ones(len(pair_points), dtype=np.int64)
+        hi = num - 1
+        for _ in range(int(np.ceil(np.log2(max(num.max(), 2))))):
+            active = hi - lo > 1
+            if not active.any(): break
+            mid = (lo + hi) // 2
+            left_of = fan_cross(mid) >= 0.0
+            lo = np.where(active & left_of, mid, lo)
+            hi = np.where(active & ~left_of, mid, hi)
+
+        x1 = xs[start + lo]
+        y1 = ys[start + lo]
+        x2 = xs[start + hi]
+        y2 = ys[start + hi]
+        inside &= (x2 - x1) * (points[pair_points, 1] - y1) - \
+            (y2 - y1) * (points[pair_points, 0] - x1) >= tol
+
+        concave = ~self.convex[pair_rooms]
+        if concave.any():
+            inside[concave] = self._polygon_contains(pair_rooms[concave], points[pair_points[concave]])
+
+        # the lowest room id wins, same as in locate
+        found = np.full(num_points, self.num_rooms, dtype=np.int64)
+        np.minimum.at(found, pair_points[inside], pair_rooms[inside])
+        hit = found < self.num_rooms
+        result[hit] = found[hit]
+
+        return result
+
+
+
+    def _polygon_contains(self, rooms, points):
+        '''
+        Point-in-polygon test for any rooms, convex or not: an array of 'rooms'
+        and an (N, 2) array of 'points', one point per room.
+        Returns a boolean array, True where the point is inside the room or on its border.
+        All the edges of all the rooms are tested at once.
+        '''
+        starts = self.offsets[rooms]
+        nums = self.offsets[rooms + 1] - starts
+
+        # one entry per (room, edge) pair
+        pair = np.repeat(np.arange(len(rooms)), nums)
+        corner = np.arange(int(nums.sum()), dtype=np.int64) - np.repeat(np.cumsum(nums) - nums, nums) + \
+            np.repeat(starts, nums)
+
+        x1 = self.xs[corner]
+        y1 = self.ys[corner]
+        nxt = self.next_corners[corner]
+        x2 = self.xs[nxt]
+        y2 = self.ys[nxt]
+        x = points[pair, 0]
+        y = points[pair, 1]
+
+        # crossings of the horizontal ray that goes from the point to the right
+        edge_x = x2 - x1
+        edge_y = y2 - y1
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crossing = ((y1 > y) != (y2 > y)) & (x < x1 + (y - y1) * edge_x / edge_y)
+            along = ((x - x1) * edge_x + (y - y1) * edge_y) / (edge_x * edge_x + edge_y * edge_y)
+        along = np.where(np.isfinite(along), np.clip(along, 0., 1.), 0.)
+        on_border = np.hypot(x - x1 - along * edge_x, y - y1 - along * edge_y) <= self.tolerance
+
+        num_crossings = np.bincount(pair, weights=crossing, minlength=len(rooms))
+        touches = np.bincount(pair, weights=on_border, minlength=len(rooms)) > 0
+        return (num_crossings % 2 == 1) | touches
@@ -0,0 +1,320 @@
+import math
+import numpy as np
+
+from rtree import index
+
+
+
+def point_to_box_dist(x, y, box):
+    '''
+    Distance from point (x, y) to an axis-aligned box (xmin, ymin, xmax, ymax).
+    Zero if the point is inside the box.
+    '''
+    dx = max(box[0] - x, 0.0, x - box[2])
+    dy = max(box[1] - y, 0.0, y - box[3])
+    return math.sqrt(dx*dx + dy*dy)
+
+
+
+class SegmentIndex(object):
+    '''
+    R-tree over bounding boxes of segments.
+    Each segment is identified by a hashable key (for polygon edges that
+    is the (index1, index2) tuple of its endpoints).
+    '''
+
+    def __init__(self):
+        self._rti = index.Index()
+        self._rti.interleaved = True
+
+        self._next_id = 0
+
+        # key -> rtree id
+        self._ids = {}
+
+        # rtree id -> key
+        self._keys = {}
+
+        # rtree id -> bounding box
+        self._boxes = {}
+
+        # uniform grid for batched ray queries, built on first use
+        self._grid = None
+
+
+
+    def __len__(self):
+        return len(self._ids)
+
+
+    def __contains__(self, key):
+        return key in self._ids
+
+
+    def keys(self):
+        return self._ids.keys()
+
+
+
+    def insert(self, key, x1, y1, x2, y2):
+        if key in self._ids:
+            raise ValueError("SegmentIndex: segment {} is already indexed".format(key))
+
+        box = (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+        rid = self._next_id
+        self._next_id += 1
+
+        self._ids[key] = rid
+        self._keys[rid] = key
+        self._boxes[rid] = box
+        self._rti.insert(rid, box)
+        self._grid = None
+
+
+
+    def remove(self, key):
+        rid = self._ids.pop(key)
+        del self._keys[rid]
+        self._rti.delete(rid, self._boxes.pop(rid))
+        self._grid = None
+
+
+
+    def bounds(self):
+        '''
+        Returns (xmin, ymin, xmax, ymax) of all indexed segments or None if empty.
+        '''
+        if len(self._ids) == 0: return None
+        return tuple(self._rti.bounds)
+
+
+
+    def intersection(self, xmin, ymin, xmax, ymax):
+        '''
+        Keys of all segments whose bounding boxes intersect the given box.
+        '''
+        keys = self._keys
+        return list(keys[rid] for rid in self._rti.intersection((xmin, ymin, xmax, ymax)))
+
+
+
+    @property
+    def grid(self):
+        '''
+        SegmentGrid over the same segments, for walking many rays at once.
+        Rebuilt on first use after the index changes.
+        '''
+        if self._grid is None and len(self._ids) > 0:
+            rids = sorted(self._keys)
+            self._grid = SegmentGrid(list(self._keys[rid] for rid in rids),
+                np.array(list(self._boxes[rid] for rid in rids), dtype=np.float64))
+        return self._grid
+
+
+
+    def nearest(self, x, y, batch=8):
+        '''
+        Generator of (key, distance) pairs sorted by the distance from (x, y)
+        to the bounding box of the segment. That distance is a lower bound of
+        the distance to any point of the segment, so the caller can stop
+        iterating as soon as it exceeds the best exact distance found so far.
+        '''
+        seen = set()
+        num = batch
+        while True:
+            # with ties, the R-tree can return more than 'num' items,
+            # so the next batch might contain nothing new
+            found = list(self._rti.nearest((x, y, x, y), num))
+
+            for rid in found:
+                if rid in seen: continue
+                seen.add(rid)
+                yield self._keys[rid], point_to_box_dist(x, y, self._boxes[rid])
+
+            if len(found) < num or len(seen) == len(self._ids): return
+            num *= 2
+
+
+
+class SegmentGrid(object):
+    '''
+    Uniform grid over bounding boxes of segments, stored as flat arrays
+    (the segments of every cell are a slice of one array), so a batch of rays
+    can walk through it together with NumPy.
+    '''
+
+    def __init__(self, keys, boxes, tolerance=0.00001):
+        # keys as an array: for polygon edges, an (N, 2) array of index pairs
+        self.keys = np.array(keys)
+
+        num = len(boxes)
+        xmin = boxes[:, 0].min() - tolerance
+        ymin = boxes[:, 1].min() - tolerance
+        width = boxes[:, 2].max() + tolerance - xmin
+        height = boxes[:, 3].max() + tolerance - ymin
+
+        # about 16 segments per cell (fewer rounds in walk_rays), not more than 1024 cells along a side
+        cell = max(math.sqrt(width * height * 16 / num), max(width, height) / 1024., tolerance)
+        self.bounds = (xmin, ymin, xmin + width, ymin + height)
+        self.cell = cell
+        self.num_x = int(width / cell) + 1
+        self.num_y = int(height / cell) + 1
+
+        # cells covered by every box
+        x0, y0 = self._cell_of(boxes[:, 0] - tolerance, boxes[:, 1] - tolerance)
+        x1, y1 = self._cell_of(boxes[:, 2] + tolerance, boxes[:, 3] + tolerance)
+        span_x = x1 - x0 + 1
+        counts = span_x * (y1 - y0 + 1)
+
+        segs = np.repeat(np.arange(num), counts)
+        local = np.arange(len(segs)) - np.repeat(np.cumsum(counts) - counts, counts)
+        span_x = np.repeat(span_x, counts)
+        cells = (np.repeat(y0, counts) + local // span_x) * self.num_x + np.repeat(x0, counts) + local % span_x
+
+        # segments of cell c are cell_segs[cell_starts[c]:cell_starts[c+1]], in key order
+        order = np.argsort(cells, kind='mergesort')
+        self.cell_segs = segs[order]
+        self.cell_starts = np.searchsorted(cells[order], np.arange(self.num_x * self.num_y + 1))
+
+
+
+    def _cell_of(self, x, y):
+        cell_x = np.clip(np.floor((x - self.bounds[0]) / self.cell), 0, self.num_x - 1).astype(np.int64)
+        cell_y = np.clip(np.floor((y - self.bounds[1]) / self.cell), 0, self.num_y - 1).astype(np.int64)
+        return cell_x, cell_y
+
+
+
+    def walk_rays(self, ray_x, ray_y, dir_x, dir_y, closest_dist):
+        '''
+        Walk rays (start points and unit directions) through the grid, one cell per round.
+        Every round yields (rays, distance along each ray to the end of its cell,
+        ray of every candidate, candidate segment): the segments in the current
+        cells of the rays that are still walking.
+
+        'closest_dist' holds the distance to the closest hit of every ray and is updated
+        by the caller: a ray stops when that hit is inside the cells walked so far.
+        '''
+        xmin, ymin, xmax, ymax = self.bounds
+        cell = self.cell
+
+        rays = np.arange(len(ray_x))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            inv_x = 1.0 / dir_x
+            inv_y = 1.0 / dir_y
+
+            # part of every ray inside the grid
+            enter_x = np.where(dir_x != 0, np.minimum((xmin - ray_x) * inv_x, (xmax - ray_x) * inv_x), -np.inf)
+            leave_x = np.where(dir_x != 0, np.maximum((xmin - ray_x) * inv_x, (xmax - ray_x) * inv_x), np.inf)
+            enter_y = np.where(dir_y != 0, np.minimum((ymin - ray_y) * inv_y, (ymax - ray_y) * inv_y), -np.inf)
+            leave_y = np.where(dir_y != 0, np.maximum((ymin - ray_y) * inv_y, (ymax - ray_y) * inv_y), np.inf)
+
+        enter = np.maximum(np.maximum(enter_x, enter_y), 0.0)
+        leave = np.minimum(leave_x, leave_y)
+
+        # rays that are parallel to a side of the grid and outside of it never enter
+        outside_x = (dir_x == 0) & ((ray_x < xmin) | (ray_x > xmax))
+        outside_y = (dir_y == 0) & ((ray_y < ymin) | (ray_y > ymax))
+        inside = (enter <= leave) & ~outside_x & ~outside_y
+
+        rays = rays[inside]
+        leave = leave[inside]
+        cell_x, cell_y = self._cell_of(ray_x[rays] + dir_x[rays] * enter[inside],
+            ray_y[rays] + dir_y[rays] * enter[inside])
+
+        # distances along the rays to the next vertical and horizontal cell sides
+        step_x = np.sign(dir_x[rays]).astype(np.int64)
+        step_y = np.sign(dir_y[rays]).astype(np.int64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta_x = np.where(step_x != 0, cell * np.abs(inv_x[rays]), np.inf)
+            delta_y = np.where(step_y != 0, cell * np.abs(inv_y[rays]), np.inf)
+            next_x = np.where(step_x != 0,
+                (xmin + (cell_x + (step_x > 0)) * cell - ray_x[rays]) * inv_x[rays], np.inf)
+            next_y = np.where(step_y != 0,
+                (ymin + (cell_y + (step_y > 0)) * cell - ray_y[rays]) * inv_y[rays], np.inf)
+
+        while len(rays) > 0:
+            cell_end = np.minimum(np.minimum(next_x, next_y), leave)
+
+            cells = cell_y * self.num_x + cell_x
+            starts = self.cell_starts[cells]
+            counts = self.cell_starts[cells + 1] - starts
+            pair_rays = np.repeat(rays, counts)
+            local = np.arange(len(pair_rays)) - np.repeat(np.cumsum(counts) - counts, counts)
+            pair_segs = self.cell_segs[np.repeat(starts, counts) + local]
+
+            yield rays, cell_end, pair_rays, pair_segs
+
+            # step into the next cell along x or along y
+            along_x = next_x < next_y
+            cell_x = cell_x + np.where(along_x, step_x, 0)
+            cell_y = cell_y + np.where(along_x, 0, step_y)
+            next_x = np.where(along_x, next_x + delta_x, next_x)
+            next_y = np.where(along_x, next_y, next_y + delta_y)
+
+            keep = (closest_dist[rays] > cell_end) & (cell_end < leave) & \
+                (cell_x >= 0) & (cell_x < self.num_x) & (cell_y >= 0) & (cell_y < self.num_y)
+
+            rays = rays[keep]
+            leave = leave[keep]
+            cell_x = cell_x[keep]
+            cell_y = cell_y[keep]
+            step_x = step_x[keep]
+            step_y = step_y[keep]
+            delta_x = delta_x[keep]
+            delta_y = delta_y[keep]
+            next_x = next_x[keep]
+            next_y = next_y[keep]
+
+
+
+class PortalIndex(object):
+    '''
+    Dynamic R-tree over the portal candidates of Mesh2d.get_portals
+    (dicts with 'start_index' and 'end_point').
+    Every portal gets a sequence number when it is inserted, so equally
+    close portals can be ordered the same way as in the list of portals.
+    '''
+
+    def __init__(self):
+        self._segments = SegmentIndex()
+
+        # sequence number -> portal
+        self._portals = {}
+
+        # id(portal) -> sequence number
+        self._order = {}
+
+        self._next_order = 0
+
+
+
+    def __len__(self):
+        return len(self._portals)
+
+
+
+    def insert(self, portal, x1, y1, x2, y2):
+        order = self._next_order
+        self._next_order += 1
+
+        self._portals[order] = portal
+        self._order[id(portal)] = order
+        self._segments.insert(order, x1, y1, x2, y2)
+
+
+
+    def remove(self, portal):
+        order = self._order.pop(id(portal))
+        del self._portals[order]
+        self._segments.remove(order)
+
+
+
+    def nearest(self, x, y, batch=8):
+        '''
+        Generator of (portal, distance to its bounding box, sequence number),
+        sorted by the distance from (x, y) (see SegmentIndex.nearest).
+        '''
+        for order, box_dist in self._segments.nearest(x, y, batch):
+            yield self._portals[order], box_dist, order
@@ -0,0 +1,103 @@
+import heapq
+
+import numpy as np
+
+
+
+def overlapping_segment_pairs(xs, ys, segments):
+    '''
+    Find all pairs of segments whose bounding boxes overlap.
+
+    A vertical line sweeps from left to right over the segments. The sweep
+    status holds the segments whose x-range contains the line, and a segment
+    entering the status is only compared to those (and only reported if their
+    y-ranges overlap as well). Segments leave the status through a heap keyed
+    on the right end of their x-range, O(log n) each.
+
+    Every entering segment is still compared to the whole status, so the sweep
+    is O(n log n + n * s + k) for n segments, k reported pairs and up to s
+    segments spanning the sweep line at once. s is small for most polygon
+    borders, but can be close to n (long edges, like the spokes of a star or
+    the walls of a maze): a long status is compared in one NumPy test.
+
+    'xs', 'ys' are vertex coordinate arrays, 'segments' is a list of
+    (index1, index2) tuples. Returns a list of (position1, position2) pairs
+    of positions in 'segments', position1 < position2.
+    '''
+    if len(segments) < 2: return []
+
+    seg_arr = np.asarray(segments, dtype=np.intp)
+    seg_xs = np.asarray(xs)[seg_arr]
+    seg_ys = np.asarray(ys)[seg_arr]
+
+    xmins = seg_xs.min(axis=1)
+    xmaxs = seg_xs.max(axis=1).tolist()
+    ymins = seg_ys.min(axis=1).tolist()
+    ymaxs = seg_ys.max(axis=1).tolist()
+
+    order = np.argsort(xmins, kind='mergesort').tolist()
+    xmins = xmins.tolist()
+
+    # the status: positions of the active segments and their y-ranges, with the slot
+    # of every active segment in 'slots'; the same in arrays for a long status
+    active = []
+    active_ymins = []
+    active_ymaxs = []
+    slots = {}
+
+    num_segments = len(segments)
+    arr_active = np.zeros(num_segments, dtype=np.intp)
+    arr_ymins = np.zeros(num_segments, dtype=np.float64)
+    arr_ymaxs = np.zeros(num_segments, dtype=np.float64)
+
+    # (xmax, position) of the active segments
+    expiry = []
+
+    # longer statuses are tested with NumPy
+    long_status = 32
+
+    pairs = []
+    for pos in order:
+        sweep_x = xmins[pos]
+
+        # drop segments that are entirely to the left of the sweep line:
+        # the last active segment takes the slot of the removed one
+        while len(expiry) > 0 and expiry[0][0] < sweep_x:
+            other = heapq.heappop(expiry)[1]
+            slot = slots.pop(other)
+            last = active.pop()
+            last_ymin = active_ymins.pop()
+            last_ymax = active_ymaxs.pop()
+            if last != other:
+                active[slot] = last
+                active_ymins[slot] = last_ymin
+                active_ymaxs[slot] = last_ymax
+                slots[last] = slot
+
+                arr_active[slot] = last
+                arr_ymins[slot] = last_ymin
+                arr_ymaxs[slot] = last_ymax
+
+        ymin = ymins[pos]
+        ymax = ymaxs[pos]
+        num_active = len(active)
+        if num_active > long_status:
+            overlap = (arr_ymins[:num_active] <= ymax) & (ymin <= arr_ymaxs[:num_active])
+            found = arr_active[:num_active][overlap].tolist()
+        else:
+            found = [other for other, other_ymin, other_ymax in zip(active, active_ymins, active_ymaxs) \
+                if other_ymin <= ymax and ymin <= other_ymax]
+
+        for other in found:
+            pairs.append((other, pos) if other < pos else (pos, other))
+
+        slots[pos] = num_active
+        active.append(pos)
+        active_ymins.append(ymin)
+        active_ymaxs.append(ymax)
+        arr_active[num_active] = pos
+        arr_ymins[num_active] = ymin
+        arr_ymaxs[num_active] = ymax
+        heapq.heappush(expiry, (xmaxs[pos], pos))
+
+    return pairs
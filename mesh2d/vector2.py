@@ -7,20 +7,29 @@ class LineRelation(object):
         self.identical = identical
 
 
-class Vector2:
+class Vector2(object):
+    # no per-instance __dict__: polygons can hold a lot of these
+    __slots__ = ('x', 'y')
+
     tolerance = 0.00001
 
+    # this is for multiplication with a Matrix
+    shape = (3, 1)
+
     def __init__(self, x, y):
         self.x = float(x)
         self.y = float(y)
-        # this is for multiplication with a Matrix
-        self.shape = (3, 1)
 
 
     def copy(self):
         return Vector2(self.x, self.y)
 
 
+    # pickling support (objects with __slots__ have no __dict__ to pickle)
+    def __reduce__(self):
+        return (Vector2, (self.x, self.y))
+
+
     def __getitem__(self, key):
         if key == 0:
             return self.x
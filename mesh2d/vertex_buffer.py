@@ -0,0 +1,254 @@
+import numpy as np
+
+from .vector2 import Vector2
+
+
+
+class VertexBuffer(object):
+    '''
+    Growable vertex storage with x and y coordinates kept in two contiguous
+    float64 columns (structure of arrays).
+
+    The buffer behaves like the list of Vector2 instances it replaces:
+    indexing returns a Vector2 copy of the stored vertex, and assigning a
+    Vector2 to an index writes its coordinates back into the columns.
+    Geometric passes that care about speed should use the 'x' and 'y'
+    array views directly.
+    '''
+
+    min_capacity = 16
+
+
+    def __init__(self, vertices=None, capacity=0):
+        self._size = 0
+        self._data = np.empty((2, max(capacity, VertexBuffer.min_capacity)))
+        if vertices is not None:
+            self.extend(vertices)
+
+
+
+    @staticmethod
+    def from_arrays(xs, ys):
+        '''
+        Create a buffer from two coordinate arrays (the data is copied).
+        '''
+        if len(xs) != len(ys):
+            raise ValueError("VertexBuffer: coordinate arrays must have equal length")
+        buf = VertexBuffer(capacity=len(xs))
+        buf.extend_xy(xs, ys)
+        return buf
+
+
+
+    @staticmethod
+    def from_columns(columns):
+        '''
+        Wrap a (2, N) float64 array without copying it: row 0 holds x, row 1 holds y.
+        The buffer keeps using this memory until it has to grow
+        (this is how memory-mapped files are shared).
+        '''
+        if columns.ndim != 2 or columns.shape[0] != 2:
+            raise ValueError("VertexBuffer: columns must have shape (2, N)")
+        buf = VertexBuffer()
+        buf._data = columns
+        buf._size = columns.shape[1]
+        return buf
+
+
+
+    @property
+    def x(self):
+        return self._data[0, :self._size]
+
+
+    @property
+    def y(self):
+        return self._data[1, :self._size]
+
+
+    @property
+    def capacity(self):
+        return self._data.shape[1]
+
+
+
+    def coords(self, indices=None):
+        '''
+        Return an (N, 2) array of coordinates, optionally for the given indices only.
+        '''
+        if indices is None:
+            return self._data[:, :self._size].T.copy()
+        indices = np.asarray(indices, dtype=np.intp)
+        return np.column_stack((self.x[indices], self.y[indices]))
+
+
+
+    def reserve(self, capacity):
+        if capacity <= self.capacity: return
+        new_data = np.empty((2, capacity))
+        new_data[:, :self._size] = self._data[:, :self._size]
+        self._data = new_data
+
+
+
+    def _grow_for(self, extra):
+        needed = self._size + extra
+        if needed > self.capacity:
+            self.reserve(max(needed, 2 * self.capacity))
+
+
+
+    def append_xy(self, x, y):
+        '''
+        Append a vertex given by its coordinates, return its index.
+        '''
+        self._grow_for(1)
+        idx = self._size
+        self._data[0, idx] = x
+        self._data[1, idx] = y
+        self._size += 1
+        return idx
+
+
+
+    def append(self, vert):
+        self.append_xy(vert.x, vert.y)
+
+
+
+    def extend_xy(self, xs, ys):
+        '''
+        Append vertices given as two coordinate arrays.
+        Returns the index of the first appended vertex.
+        '''
+        num = len(xs)
+        start = self._size
+        self._grow_for(num)
+        self._data[0, start:start + num] = xs
+        self._data[1, start:start + num] = ys
+        self._size += num
+        return start
+
+
+
+    def extend(self, vertices):
+        if isinstance(vertices, VertexBuffer):
+            return self.extend_xy(vertices.x, vertices.y)
+
+        start = self._size
+        for vert in vertices:
+            self.append_xy(vert.x, vert.y)
+        return start
+
+
+
+    def take(self, indices):
+        '''
+        Return a new buffer with copies of the vertices at the given indices.
+        '''
+        indices = np.asarray(indices, dtype=np.intp)
+        return VertexBuffer.from_arrays(self.x[indices], self.y[indices])
+
+
+
+    def copy(self):
+        return VertexBuffer.from_arrays(self.x, self.y)
+
+
+
+    def signed_area(self, indices=None):
+        '''
+        Signed area of the loop given by 'indices' (positive if CCW).
+        Same formula as Vector2.poly_signed_area.
+        '''
+        if indices is None:
+            xs = self.x
+            ys = self.y
+        else:
+            indices = np.asarray(indices, dtype=np.intp)
+            xs = self.x[indices]
+            ys = self.y[indices]
+        if len(xs) == 0: return 0.0
+
+        xs_next = np.roll(xs, -1)
+        ys_next = np.roll(ys, -1)
+        return float(np.sum((xs - xs_next) * (ys + ys_next))) / 2.0
+
+
+
+    def point_inside_loop(self, indices, point):
+        '''
+        Crossing-number test of 'point' against the loop given by 'indices'.
+        Same rules as Polygon2d.point_inside_loop: vertices lying exactly on the
+        horizontal line through the point are nudged up by 0.01.
+        '''
+        indices = np.asarray(indices, dtype=np.intp)
+        xs = self.x[indices] - point.x
+        ys = self.y[indices] - point.y
+        ys = np.where(ys == 0, ys + 0.01, ys)
+
+        xs_next = np.roll(xs, -1)
+        ys_next = np.roll(ys, -1)
+
+        crossing = ys * ys_next < 0
+        xs = xs[crossing]
+        ys = ys[crossing]
+        xs_next = xs_next[crossing]
+        ys_next = ys_next[crossing]
+
+        inters_x = xs - ys * (xs_next - xs) / (ys_next - ys)
+        return int(np.count_nonzero(inters_x > 0)) % 2 > 0
+
+
+
+    def __len__(self):
+        return self._size
+
+
+
+    def _check_index(self, key):
+        if key < 0: key += self._size
+        if key < 0 or key >= self._size:
+            raise IndexError(key)
+        return key
+
+
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.take(np.arange(self._size)[key])
+
+        key = self._check_index(key)
+        return Vector2(self._data[0, key], self._data[1, key])
+
+
+
+    # python 2 calls this for vertices[a:b]
+    def __getslice__(self, start, stop):
+        return self[slice(start, stop)]
+
+
+
+    def __setitem__(self, key, vert):
+        key = self._check_index(key)
+        self._data[0, key] = vert.x
+        self._data[1, key] = vert.y
+
+
+
+    def __iter__(self):
+        xs = self.x.tolist()
+        ys = self.y.tolist()
+        for pos in range(len(xs)):
+            yield Vector2(xs[pos], ys[pos])
+
+
+
+    def __getstate__(self):
+        return {'x': self.x.copy(), 'y': self.y.copy()}
+
+
+    def __setstate__(self, state):
+        self._size = 0
+        self._data = np.empty((2, max(len(state['x']), VertexBuffer.min_capacity)))
+        self.extend_xy(state['x'], state['y'])
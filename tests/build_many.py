@@ -0,0 +1,61 @@
+import sys
+import os
+import pickle
+
+import numpy as np
+
+here = os.path.abspath(os.path.dirname(__file__))
+
+module_root = os.path.join(here, "..")
+sys.path.append(module_root)
+
+from mesh2d import Mesh2d, Polygon2d, Vector2, build_many
+from maps import pillar_room, generated
+
+
+polygons = [pillar_room(1 + i % 3, i * 200., 0., cls=Polygon2d) for i in range(6)] + \
+    [generated('star', 10 + i, seed=i, radius=100., cls=Polygon2d) for i in range(6)]
+num_verts = list(len(poly.vertices) for poly in polygons)
+
+
+# polygons and meshes survive pickling, spatial indices are rebuilt on use
+poly = polygons[0]
+poly.edge_index
+copy = pickle.loads(pickle.dumps(poly, 2))
+assert(copy.outline == poly.outline and copy.holes == poly.holes)
+assert(copy._edge_index is None)
+assert(sorted(copy.edge_index.keys()) == sorted(poly.edge_index.keys()))
+
+
+# sequential reference
+reference = []
+for poly in polygons:
+    mesh = Mesh2d.from_polygon(pickle.loads(pickle.dumps(poly, 2)))
+    mesh.break_into_convex(10.)
+    reference.append(mesh)
+
+for workers in (1, 3):
+    meshes = build_many(polygons, 10., workers=workers)
+
+    assert(len(meshes) == len(polygons))
+    for mesh, ref in zip(meshes, reference):
+        assert(isinstance(mesh, Mesh2d))
+        assert(mesh.rooms == ref.rooms)
+        assert(mesh.portals == ref.portals)
+        assert((mesh.room_graph.neighbours == ref.room_graph.neighbours).all())
+
+        # the built mesh is ready for queries
+        cntr = tuple(np.mean(list(tuple(mesh.vertices[idx]) for idx in mesh.rooms[0]), axis=0))
+        assert(mesh.locate_room(Vector2(*cntr)) == 0)
+        assert(mesh.trace_ray(Vector2(*cntr), Vector2(cntr[0] + 1, cntr[1])) is not None)
+
+# input polygons are not changed
+assert(num_verts == list(len(poly.vertices) for poly in polygons))
+
+
+# a polygon that cannot be decomposed: its hole is outside of the outline
+broken = generated('star', 10, radius=100., cls=Polygon2d)
+broken.add_hole([Vector2(500, 500), Vector2(510, 500), Vector2(510, 510), Vector2(500, 510)])
+results = build_many([polygons[1], broken], 10., workers=2, return_errors=True)
+assert(isinstance(results[0], Mesh2d))
+assert(isinstance(results[1], Exception))
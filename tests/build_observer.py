@@ -0,0 +1,61 @@
+import sys
+import os
+
+here = os.path.abspath(os.path.dirname(__file__))
+
+module_root = os.path.join(here, "..")
+sys.path.append(module_root)
+
+from mesh2d import BuildObserver, TimingObserver
+from maps import pillar_room
+
+
+class EventLog(BuildObserver):
+    def __init__(self):
+        self.events = []
+
+    def stage_started(self, name):
+        self.events.append(('start', name))
+
+    def stage_finished(self, name, seconds):
+        assert(seconds >= 0.0)
+        self.events.append(('stop', name))
+
+
+log = EventLog()
+pillar_room(4).break_into_convex(10., observer=log)
+
+# stages are properly nested
+stack = []
+for kind, name in log.events:
+    if kind == 'start':
+        stack.append(name)
+    else:
+        assert(stack.pop() == name)
+assert(len(stack) == 0)
+
+started = list(name for kind, name in log.events if kind == 'start')
+assert(started == ['break_into_convex', 'get_portals', 'find_spikes',
+    'portal_endpoints', 'split_rooms', 'room_graph'])
+
+
+timing = TimingObserver()
+mesh = pillar_room(4)
+mesh.break_into_convex(10., observer=timing)
+
+assert(timing.counts['rooms'] == len(mesh.rooms))
+assert(timing.counts['portals'] == len(mesh.portals))
+assert(timing.counts['spikes'] == 16 * 4)
+assert(timing.counts['ray_casts'] <= timing.counts['portal_candidates'])
+# the first room processed is the whole border, merging holes into it only adds vertices
+assert(timing.largest_room >= len(mesh.outline) + sum(len(hole) for hole in mesh.holes))
+
+stages = timing.durations
+assert(stages['break_into_convex'] >= stages['get_portals'] + stages['split_rooms'])
+assert(stages['get_portals'] >= stages['find_spikes'])
+
+# the same observer sums up several builds
+pillar_room(4).break_into_convex(10., observer=timing)
+assert(timing.counts['rooms'] == 2 * len(mesh.rooms))
+
+print(timing)
@@ -0,0 +1,58 @@
+import sys
+import os
+from random import Random
+
+import numpy as np
+
+here = os.path.abspath(os.path.dirname(__file__))
+
+module_root = os.path.join(here, "..")
+sys.path.append(module_root)
+
+from mesh2d import Polygon2d, Vector2
+from maps import generated, pillar_room
+
+
+rnd = Random(5)
+
+# star-shaped room: spikes of random length
+mesh = generated('star', 60, seed=5, radius=100.)
+mesh.break_into_convex(10.)
+
+
+def brute_closest_dist(point):
+    # distance to the closest border edge, 0 inside the mesh
+    if mesh.point_inside(point): return 0.
+    return min(Vector2.vertex_to_segment_dist(point, mesh.vertices[seg[0]], mesh.vertices[seg[1]])[0] \
+        for seg in Polygon2d.get_segments([mesh.outline] + mesh.holes))
+
+
+points = [(rnd.uniform(-150, 150), rnd.uniform(-150, 150)) for i in range(1000)]
+
+num_moved = 0
+for x, y in points:
+    point = Vector2(x, y)
+    closest, room_id = mesh.closest_point(point)
+
+    assert(abs(Vector2.distance(point, closest) - brute_closest_dist(point)) < 1e-9)
+    assert(mesh.point_inside_room(room_id, closest))
+    if closest != point: num_moved += 1
+
+assert(num_moved > 500)
+
+
+# batched queries agree with single ones
+closest, room_ids = mesh.closest_points(np.array(points))
+assert(closest.shape == (len(points), 2) and room_ids.shape == (len(points),))
+
+for pos, (x, y) in enumerate(points):
+    single, room_id = mesh.closest_point(Vector2(x, y))
+    assert(np.allclose(closest[pos], (single.x, single.y), atol=1e-9))
+    assert(mesh.point_inside_room(room_ids[pos], single))
+
+# points inside of a pillar go to its walls
+mesh = pillar_room()
+mesh.break_into_convex(10.)
+closest, room_id = mesh.closest_point(Vector2(23, 26))
+assert(tuple(closest) == (20, 26))
+assert(mesh.closest_points([(23, 26)])[0].tolist() == [[20, 26]])
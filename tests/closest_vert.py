@@ -0,0 +1,57 @@
+import sys
+import os
+
+here = os.path.abspath(os.path.dirname(__file__))
+
+module_root = os.path.join(here, "..")
+sys.path.append(module_root)
+
+from mesh2d import Mesh2d, Vector2
+from maps import generated, square
+
+
+def brute_closest_vert(poly, left, tip, right):
+    '''
+    Reference implementation: the first closest vertex along the border.
+    '''
+    best = (None, None)
+    for loop in [poly.outline] + poly.holes:
+        for vid in loop:
+            vert = poly.vertices[vid]
+            if vert == tip: continue
+            if poly._inside_sector_inclusive(vert, left, tip, right):
+                dist = Vector2.distance(vert, tip)
+                if best[1] is None or dist < best[1]:
+                    best = (vid, dist)
+    return best
+
+
+# star-shaped polygon with a square hole in the middle
+poly = generated('star', 200, seed=7, radius=100.)
+poly.add_hole(square(0., 0., 10.))
+
+# closest vertex inside the sector of every spike matches a full scan
+for spike in poly.find_spikes(10.):
+    vec1, vec2 = poly.get_sector(spike[0], spike[1], spike[2], 10.)
+    tip = poly.vertices[spike[1]]
+    assert(poly.find_closest_vert(tip + vec2, tip, tip + vec1) == \
+        brute_closest_vert(poly, tip + vec2, tip, tip + vec1))
+
+# comb with teeth at equal distances: ties go to the first vertex along the border
+comb = [Vector2(0, 0), Vector2(50, 0), Vector2(50, 20)]
+for tooth in range(4, -1, -1):
+    comb += [Vector2(tooth * 10 + 8, 20), Vector2(tooth * 10 + 8, 10),
+        Vector2(tooth * 10 + 2, 10), Vector2(tooth * 10 + 2, 20)]
+comb.append(Vector2(0, 20))
+comb_poly = Mesh2d(comb, range(len(comb)))
+
+num_verts = 0
+for vid, dist in comb_poly.nearest_verts(25., 5.):
+    num_verts += 1
+assert(num_verts == len(comb))
+
+for spike in comb_poly.find_spikes(0.):
+    vec1, vec2 = comb_poly.get_sector(spike[0], spike[1], spike[2], 0.)
+    tip = comb_poly.vertices[spike[1]]
+    assert(comb_poly.find_closest_vert(tip + vec2, tip, tip + vec1) == \
+        brute_closest_vert(comb_poly, tip + vec2, tip, tip + vec1))
@@ -0,0 +1,113 @@
+import sys
+import os
+import math
+from random import Random
+
+here = os.path.abspath(os.path.dirname(__file__))
+
+module_root = os.path.join(here, "..")
+sys.path.append(module_root)
+
+from mesh2d import Polygon2d, Vector2
+from maps import generated, square
+
+
+def brute_trace_ray(poly, ray1, ray2):
+    '''
+    Reference implementation: test the ray against every border edge.
+    '''
+    best = None
+    for seg in Polygon2d.get_segments([poly.outline] + poly.holes):
+        seg1 = poly.vertices[seg[0]]
+        seg2 = poly.vertices[seg[1]]
+        if seg1 == ray1 or seg2 == ray1: continue
+        inter = Vector2.where_segment_crosses_ray(seg1, seg2, ray1, ray2)
+        if inter is None: continue
+        dist = Vector2.distance(ray1, inter)
+        if best is None or dist < best[1]:
+            best = (inter, dist)
+    return best
+
+
+rnd = Random(7)
+
+# star-shaped polygon with a square hole in the middle
+num = 200
+poly = generated('star', num, seed=7, radius=100.)
+poly.add_hole(square(0., 0., 10.))
+
+assert(len(poly.edge_index) == num + 4)
+
+
+# rays from random inner points in random directions
+for i in range(200):
+    angle = rnd.uniform(0, 2 * math.pi)
+    start = Vector2(rnd.uniform(-50, 50), rnd.uniform(-50, 50))
+    if not poly.point_inside(start): continue
+
+    target = start + Vector2(math.cos(angle), math.sin(angle))
+
+    res = poly.trace_ray(start, target)
+    ref = brute_trace_ray(poly, start, target)
+
+    assert(res is not None and ref is not None)
+    assert(res[0] == ref[0])
+
+
+# rays cast from border vertices
+for vid in poly.outline[::10]:
+    start = poly.vertices[vid]
+    target = Vector2(0, 0)
+    res = poly.trace_ray(start, target)
+    ref = brute_trace_ray(poly, start, target)
+    assert(res[0] == ref[0])
+
+
+# the index follows new border vertices
+edge = (poly.outline[0], poly.outline[1])
+mid = (poly.vertices[edge[0]] + poly.vertices[edge[1]]) * .5
+new_idx = poly.add_vertex_to_border(mid, edge)
+
+assert(edge not in poly.edge_index)
+assert((edge[0], new_idx) in poly.edge_index)
+assert((new_idx, edge[1]) in poly.edge_index)
+assert(len(poly.edge_index) == num + 5)
+
+found = poly.find_edges_in_bbox(mid - Vector2(.001, .001), mid + Vector2(.001, .001))
+assert(set(found) == set([(edge[0], new_idx), (new_idx, edge[1])]))
+
+
+# closest edge inside the sector of every spike matches a full scan
+for spike in poly.find_spikes(10.):
+    vec1, vec2 = poly.get_sector(spike[0], spike[1], spike[2], 10.)
+    tip = poly.vertices[spike[1]]
+    left = tip + vec2
+    right = tip + vec1
+
+    res_edge, res_pt, res_dist = poly.find_closest_edge(left, tip, right)
+
+    ref_dist = None
+    for seg in Polygon2d.get_segments([poly.outline] + poly.holes):
+        seg1 = poly.vertices[seg[0]]
+        seg2 = poly.vertices[seg[1]]
+        if seg1 == tip or seg2 == tip: continue
+        pt, dist = poly.segment_closest_point_inside_sector(seg1, seg2, left, tip, right)
+        if pt is not None and (ref_dist is None or dist < ref_dist):
+            ref_dist = dist
+
+    assert(abs(res_dist - ref_dist) < Vector2.tolerance)
+
+
+# nearest() visits every segment, even when many boxes are at the same distance
+from mesh2d.spatial import SegmentIndex
+
+segs = SegmentIndex()
+for i in range(16):
+    angle = math.pi * i / 16
+    segs.insert(('through', i), -math.cos(angle), -math.sin(angle), math.cos(angle), math.sin(angle))
+for i in range(10):
+    segs.insert(('far', i), 10. + i, 10., 11. + i, 11.)
+
+dists = list(dist for key, dist in segs.nearest(0., 0.))
+assert(len(dists) == 26)
+assert(dists == sorted(dists))
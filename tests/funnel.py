@@ -0,0 +1,145 @@
+import sys
+import os
+import math
+from random import Random
+
+here = os.path.abspath(os.path.dirname(__file__))
+
+module_root = os.path.join(here, "..")
+sys.path.append(module_root)
+
+from mesh2d import Mesh2d, Polygon2d, Vector2
+from maps import generated
+from mesh2d.funnel import string_pull, triangulate
+
+
+# straight corridor
+path = string_pull((0., 0.), (10., 0.), [(5., 1.)], [(5., -1.)])
+assert(path == [(0., 0.), (10., 0.)])
+
+# the goal is below the portal: the path bends around its right end
+path = string_pull((0., 0.), (10., -5.), [(5., 1.)], [(5., .5)])
+assert(path == [(0., 0.), (5., .5), (10., -5.)])
+
+# zig-zag: one corner on each side
+path = string_pull((0., 0.), (0., 30.),
+    [(-10., 10.), (2., 20.)],
+    [(-2., 10.), (10., 20.)])
+assert(path == [(0., 0.), (-2., 10.), (2., 20.), (0., 30.)])
+
+
+# ear clipping: k - 2 triangles that cover the polygon, also with collinear points
+points = [(0., 10.), (0., 0.), (50., 0.), (100., 0.), (100., 10.), (50., 8.)]
+triangles = triangulate(points)
+assert(len(triangles) == len(points) - 2)
+area = lambda pt1, pt2, pt3: ((pt2[0] - pt1[0]) * (pt3[1] - pt1[1]) - (pt2[1] - pt1[1]) * (pt3[0] - pt1[0])) / 2.
+assert(all(area(*(points[pos] for pos in tri)) >= 0. for tri in triangles))
+assert(abs(sum(area(*(points[pos] for pos in tri)) for tri in triangles) - 900.) < 1e-9)
+
+
+# serpentine corridor: paths bend around the ends of the walls
+mesh = generated('maze', 60, seed=3, size=100.)
+mesh.break_into_convex(10.)
+
+border = Polygon2d.get_segments([mesh.outline] + mesh.holes)
+
+def side(pt1, pt2, pt):
+    cross = (pt2[0] - pt1[0]) * (pt[1] - pt1[1]) - (pt2[1] - pt1[1]) * (pt[0] - pt1[0])
+    if abs(cross) < 1e-6: return 0
+    return 1 if cross > 0 else -1
+
+def crosses_border(pt1, pt2):
+    # proper crossings only: the path may touch the corners and run along the walls
+    for seg in border:
+        seg1 = tuple(mesh.vertices[seg[0]])
+        seg2 = tuple(mesh.vertices[seg[1]])
+        if side(seg1, seg2, pt1) * side(seg1, seg2, pt2) < 0 and \
+           side(pt1, pt2, seg1) * side(pt1, pt2, seg2) < 0:
+            return True
+    return False
+
+def path_length(path):
+    return sum(Vector2.distance(Vector2(*pt1), Vector2(*pt2)) for pt1, pt2 in zip(path[:-1], path[1:]))
+
+rnd = Random(3)
+
+def random_point():
+    while True:
+        pt = Vector2(rnd.uniform(0, 100), rnd.uniform(0, 100))
+        if mesh.point_inside(pt): return pt
+
+starts = []
+goals = []
+for i in range(40):
+    start = random_point()
+    goal = random_point()
+    starts.append((start.x, start.y))
+    goals.append((goal.x, goal.y))
+
+    path = mesh.smooth_path(start, goal)
+    assert(tuple(path[0]) == (start.x, start.y))
+    assert(tuple(path[-1]) == (goal.x, goal.y))
+
+    # the path does not go through walls
+    for pt1, pt2 in zip(path[:-1], path[1:]):
+        assert(not crosses_border(tuple(pt1), tuple(pt2)))
+
+    # and it is not longer than the path through portal midpoints
+    corridor = mesh.find_path(start, goal)
+    lefts, rights = mesh.room_graph.corridor_portals(corridor)
+    mids = list(((l[0] + r[0]) / 2., (l[1] + r[1]) / 2.) for l, r in zip(lefts, rights))
+    assert(path_length(path) <= path_length([starts[-1]] + mids + [goals[-1]]) + 1e-9)
+
+
+def check_paths(num_paths):
+    for i in range(num_paths):
+        start = random_point()
+        goal = random_point()
+        path = mesh.smooth_path(start, goal)
+        for pt1, pt2 in zip(path[:-1], path[1:]):
+            assert(not crosses_border(tuple(pt1), tuple(pt2)))
+
+
+# batched version gives the same paths
+paths = mesh.smooth_paths(starts, goals)
+for pos in range(len(starts)):
+    single = mesh.smooth_path(Vector2(*starts[pos]), Vector2(*goals[pos]))
+    assert((paths[pos] == single).all())
+
+assert(mesh.smooth_paths([(50., 50.)], [(500., 0.)]) == [None])
+
+
+# with a threshold, rooms keep shallow reflex corners: the path goes around them
+mesh = Mesh2d([Vector2(0, 10), Vector2(0, 0), Vector2(100, 0), Vector2(100, 10), Vector2(50, 8)], range(5))
+mesh.break_into_convex(10.)
+assert(len(mesh.rooms) == 1)
+path = mesh.smooth_path(Vector2(5, 9.6), Vector2(95, 9.6))
+assert(path.tolist() == [[5., 9.6], [50., 8.], [95., 9.6]])
+
+# a ring of non-convex rooms around a pillar
+verts = []
+for i in range(24):
+    dist = 100. if i % 2 == 0 else 95.
+    angle = 2. * math.pi * i / 24
+    verts.append(Vector2(dist * math.cos(angle), dist * math.sin(angle)))
+mesh = Mesh2d(verts, range(24))
+mesh.add_hole([Vector2(-20, -20), Vector2(20, -20), Vector2(20, 20), Vector2(-20, 20)])
+mesh.break_into_convex(10.)
+assert(not mesh.room_locator.convex.any())
+
+border = Polygon2d.get_segments([mesh.outline] + mesh.holes)
+
+def random_point():
+    while True:
+        pt = Vector2(rnd.uniform(-100, 100), rnd.uniform(-100, 100))
+        if mesh.point_inside(pt): return pt
+
+check_paths(100)
+
+# between two neighbouring spikes the path bends at the corner between them
+for i in range(12):
+    angle1 = math.pi * i / 6.
+    angle2 = math.pi * (i + 1) / 6.
+    path = mesh.smooth_path(Vector2(99.5 * math.cos(angle1), 99.5 * math.sin(angle1)),
+        Vector2(99.5 * math.cos(angle2), 99.5 * math.sin(angle2)))
+    assert(len(path) == 3 and Vector2(*path[1]) == verts[2 * i + 1])
@@ -0,0 +1,130 @@
+import sys
+import os
+from random import Random
+
+here = os.path.abspath(os.path.dirname(__file__))
+
+module_root = os.path.join(here, "..")
+sys.path.append(module_root)
+
+from mesh2d import Mesh2d, Polygon2d, Vector2
+from maps import pillar_room
+
+
+rnd = Random(13)
+
+# square room with 3x3 staggered square pillars
+mesh = pillar_room()
+
+mesh.break_into_convex(10.)
+half_edges = mesh.half_edges
+
+assert(half_edges.num_rooms == len(mesh.rooms))
+assert(half_edges.num_edges == sum(len(room) for room in mesh.rooms))
+
+
+# twins go along the same portal in the opposite direction
+num_portal_edges = 0
+for edge in range(half_edges.num_edges):
+    twin = half_edges.twin(edge)
+    assert(half_edges.next(half_edges.prev(edge)) == edge)
+    assert(half_edges.origin(half_edges.next(edge)) == half_edges.dest(edge))
+
+    if twin is None:
+        assert(half_edges.portal(edge) is None)
+        continue
+
+    num_portal_edges += 1
+    assert(half_edges.twin(twin) == edge)
+    assert(half_edges.origin(twin) == half_edges.dest(edge))
+    assert(half_edges.face(twin) != half_edges.face(edge))
+
+    portal = mesh.portals[half_edges.portal(edge)]
+    assert(set(portal) == set((half_edges.origin(edge), half_edges.dest(edge))))
+
+assert(num_portal_edges == 2 * len(mesh.portals))
+
+
+# adjacency matches the room graph
+for room in range(len(mesh.rooms)):
+    assert(sorted(half_edges.room_neighbours(room)) == sorted(mesh.room_graph.room_neighbours(room)))
+
+for portal_id, (start_i, end_i) in enumerate(mesh.portals):
+    faces = half_edges.edge_faces(start_i, end_i)
+    assert(sorted(faces) == sorted(mesh.room_graph.portal_rooms[portal_id].tolist()))
+
+for loop in [mesh.outline] + mesh.holes:
+    assert(half_edges.edge_faces(loop[1], loop[0])[0] is None)
+
+
+# rooms and portals around every vertex
+for vid in set(idx for room in mesh.rooms for idx in room):
+    rooms = set(room_id for room_id, room in enumerate(mesh.rooms) if vid in room)
+    assert(set(half_edges.vertex_rooms(vid)) == rooms)
+
+    portals = set(portal_id for portal_id, portal in enumerate(mesh.portals) if vid in portal)
+    assert(set(half_edges.vertex_portals(vid)) == portals)
+
+
+# walking along the walls gives the border loops
+for loop in [mesh.outline] + mesh.holes:
+    edge = half_edges.find_edge(loop[0], loop[1])
+    assert(half_edges.is_wall(edge))
+    walked = half_edges.border_loop(edge)
+    assert(walked == loop)
+
+
+# point location by walking through portals finds every point inside the mesh,
+# also when a pillar is between the point and the room the walk starts from
+for i in range(500):
+    pt = Vector2(rnd.uniform(0, 100), rnd.uniform(0, 100))
+    room = half_edges.locate_walk(pt.x, pt.y, rnd.randrange(len(mesh.rooms)))
+    assert((room is not None) == mesh.point_inside(pt))
+    if room is None: continue
+
+    assert(mesh.point_inside_room(room, pt))
+
+# points outside of the mesh are never located
+assert(half_edges.locate_walk(-10., 50.) is None)
+assert(half_edges.locate_walk(25., 25.) is None)
+
+# with a threshold, rooms keep shallow reflex corners: in the room below,
+# (90, 9.5) is outside of the line of the edge that ends at the corner (0, 10)
+notched = Mesh2d([Vector2(0, 10), Vector2(0, 0), Vector2(100, 0), Vector2(100, 10), Vector2(50, 8)], range(5))
+notched.break_into_convex(10.)
+assert(len(notched.rooms) == 1)
+assert(notched.half_edges.locate_walk(90., 9.5) == 0)
+assert(notched.half_edges.locate_walk(75., 9.) == 0)
+assert(notched.half_edges.locate_walk(50., 8.1) is None)
+
+
+# line of sight by walking through portals agrees with tracing the ray against the border
+def sees(mesh, start, goal):
+    if not mesh.point_inside(start) or not mesh.point_inside(goal): return False
+    hit = mesh.trace_ray(start, goal)
+    return hit is None or Vector2.distance(start, hit[0]) >= Vector2.distance(start, goal) - Vector2.tolerance
+
+
+rnd = Random(23)
+starts = []
+goals = []
+num_visible = 0
+for i in range(1000):
+    start = Vector2(rnd.uniform(-5, 105), rnd.uniform(-5, 105))
+    goal = Vector2(rnd.uniform(-5, 105), rnd.uniform(-5, 105))
+    starts.append((start.x, start.y))
+    goals.append((goal.x, goal.y))
+
+    visible = mesh.raycast_walk(start, goal)
+    assert(visible == sees(mesh, start, goal))
+    num_visible += visible
+
+assert(num_visible > 200)
+assert(mesh.raycast_walks(starts, goals).tolist() == list(mesh.raycast_walk(Vector2(*start), Vector2(*goal)) \
+    for start, goal in zip(starts, goals)))
+
+# along a wall, through many rooms; touching a corner of a pillar does not block the sight
+assert(mesh.raycast_walk(Vector2(1, 1), Vector2(99, 1)))
+assert(mesh.raycast_walk(Vector2(20, 10), Vector2(40, 30)))
+assert(not mesh.raycast_walk(Vector2(10, 10), Vector2(40, 40)))
+assert(half_edges.walk_segment(mesh.locate_room(Vector2(1, 1)), 1., 1., 1., 1.) == mesh.locate_room(Vector2(1, 1)))
@@ -0,0 +1,148 @@
+import sys
+import os
+import math
+
+import numpy as np
+
+here = os.path.abspath(os.path.dirname(__file__))
+
+module_root = os.path.join(here, "..")
+sys.path.append(module_root)
+
+from mesh2d import Polygon2d, Vector2
+from mesh2d.loop_ring import LoopRing
+
+
+ring = LoopRing([[0, 1, 2, 3], [7, 6, 5]])
+assert(ring.num_loops == 2)
+assert(ring.loop_of(2) == 0 and ring.loop_of(5) == 1 and ring.loop_of(4) is None)
+assert(ring.has_edge(3, 0) and ring.has_edge(0, 3) and not ring.has_edge(0, 2))
+
+# insertion works in both edge directions and across the end of the list view
+ring.insert(1, 2, 8)
+ring.insert(0, 3, 9)
+ring.insert(5, 6, 10)
+assert(ring.as_list(0) == [0, 1, 8, 2, 3, 9])
+assert(ring.as_list(1) == [7, 6, 10, 5])
+assert(ring.size(0) == 6)
+
+for bad in ([0, 1, 4], [4, 11, 4], [11, 12]):
+    try:
+        ring.add_loop(bad)
+        assert(False)
+    except ValueError:
+        pass
+
+try:
+    ring.insert(0, 2, 11)
+    assert(False)
+except ValueError:
+    pass
+
+ring.set_loop(0, [3, 2, 8, 1, 0, 4])
+assert(ring.loop_of(9) is None)
+assert(ring.next(0) == 4 and ring.prev(3) == 4)
+
+# loops after a removed one are renumbered
+ring.add_loop([11, 12, 13])
+ring.remove_loop(1)
+assert(ring.num_loops == 2)
+assert(ring.loop_of(7) is None and ring.loop_of(12) == 1)
+assert(ring.as_list(1) == [11, 12, 13])
+
+
+# the shorter part between two vertices is reversed: the loop stays the same up to its direction
+ring = LoopRing([range(10)])
+ring.reverse_between(2, 6)
+assert(ring.as_list(0) == [0, 1, 2, 5, 4, 3, 6, 7, 8, 9])
+ring.reverse_between(3, 1)
+assert(ring.as_list(0) == [0, 1, 4, 5, 2, 3, 6, 7, 8, 9])
+ring.reverse_between(8, 4)
+assert(ring.as_list(0) == [0, 9, 4, 5, 2, 3, 6, 7, 8, 1])
+assert(ring.next(1) == 0 and ring.prev(9) == 0)
+
+
+# a ring made from index arrays gives list views of them, and is linked when first walked
+ring = LoopRing.from_arrays([np.arange(4), np.array([7, 6, 5])])
+assert(ring.num_loops == 2 and ring.size(1) == 3)
+assert(ring.as_list(1) == [7, 6, 5] and type(ring.as_list(1)[0]) is int)
+assert(ring.loop_of(6) == 1 and ring.next(3) == 0 and ring.prev(5) == 6)
+ring.insert(1, 2, 8)
+assert(ring.as_list(0) == [0, 1, 8, 2, 3])
+
+ring = LoopRing.from_arrays([np.arange(4)])
+ring.add_loop([7, 6, 5])
+assert(ring.as_list(0) == [0, 1, 2, 3] and ring.loop_of(5) == 1)
+
+
+# polygon border views follow the ring
+poly = Polygon2d([Vector2(0, 0), Vector2(10, 0), Vector2(10, 10), Vector2(0, 10)], range(4))
+poly.add_hole([Vector2(4, 4), Vector2(6, 4), Vector2(6, 6), Vector2(4, 6)])
+
+idx = poly.add_vertex_to_border(Vector2(10, 5), (2, 1))
+assert(poly.outline == [0, 1, idx, 2, 3])
+assert(poly.get_adjacent_edges(idx) == ((1, idx), (idx, 2)))
+
+hole = poly.holes[0]
+assert(tuple(poly.vertices[hole[2]]) == (6, 4) and tuple(poly.vertices[hole[3]]) == (4, 4))
+ids = poly.add_vertices_to_border([Vector2(4.5, 4.), Vector2(5, 4.)], (hole[2], hole[3]))
+assert(poly.holes[0] == hole[:3] + ids[::-1] + hole[3:])
+assert(poly.point_inside(Vector2(2, 2)) and not poly.point_inside(Vector2(5, 5)))
+
+try:
+    poly.add_vertex_to_border(Vector2(5, 5), (0, 2))
+    assert(False)
+except ValueError:
+    pass
+
+
+# inserting vertices takes the same number of steps whatever the size of the outline
+class CountingList(list):
+    def __init__(self, items, counter):
+        super(CountingList, self).__init__(items)
+        self.counter = counter
+
+    def __getitem__(self, pos):
+        self.counter[0] += 1
+        return super(CountingList, self).__getitem__(pos)
+
+    def __setitem__(self, pos, value):
+        self.counter[0] += 1
+        super(CountingList, self).__setitem__(pos, value)
+
+
+def insert_steps(num_verts, num_new):
+    verts = list(Vector2(math.cos(2 * math.pi * i / num_verts), math.sin(2 * math.pi * i / num_verts)) \
+        for i in range(num_verts))
+    poly = Polygon2d(verts, range(num_verts))
+    edges = list(Polygon2d.get_segments([poly.outline]))[:num_new]
+
+    # count the accesses to the links of the ring, list views must not be rebuilt
+    counter = [0]
+    ring = poly._loops
+    ring._next = CountingList(ring._next, counter)
+    ring._prev = CountingList(ring._prev, counter)
+    ring._loop = CountingList(ring._loop, counter)
+    ring.as_list = None
+
+    for edge in edges:
+        poly.add_vertex_to_border((poly.vertices[edge[0]] + poly.vertices[edge[1]]) * .5, edge)
+    return counter[0]
+
+assert(insert_steps(1000, 100) == insert_steps(50000, 100))
+
+
+# positions and the views of the holes are cached until a loop changes
+ring = LoopRing([[0, 1, 2, 3], [7, 6, 5], [10, 11, 12]])
+holes = ring.as_lists(1)
+assert(holes == [[7, 6, 5], [10, 11, 12]] and ring.as_lists(1) is holes)
+assert(ring.position(5) == 2 and ring.position(3) == 3)
+
+ring.insert(6, 5, 8)
+assert(ring.as_lists(1) == [[7, 6, 8, 5], [10, 11, 12]] and ring.position(5) == 3)
+ring.remove_loop(1)
+assert(ring.as_lists(1) == [[10, 11, 12]] and ring.as_lists() == [[0, 1, 2, 3], [10, 11, 12]])
+
+poly = Polygon2d([Vector2(0, 0), Vector2(10, 0), Vector2(10, 10), Vector2(0, 10)], range(4))
+poly.add_hole([Vector2(4, 4), Vector2(6, 4), Vector2(6, 6), Vector2(4, 6)])
+assert(poly.holes is poly.holes)
@@ -0,0 +1,46 @@
+'''
+Test maps shared by the tests.
+'''
+
+import sys
+import os
+
+here = os.path.abspath(os.path.dirname(__file__))
+
+module_root = os.path.join(here, "..")
+sys.path.append(module_root)
+sys.path.append(os.path.join(module_root, "benchmarks"))
+
+from mesh2d import Mesh2d, Vector2
+from generators import GENERATORS
+
+
+def square(cx, cy, size):
+    return [Vector2(cx - size, cy - size), Vector2(cx + size, cy - size),
+        Vector2(cx + size, cy + size), Vector2(cx - size, cy + size)]
+
+
+def pillar_room(num=3, x0=0., y0=0., cls=Mesh2d):
+    '''
+    Square room (100 x 100, corner at (x0, y0)) with num x num staggered square pillars.
+    '''
+    poly = cls([Vector2(x0, y0), Vector2(x0 + 100, y0), Vector2(x0 + 100, y0 + 100), Vector2(x0, y0 + 100)], range(4))
+
+    step = 100. / (num + 1)
+    for i in range(num):
+        for j in range(num):
+            cy = y0 + step * (j + 1) + (i % 2) * step * .3
+            poly.add_hole(square(x0 + step * (i + 1), cy, step * .2))
+    return poly
+
+
+def generated(name, num_verts, seed=0, cls=Mesh2d, **kwargs):
+    '''
+    Mesh (or other polygon class cls) of a polygon made by a generator from benchmarks/generators.py
+    ('star', 'spiral', 'maze' or 'random_holes'), extra arguments go to the generator.
+    '''
+    outline, holes = GENERATORS[name](num_verts, seed, **kwargs)
+    mesh = cls([Vector2(x, y) for x, y in outline], range(len(outline)))
+    for hole in holes:
+        mesh.add_hole([Vector2(x, y) for x, y in hole])
+    return mesh
@@ -0,0 +1,72 @@
+import sys
+import os
+
+here = os.path.abspath(os.path.dirname(__file__))
+
+module_root = os.path.join(here, "..")
+sys.path.append(module_root)
+
+from mesh2d import Mesh2d, Vector2, TimingObserver
+from maps import generated
+
+
+def rotation_of(loop, reference):
+    if len(loop) != len(reference) or reference[0] not in loop: return False
+    pos = loop.index(reference[0])
+    return loop[pos:] + loop[:pos] == reference
+
+
+# square split by a diagonal: the portal is inessential
+mesh = Mesh2d([Vector2(0, 0), Vector2(10, 0), Vector2(10, 10), Vector2(0, 10)], range(4))
+mesh.rooms = [[0, 1, 2], [0, 2, 3]]
+mesh.portals = [(2, 0)]
+mesh._build_room_graph()
+
+assert(mesh.merge_rooms() == (1, 1))
+assert(len(mesh.rooms) == 1 and rotation_of(mesh.rooms[0], [0, 1, 2, 3]))
+assert(mesh.portals == [])
+assert(mesh.locate_room(Vector2(8, 2)) == 0 and mesh.locate_room(Vector2(2, 8)) == 0)
+
+
+# rectangle split in two by a vertical line with a vertex in the middle:
+# the rooms share 2 portals, both go away
+verts = [Vector2(0, 0), Vector2(5, 0), Vector2(10, 0), Vector2(10, 10), Vector2(5, 10), Vector2(0, 10)]
+mesh = Mesh2d(verts, range(6))
+mid = mesh.vertices.append_xy(5, 5)
+mesh.rooms = [[0, 1, mid, 4, 5], [1, 2, 3, 4, mid]]
+mesh.portals = [(1, mid), (mid, 4)]
+mesh._build_room_graph()
+
+assert(mesh.merge_rooms() == (1, 2))
+assert(len(mesh.rooms) == 1 and rotation_of(mesh.rooms[0], [0, 1, 2, 3, 4, 5]))
+
+
+# L-shaped room: the union of 2 rooms across the only portal is not convex
+mesh = Mesh2d([Vector2(0, 0), Vector2(20, 0), Vector2(20, 10), Vector2(10, 10),
+    Vector2(10, 20), Vector2(0, 20)], range(6))
+mesh.break_into_convex()
+num_rooms = len(mesh.rooms)
+assert(mesh.merge_rooms() == (0, 0))
+assert(len(mesh.rooms) == num_rooms)
+
+
+# a full build with merging: the greedy portals of a star leave rooms that can be merged,
+# the merged rooms stay convex and still cover the mesh
+unmerged = generated('star', 40, seed=2, radius=100.)
+unmerged.break_into_convex()
+
+mesh = generated('star', 40, seed=2, radius=100.)
+observer = TimingObserver()
+mesh.break_into_convex(observer=observer, merge=True)
+assert('merge_rooms' in observer.durations)
+
+removed = observer.counts['removed_rooms']
+assert(removed > 0)
+assert(len(mesh.rooms) == len(unmerged.rooms) - removed)
+assert(all(Mesh2d.check_convex(room, mesh.vertices) for room in mesh.rooms))
+
+rooms_area = sum(mesh.vertices.signed_area(room) for room in mesh.rooms)
+free_area = sum(mesh.vertices.signed_area(loop) for loop in [mesh.outline] + mesh.holes)
+assert(abs(rooms_area - free_area) < 1e-6)
+assert((mesh.room_graph.portal_rooms >= 0).all())
+print("rooms: {}, removed: {}".format(len(mesh.rooms), removed))
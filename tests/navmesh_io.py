@@ -0,0 +1,88 @@
+import sys
+import os
+import shutil
+import tempfile
+from random import Random
+
+import numpy as np
+
+here = os.path.abspath(os.path.dirname(__file__))
+
+module_root = os.path.join(here, "..")
+sys.path.append(module_root)
+
+from mesh2d import Vector2, save_navmesh, load_navmesh
+from maps import generated
+
+
+rnd = Random(11)
+
+# square with 16 randomly shaped holes
+mesh = generated('random_holes', 100, seed=11, size=100.)
+
+tmp_dir = tempfile.mkdtemp()
+try:
+    # polygon that has not been broken into rooms
+    path = os.path.join(tmp_dir, "border.nav")
+    save_navmesh(mesh, path)
+    loaded = load_navmesh(path)
+    assert(loaded.outline == mesh.outline)
+    assert(loaded.holes == mesh.holes)
+    assert(loaded.rooms == [] and loaded.room_graph is None)
+    assert(loaded.build_threshold is None)
+
+    # the loaded border can be broken into the same rooms
+    mesh.break_into_convex(10.)
+    loaded.break_into_convex(10.)
+    assert(loaded.rooms == mesh.rooms)
+    assert(loaded.portals == mesh.portals)
+
+
+    path = os.path.join(tmp_dir, "mesh.nav")
+    save_navmesh(mesh, path)
+    with open(path, 'rb') as inf: saved_bytes = inf.read()
+
+    loaded = load_navmesh(path)
+
+    assert((loaded.vertices.x == mesh.vertices.x).all())
+    assert((loaded.vertices.y == mesh.vertices.y).all())
+    assert(loaded.outline == mesh.outline)
+    assert(loaded.holes == mesh.holes)
+    assert(loaded.rooms == mesh.rooms)
+    assert(loaded.portals == mesh.portals)
+    assert(loaded.build_threshold == 10.)
+
+    for name in ('offsets', 'portal_ids', 'neighbours', 'lefts', 'rights', 'portal_rooms'):
+        assert((getattr(loaded.room_graph, name) == getattr(mesh.room_graph, name)).all())
+
+    points = np.array([(rnd.uniform(0, 100), rnd.uniform(0, 100)) for i in range(500)])
+    assert((loaded.locate_rooms(points) == mesh.locate_rooms(points)).all())
+
+    paths = mesh.smooth_paths(points[:50], points[50:100])
+    loaded_paths = loaded.smooth_paths(points[:50], points[50:100])
+    for path1, path2 in zip(paths, loaded_paths):
+        assert((path1 is None and path2 is None) or (path1 == path2).all())
+
+    # spatial indices are built from the loaded border
+    tip = Vector2(50, 2)
+    assert(loaded.find_closest_edge(Vector2(40, 10), tip, Vector2(60, 10)) ==
+        mesh.find_closest_edge(Vector2(40, 10), tip, Vector2(60, 10)))
+
+    # changing the loaded mesh does not change the file
+    loaded.vertices[0] = Vector2(-1, -1)
+    edge = (loaded.outline[0], loaded.outline[1])
+    loaded.add_vertex_to_border((loaded.vertices[edge[0]] + loaded.vertices[edge[1]]) * .5, edge)
+    del loaded
+    with open(path, 'rb') as inf: assert(inf.read() == saved_bytes)
+
+    # not a navmesh
+    bad_path = os.path.join(tmp_dir, "bad.nav")
+    with open(bad_path, 'wb') as outf: outf.write(b'\0' * 100)
+    try:
+        load_navmesh(bad_path)
+        assert(False)
+    except ValueError:
+        pass
+
+finally:
+    shutil.rmtree(tmp_dir)
@@ -0,0 +1,84 @@
+import sys
+import os
+
+here = os.path.abspath(os.path.dirname(__file__))
+
+module_root = os.path.join(here, "..")
+sys.path.append(module_root)
+
+from mesh2d import Mesh2d, Polygon2d, Vector2
+from maps import pillar_room, square
+
+
+def check_mesh(mesh):
+    # rooms cover the free space exactly
+    rooms_area = sum(mesh.vertices.signed_area(room) for room in mesh.rooms)
+    free_area = sum(mesh.vertices.signed_area(loop) for loop in [mesh.outline] + mesh.holes)
+    assert(abs(rooms_area - free_area) < 1e-6)
+
+    # every portal is between 2 rooms
+    assert((mesh.room_graph.portal_rooms >= 0).all())
+
+    # every room edge is either a portal or a part of the border
+    half_edges = mesh.half_edges
+    num_walls = sum(1 for edge in range(half_edges.num_edges) if half_edges.is_wall(edge))
+    assert(num_walls == sum(len(loop) for loop in [mesh.outline] + mesh.holes))
+
+
+# square room with 3x3 staggered square pillars
+mesh = pillar_room()
+
+mesh.break_into_convex(10.)
+num_rooms = len(mesh.rooms)
+print("rooms before: {}".format(num_rooms))
+
+
+# obstacle between the wall and the first column of pillars
+hole_id = mesh.add_obstacle(square(12., 50., 3.))
+assert(hole_id == 9)
+assert(len(mesh.holes) == 10)
+assert(mesh.build_threshold == 10.)
+check_mesh(mesh)
+print("rooms after adding: {}".format(len(mesh.rooms)))
+
+assert(mesh.locate_room(Vector2(12., 50.)) is None)
+assert(mesh.locate_room(Vector2(12., 45.)) is not None)
+
+path = mesh.smooth_path(Vector2(5., 50.), Vector2(20., 50.))
+assert(path is not None)
+
+
+# obstacle given as a polygon
+hole_id = mesh.add_obstacle(Polygon2d(square(87., 12., 4.), range(4)))
+assert(hole_id == 10)
+check_mesh(mesh)
+
+
+# obstacles must not touch the border
+for bad in (square(25., 25., 6.), square(1., 50., 3.), square(50., 50., 60.)):
+    try:
+        mesh.add_obstacle(bad)
+        assert(False)
+    except ValueError as ex:
+        pass
+assert(len(mesh.holes) == 11)
+
+
+# remove the first obstacle, then one of the pillars
+mesh.remove_obstacle(9)
+assert(len(mesh.holes) == 10)
+check_mesh(mesh)
+assert(mesh.locate_room(Vector2(12., 50.)) is not None)
+
+mesh.remove_obstacle(4)
+assert(len(mesh.holes) == 9)
+check_mesh(mesh)
+assert(mesh.locate_room(Vector2(50., 57.5)) is not None)
+print("rooms after removing: {}".format(len(mesh.rooms)))
+
+
+# before the mesh is built, obstacles just change the border
+poly = Mesh2d([Vector2(0, 0), Vector2(10, 0), Vector2(10, 10), Vector2(0, 10)], range(4))
+assert(poly.add_obstacle(square(5., 5., 1.)) == 0)
+poly.remove_obstacle(0)
+assert(len(poly.holes) == 0)
@@ -0,0 +1,58 @@
+import sys
+import os
+from random import Random
+
+here = os.path.abspath(os.path.dirname(__file__))
+
+module_root = os.path.join(here, "..")
+sys.path.append(module_root)
+
+from mesh2d import Vector2
+from mesh2d.spatial import PortalIndex
+from maps import generated, square
+
+
+rnd = Random(7)
+
+# star-shaped polygon with a square hole in the middle
+poly = generated('star', 200, seed=7, radius=100.)
+poly.add_hole(square(0., 0., 10.))
+
+
+# closest portal from the portal index matches a scan of the portal list
+portal_list = []
+portal_index = PortalIndex()
+for i in range(60):
+    start_i = rnd.choice(poly.outline)
+    end_point = Vector2(rnd.uniform(-60, 60), rnd.uniform(-60, 60))
+    portal = {'start_index': start_i, 'end_index': None, 'end_point': end_point}
+    start = poly.vertices[start_i]
+    portal_list.append(portal)
+    portal_index.insert(portal, start.x, start.y, end_point.x, end_point.y)
+
+# portals that share the start vertex are equally close to points around it
+for i in range(3):
+    portal = {'start_index': portal_list[0]['start_index'], 'end_index': None,
+        'end_point': Vector2(rnd.uniform(-60, 60), rnd.uniform(-60, 60))}
+    start = poly.vertices[portal['start_index']]
+    portal_list.append(portal)
+    portal_index.insert(portal, start.x, start.y, portal['end_point'].x, portal['end_point'].y)
+
+removed = portal_list.pop(5)
+portal_index.remove(removed)
+assert(len(portal_index) == len(portal_list))
+
+num_found = 0
+for spike in poly.find_spikes(10.):
+    vec1, vec2 = poly.get_sector(spike[0], spike[1], spike[2], 10.)
+    tip = poly.vertices[spike[1]]
+    res = poly.find_closest_portal(tip + vec2, tip, tip + vec1, portal_index)
+    ref = poly.find_closest_portal(tip + vec2, tip, tip + vec1, portal_list)
+    assert(res[0] is ref[0] and res[2] == ref[2])
+    if ref[0] is not None: num_found += 1
+
+    # with a distance limit, only closer portals are reported
+    res = poly.find_closest_portal(tip + vec2, tip, tip + vec1, portal_index, 10.)
+    assert(res[0] is (ref[0] if ref[2] is not None and ref[2] <= 10. else None))
+
+assert(num_found > 0)
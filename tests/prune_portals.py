@@ -0,0 +1,59 @@
+import sys
+import os
+
+here = os.path.abspath(os.path.dirname(__file__))
+
+module_root = os.path.join(here, "..")
+sys.path.append(module_root)
+
+from mesh2d import Mesh2d, Vector2, TimingObserver
+from maps import pillar_room
+
+
+def make_mesh(points):
+    return Mesh2d([Vector2(x, y) for x, y in points], range(len(points)))
+
+
+def check_rooms(mesh):
+    rooms_area = sum(mesh.vertices.signed_area(room) for room in mesh.rooms)
+    free_area = sum(mesh.vertices.signed_area(loop) for loop in [mesh.outline] + mesh.holes)
+    assert(abs(rooms_area - free_area) < 1e-6)
+    assert((mesh.room_graph.portal_rooms >= 0).all())
+
+
+# cross: each of the 4 reflex corners is resolved by a portal along the side of the center square.
+# The greedy mode adds a portal for a corner that an older portal already resolves
+cross = [(1, -3), (1, -1), (3, -1), (3, 1), (1, 1), (1, 3), (-1, 3), (-1, 1),
+    (-3, 1), (-3, -1), (-1, -1), (-1, -3)]
+cross = list((x * 10., y * 10.) for x, y in cross)
+
+greedy = make_mesh(cross)
+greedy.break_into_convex()
+check_rooms(greedy)
+
+observer = TimingObserver()
+pruned = make_mesh(cross)
+pruned.break_into_convex(observer=observer, prune_portals=True)
+check_rooms(pruned)
+
+print("greedy: {} rooms, {} portals".format(len(greedy.rooms), len(greedy.portals)))
+print("pruned: {} rooms, {} portals".format(len(pruned.rooms), len(pruned.portals)))
+
+assert(len(greedy.rooms) == 4)
+assert(len(pruned.rooms) == 3)
+assert(observer.counts['pruned_portals'] == 2)
+for room in pruned.rooms:
+    assert(Mesh2d.check_convex(room, pruned.vertices))
+
+# the horizontal band through the center is a single room
+room = pruned.locate_room(Vector2(-25, 0))
+assert(room is not None and pruned.locate_room(Vector2(25, 0)) == room)
+
+
+# pruning never adds portals
+greedy = pillar_room(3)
+greedy.break_into_convex(10.)
+pruned = pillar_room(3)
+pruned.break_into_convex(10., prune_portals=True)
+check_rooms(pruned)
+assert(len(pruned.portals) <= len(greedy.portals))
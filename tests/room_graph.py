@@ -0,0 +1,69 @@
+import sys
+import os
+from random import Random
+
+here = os.path.abspath(os.path.dirname(__file__))
+
+module_root = os.path.join(here, "..")
+sys.path.append(module_root)
+
+from mesh2d import Vector2
+from maps import generated
+
+
+rnd = Random(5)
+
+# serpentine corridor between walls sticking out of both sides
+mesh = generated('maze', 44, seed=5, size=100.)
+
+# middle of the first wall (the right side of the outline goes around it)
+wall = (mesh.vertices[mesh.outline[2]] + mesh.vertices[mesh.outline[4]]) * .5
+
+mesh.break_into_convex(10.)
+
+graph = mesh.room_graph
+
+assert(graph.num_rooms == len(mesh.rooms))
+
+# every portal connects two different rooms
+for portal_id in range(len(mesh.portals)):
+    room1, room2 = graph.portal_rooms[portal_id]
+    assert(room1 >= 0 and room2 >= 0 and room1 != room2)
+
+# two entries per portal, adjacency is symmetric
+assert(graph.offsets[-1] == 2 * len(mesh.portals))
+for room in range(graph.num_rooms):
+    for neighbour in graph.room_neighbours(room):
+        assert(room in graph.room_neighbours(neighbour))
+
+# portal endpoints as seen from the room we leave: left is CCW from right
+for room in range(graph.num_rooms):
+    cntr = Vector2(sum(mesh.vertices[idx].x for idx in mesh.rooms[room]),
+        sum(mesh.vertices[idx].y for idx in mesh.rooms[room])) * (1. / len(mesh.rooms[room]))
+    for entry in graph.room_entries(room):
+        left = mesh.vertices[graph.lefts[entry]]
+        right = mesh.vertices[graph.rights[entry]]
+        assert(Vector2.are_points_ccw(cntr, right, left))
+
+
+# paths between random points
+def random_point():
+    while True:
+        pt = Vector2(rnd.uniform(0, 100), rnd.uniform(0, 100))
+        if mesh.point_inside(pt): return pt
+
+for i in range(50):
+    start = random_point()
+    goal = random_point()
+    path = mesh.find_path(start, goal)
+
+    assert(path is not None)
+    assert(mesh.point_inside_room(path[0], start))
+    assert(mesh.point_inside_room(path[-1], goal))
+    for room1, room2 in zip(path[:-1], path[1:]):
+        assert(room2 in graph.room_neighbours(room1))
+
+# points outside the mesh: in the middle of the first wall, and far away
+assert(not mesh.point_inside(wall))
+assert(mesh.find_path(wall, random_point()) is None)
+assert(mesh.find_path(random_point(), Vector2(500, 0)) is None)
@@ -0,0 +1,83 @@
+import sys
+import os
+from random import Random
+
+import numpy as np
+
+here = os.path.abspath(os.path.dirname(__file__))
+
+module_root = os.path.join(here, "..")
+sys.path.append(module_root)
+
+from mesh2d import Mesh2d, Vector2
+from maps import generated
+
+
+rnd = Random(7)
+
+# band that winds around the center: with a threshold, about half of its rooms are not convex
+mesh = generated('spiral', 200, seed=7, radius=100.)
+mesh.break_into_convex(10.)
+assert(not mesh.room_locator.convex.all())
+
+
+def room_contains(room, x, y):
+    # on the border of the room, or inside it by the number of crossings of a horizontal ray
+    inside = False
+    for pos in range(len(room)):
+        v1 = mesh.vertices[room[pos - 1]]
+        v2 = mesh.vertices[room[pos]]
+        if Vector2.vertex_to_segment_dist(Vector2(x, y), v1, v2)[0] <= Vector2.tolerance: return True
+        if (v1.y > y) != (v2.y > y) and x < v1.x + (y - v1.y) * (v2.x - v1.x) / (v2.y - v1.y):
+            inside = not inside
+    return inside
+
+
+def brute_locate(x, y):
+    # the lowest id of a room that contains the point
+    for room_id, room in enumerate(mesh.rooms):
+        if room_contains(room, x, y): return room_id
+    return None
+
+
+points = [(rnd.uniform(-110, 110), rnd.uniform(-110, 110)) for i in range(2000)]
+
+# room corners and portal midpoints are on the borders of several rooms
+for room in mesh.rooms:
+    points.extend(tuple(mesh.vertices[idx]) for idx in room)
+for start_i, end_i in mesh.portals:
+    points.append(tuple((mesh.vertices[start_i] + mesh.vertices[end_i]) * .5))
+
+located = mesh.locate_rooms(np.array(points))
+assert(located.shape == (len(points),))
+
+num_inside = 0
+for pos, (x, y) in enumerate(points):
+    expected = brute_locate(x, y)
+    assert(mesh.locate_room(Vector2(x, y)) == expected)
+    assert(located[pos] == (-1 if expected is None else expected))
+
+    # a point inside the mesh is in some room and vice versa
+    if mesh.point_inside(Vector2(x, y)):
+        assert(expected is not None)
+        num_inside += 1
+    if x * x + y * y > 100. * 100.:
+        assert(expected is None)
+
+assert(num_inside > 300)
+
+assert(len(mesh.locate_rooms(np.zeros((0, 2)))) == 0)
+
+
+# with a threshold, shallow reflex corners are left in the rooms: in the room below,
+# the corner at (50, 8) hides the right end of the room from its first corner
+mesh = Mesh2d([Vector2(0, 10), Vector2(0, 0), Vector2(100, 0), Vector2(100, 10), Vector2(50, 8)], range(5))
+mesh.break_into_convex(10.)
+assert(len(mesh.rooms) == 1 and not mesh.room_locator.convex[0])
+
+points = [(90., 9.5), (95., 9.9), (50., 7.9), (50., 8.1), (10., 9.5), (25., 9.2), (75., 9.)]
+expected = [0, None, 0, None, 0, None, 0]
+located = mesh.locate_rooms(np.array(points))
+for pos, (x, y) in enumerate(points):
+    assert(mesh.locate_room(Vector2(x, y)) == expected[pos])
+    assert(located[pos] == (-1 if expected[pos] is None else expected[pos]))
@@ -0,0 +1,95 @@
+import sys
+import os
+from random import Random
+
+here = os.path.abspath(os.path.dirname(__file__))
+
+module_root = os.path.join(here, "..")
+sys.path.append(module_root)
+
+from mesh2d import Polygon2d, Vector2
+from mesh2d.sweep import overlapping_segment_pairs
+
+
+def count_crossings(poly):
+    segs = Polygon2d.get_segments([poly.outline])
+    num = 0
+    for i in range(len(segs)):
+        for j in range(i + 1, len(segs)):
+            if segs[i][0] in segs[j] or segs[i][1] in segs[j]: continue
+            if poly._segments_cross_helper(segs[i], segs[j]) is not None:
+                num += 1
+    return num
+
+
+# sweep reports exactly the pairs with overlapping bounding boxes
+
+rnd = Random(11)
+xs = list(rnd.uniform(0, 100) for i in range(60))
+ys = list(rnd.uniform(0, 100) for i in range(60))
+segments = list((i, i + 1) for i in range(0, 60, 2))
+
+def boxes_overlap(s1, s2):
+    return min(xs[s1[0]], xs[s1[1]]) <= max(xs[s2[0]], xs[s2[1]]) and \
+        min(xs[s2[0]], xs[s2[1]]) <= max(xs[s1[0]], xs[s1[1]]) and \
+        min(ys[s1[0]], ys[s1[1]]) <= max(ys[s2[0]], ys[s2[1]]) and \
+        min(ys[s2[0]], ys[s2[1]]) <= max(ys[s1[0]], ys[s1[1]])
+
+expected = set((i, j) for i in range(len(segments)) for j in range(i + 1, len(segments)) \
+    if boxes_overlap(segments[i], segments[j]))
+
+assert(set(overlapping_segment_pairs(xs, ys, segments)) == expected)
+
+
+# a band twisted 'num_twists' times has one self-intersection per twist
+
+for num_twists in (1, 2, 5, 16):
+    top = []
+    bottom = []
+    for i in range(num_twists + 1):
+        if i % 2 == 0:
+            top.append(Vector2(i * 100., 100.))
+            bottom.append(Vector2(i * 100., 0.))
+        else:
+            top.append(Vector2(i * 100., 0.))
+            bottom.append(Vector2(i * 100., 100.))
+
+    verts = bottom + top[::-1]
+    poly = Polygon2d(verts, range(len(verts)))
+
+    # each crossing adds 2 vertices
+    assert(len(poly.outline) == len(verts) + 2 * num_twists)
+    assert(count_crossings(poly) == 0)
+    assert(Polygon2d.check_ccw(poly.vertices, poly.outline))
+
+
+# a saw closed by one straight edge that crosses all of its teeth:
+# all crossings of the long edge are resolved by the first sweep
+
+sweeps = [0]
+find_sinters = Polygon2d._find_sinters
+
+def counting_find_sinters(self):
+    sweeps[0] += 1
+    return find_sinters(self)
+
+Polygon2d._find_sinters = counting_find_sinters
+
+for num_teeth in (2, 10, 50):
+    verts = [Vector2(0., 50.)]
+    for i in range(num_teeth + 1):
+        verts.append(Vector2(i * 10. + 10., 0. if i % 2 == 0 else 100.))
+    verts.append(Vector2(num_teeth * 10. + 20., 50.))
+
+    sweeps[0] = 0
+    poly = Polygon2d(verts, range(len(verts)))
+
+    # the closing edge crosses every edge of the saw except the two next to it
+    assert(len(poly.outline) == len(verts) + 2 * num_teeth)
+    assert(count_crossings(poly) == 0)
+    assert(Polygon2d.check_ccw(poly.vertices, poly.outline))
+
+    # one sweep resolves them, one more finds nothing
+    assert(sweeps[0] == 2)
+
+Polygon2d._find_sinters = find_sinters
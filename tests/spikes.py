@@ -0,0 +1,74 @@
+import sys
+import os
+import math
+from random import Random
+
+here = os.path.abspath(os.path.dirname(__file__))
+
+module_root = os.path.join(here, "..")
+sys.path.append(module_root)
+
+from mesh2d import Mesh2d, Vector2
+
+
+rnd = Random(17)
+
+# star-shaped outline with square holes around the center
+num = 40
+outline = []
+for i in range(num):
+    angle = 2. * math.pi * i / num
+    radius = 100. if i % 2 == 0 else rnd.uniform(40., 80.)
+    outline.append(Vector2(radius * math.cos(angle), radius * math.sin(angle)))
+
+mesh = Mesh2d(outline, range(num))
+for cx, cy in [(-15, 0), (15, 5), (0, -20)]:
+    mesh.add_hole([Vector2(cx - 3, cy - 3), Vector2(cx + 3, cy - 3),
+        Vector2(cx + 3, cy + 3), Vector2(cx - 3, cy + 3)])
+
+
+def reference_spikes(mesh, threshold):
+    '''
+    One vertex at a time with Vector2 math.
+    '''
+    spikes = []
+    for loop in [mesh.outline] + mesh.holes:
+        size = len(loop)
+        for pos in range(size):
+            prev_i = loop[pos]
+            cur_i = loop[(pos + 1) % size]
+            next_i = loop[(pos + 2) % size]
+            prev_v = mesh.vertices[prev_i]
+            cur_v = mesh.vertices[cur_i]
+            next_v = mesh.vertices[next_i]
+
+            if Vector2.double_signed_area(prev_v, cur_v, next_v) >= 0.0: continue
+            if Vector2.angle(cur_v - prev_v, next_v - cur_v) * 180.0 / math.pi > threshold:
+                spikes.append((prev_i, cur_i, next_i))
+    return spikes
+
+
+for threshold in (0., 10., 30.):
+    spikes = mesh.find_spikes(threshold)
+    assert(spikes == reference_spikes(mesh, threshold))
+
+    spike_array = mesh.find_spikes_array(threshold)
+    assert(spike_array.shape == (len(spikes), 3))
+    assert(spike_array.tolist() == list(list(spike) for spike in spikes))
+
+    vecs1, vecs2 = mesh.get_sectors(spike_array, threshold)
+    for pos, (prev_i, spike_i, next_i) in enumerate(spikes):
+        vec1, vec2 = mesh.get_sector(prev_i, spike_i, next_i, threshold)
+        assert(abs(vec1.x - vecs1[pos, 0]) < 1e-12 and abs(vec1.y - vecs1[pos, 1]) < 1e-12)
+        assert(abs(vec2.x - vecs2[pos, 0]) < 1e-12 and abs(vec2.y - vecs2[pos, 1]) < 1e-12)
+
+    print("threshold {}: {} spikes".format(threshold, len(spikes)))
+
+# holes are all convex corners from the inside of the mesh: 4 spikes each
+assert(sum(1 for spike in mesh.find_spikes(10.) if spike[1] >= num) == 12)
+
+# no spikes in a convex polygon
+square = Mesh2d([Vector2(0, 0), Vector2(1, 0), Vector2(1, 1), Vector2(0, 1)], range(4))
+assert(square.find_spikes_array().shape == (0, 3))
+vecs1, vecs2 = square.get_sectors(square.find_spikes_array())
+assert(vecs1.shape == (0, 2))
@@ -0,0 +1,74 @@
+import sys
+import os
+from collections import deque
+from copy import deepcopy
+
+here = os.path.abspath(os.path.dirname(__file__))
+
+module_root = os.path.join(here, "..")
+sys.path.append(module_root)
+
+from maps import pillar_room, generated
+
+
+def split_by_scan(mesh, portals, bridged=True):
+    '''
+    Reference implementation: every room tries the whole portal list.
+    '''
+    rooms = []
+    new_portals = []
+    room_q = deque([[mesh.outline[:]] + deepcopy(mesh.holes)])
+    if bridged:
+        loops, num_bridged = mesh._bridge_holes(portals)
+        new_portals = mesh.portals
+        mesh.portals = []
+        room_q = deque([loops])
+    while len(room_q) > 0:
+        room = room_q.popleft()
+        room1, room2, new_portal, rest = mesh._break_in_two(room, portals)
+        if room1 is None:
+            rooms.append(room[0])
+        else:
+            room_q.append(room1)
+            if room2 is not None: room_q.append(room2)
+            new_portals.append(new_portal)
+    return rooms, new_portals
+
+
+for mesh, threshold in ((generated('star', 150, seed=3, radius=100.), 0.), (pillar_room(3), 10.)):
+    portals = mesh.get_portals(threshold=threshold)
+    mesh._create_portal_endpoints(portals)
+
+    ref_portals = deepcopy(portals)
+    ref_rooms, ref_new_portals = split_by_scan(mesh, ref_portals)
+
+    # portals are only tried in the room that has them: same rooms, in the same order
+    mesh._split_into_rooms(portals)
+    assert(mesh.rooms == ref_rooms)
+    assert(mesh.portals == ref_new_portals)
+
+    print("{} rooms, {} portals".format(len(mesh.rooms), len(mesh.portals)))
+
+
+# holes are bridged into the outline before the rooms are split: same rooms as merging
+# the holes one by one from the queue, and the rooms cover the free space also with many holes
+def room_set(rooms):
+    return sorted(sorted(room) for room in rooms)
+
+mesh = pillar_room(3)
+portals = mesh.get_portals(threshold=10.)
+mesh._create_portal_endpoints(portals)
+ref_rooms, ref_new_portals = split_by_scan(mesh, deepcopy(portals), bridged=False)
+mesh._split_into_rooms(portals)
+assert(room_set(mesh.rooms) == room_set(ref_rooms))
+assert(sorted(mesh.portals) == sorted(ref_new_portals))
+
+for num in (6, 10):
+    mesh = pillar_room(num)
+    mesh.break_into_convex(5.)
+    rooms_area = sum(mesh.vertices.signed_area(room) for room in mesh.rooms)
+    free_area = sum(mesh.vertices.signed_area(loop) for loop in [mesh.outline] + mesh.holes)
+    assert(abs(rooms_area - free_area) < 1e-6)
+    assert(all(len(set(room)) == len(room) for room in mesh.rooms))
+
+    print("{} holes: {} rooms, {} portals".format(len(mesh.holes), len(mesh.rooms), len(mesh.portals)))
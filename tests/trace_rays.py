@@ -0,0 +1,64 @@
+import sys
+import os
+import math
+from random import Random
+
+import numpy as np
+
+here = os.path.abspath(os.path.dirname(__file__))
+
+module_root = os.path.join(here, "..")
+sys.path.append(module_root)
+
+from mesh2d import Vector2
+from maps import generated, square
+
+
+rnd = Random(7)
+
+# star-shaped polygon with a square hole in the middle
+poly = generated('star', 200, seed=7, radius=100.)
+poly.add_hole(square(0., 0., 10.))
+
+
+# rays traced in one batch hit the same points as one by one
+origins = []
+targets = []
+for i in range(300):
+    angle = rnd.uniform(0, 2 * math.pi)
+    start = Vector2(rnd.uniform(-120, 120), rnd.uniform(-120, 120))
+    origins.append((start.x, start.y))
+    targets.append((start.x + math.cos(angle), start.y + math.sin(angle)))
+for vid in poly.outline[::10] + poly.holes[0]:
+    origins.append(tuple(poly.vertices[vid]))
+    targets.append((0., 0.))
+
+# a ray of zero length
+origins.append((5., 5.))
+targets.append((5., 5.))
+
+points, edges = poly.trace_rays(np.array(origins), np.array(targets))
+assert(points.shape == (len(origins), 2) and edges.shape == (len(origins), 2))
+
+num_hits = 0
+for i in range(len(origins)):
+    ref = poly.trace_ray(Vector2(*origins[i]), Vector2(*targets[i])) if origins[i] != targets[i] else None
+    if ref is None:
+        assert(np.isnan(points[i]).all() and (edges[i] == -1).all())
+        continue
+
+    num_hits += 1
+    assert(tuple(points[i]) == (ref[0].x, ref[0].y))
+
+    # at a vertex, either of its edges can be reported
+    edge = tuple(edges[i])
+    assert(edge == ref[1] or ref[0] in (poly.vertices[edge[0]], poly.vertices[edge[1]]))
+
+assert(num_hits > 200)
+
+# the grid follows changes of the border
+edge = (poly.outline[5], poly.outline[6])
+mid = (poly.vertices[edge[0]] + poly.vertices[edge[1]]) * .5
+new_idx = poly.add_vertex_to_border(mid, edge)
+points, edges = poly.trace_rays([tuple(mid * .95)], [tuple(mid)])
+assert(new_idx in edges[0])
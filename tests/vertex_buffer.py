@@ -0,0 +1,76 @@
+import sys
+import os
+import pickle
+
+here = os.path.abspath(os.path.dirname(__file__))
+
+module_root = os.path.join(here, "..")
+sys.path.append(module_root)
+
+from mesh2d import Vector2, Polygon2d, VertexBuffer
+
+
+
+# appending and indexing
+
+buf = VertexBuffer()
+for i in range(100):
+    buf.append(Vector2(i, -i))
+
+assert(len(buf) == 100)
+assert(buf.capacity >= 100)
+assert(buf[42] == Vector2(42, -42))
+assert(buf[-1] == Vector2(99, -99))
+assert(buf.append_xy(1.5, 2.5) == 100)
+assert(buf[100] == Vector2(1.5, 2.5))
+
+
+# indexing returns copies, assignment writes back
+
+vert = buf[3]
+vert.x = 1000.
+assert(buf[3] == Vector2(3, -3))
+
+buf[3] = vert
+assert(buf[3] == Vector2(1000, -3))
+
+
+# slices and take() return new buffers
+
+part = buf[10:20]
+assert(isinstance(part, VertexBuffer))
+assert(len(part) == 10)
+assert(part[0] == Vector2(10, -10))
+
+part = buf.take([5, 1])
+assert(part[0] == Vector2(5, -5) and part[1] == Vector2(1, -1))
+
+
+# area and point-in-loop agree with the Vector2 versions
+
+square = [Vector2(0, 0), Vector2(2, 0), Vector2(2, 2), Vector2(0, 2)]
+buf = VertexBuffer(square)
+
+assert(buf.signed_area() == Vector2.poly_signed_area(square))
+assert(buf.signed_area([3, 2, 1, 0]) == -Vector2.poly_signed_area(square))
+
+for pt in (Vector2(1, 1), Vector2(3, 1), Vector2(1, 0), Vector2(-1, -1)):
+    assert(buf.point_inside_loop([0, 1, 2, 3], pt) == \
+        Polygon2d.point_inside_loop(square, [0, 1, 2, 3], pt))
+
+
+# pickling keeps only the used part of the buffer
+
+buf = pickle.loads(pickle.dumps(buf, 2))
+assert(len(buf) == 4)
+assert(buf[2] == Vector2(2, 2))
+
+
+# polygons store their vertices in a buffer
+
+poly = Polygon2d(square, range(4))
+assert(isinstance(poly.vertices, VertexBuffer))
+poly.add_hole([Vector2(.5, .5), Vector2(.5, 1.5), Vector2(1.5, 1.5), Vector2(1.5, .5)])
+assert(len(poly.vertices) == 8)
+assert(not poly.point_inside(Vector2(1, 1)))
+assert(poly.point_inside(Vector2(.25, 1)))
@@ -0,0 +1,79 @@
+import sys
+import os
+import math
+from random import Random
+
+here = os.path.abspath(os.path.dirname(__file__))
+
+module_root = os.path.join(here, "..")
+sys.path.append(module_root)
+
+from mesh2d import Vector2
+from maps import pillar_room
+
+
+def boundary_dist(point, polygon, angle):
+    '''
+    Distance from the point to the far side of a polygon that is star-shaped around it.
+    '''
+    target = point + Vector2(math.cos(angle), math.sin(angle))
+    best = None
+    for num in range(len(polygon)):
+        inter = Vector2.where_segment_crosses_ray(polygon[num], polygon[(num + 1) % len(polygon)], point, target)
+        if inter is None: continue
+        dist = Vector2.distance(point, inter)
+        if best is None or dist > best: best = dist
+    return best
+
+
+rnd = Random(21)
+
+# square room with 3x3 staggered square pillars
+mesh = pillar_room()
+
+
+# the visible region ends where the rays hit the border (or at the range)
+for num in range(20):
+    point = Vector2(rnd.uniform(0, 100), rnd.uniform(0, 100))
+    if not mesh.point_inside(point): continue
+
+    for max_range in (None, 20., 60.):
+        visible = mesh.visibility_polygon(point, max_range=max_range, arc_step=1.)
+        assert(Vector2.poly_signed_area(visible) > 0)
+
+        for angle in range(3, 360, 7):
+            angle = math.radians(angle + rnd.random())
+            hit = mesh.trace_ray(point, point + Vector2(math.cos(angle), math.sin(angle)))
+            ref = Vector2.distance(point, hit[0])
+
+            # arcs are made of chords
+            tolerance = 1e-6
+            if max_range is not None and ref > max_range - 1e-6:
+                ref = max_range
+                tolerance += max_range * (1. - math.cos(math.radians(.5)))
+
+            assert(abs(boundary_dist(point, visible, angle) - ref) < tolerance)
+
+
+# a view cone starts and ends at the point
+point = Vector2(12.5, 50.)
+direction = Vector2(1., 0.)
+visible = mesh.visibility_polygon(point, direction=direction, fov=60.)
+assert(visible[0] == point)
+for vert in visible[1:]:
+    angle = math.degrees(math.atan2(vert.y - point.y, vert.x - point.x))
+    assert(abs(angle) <= 30. + 1e-6)
+
+# the pillar at (25, 50) hides the pillar behind it
+assert(all(not (vert.x > 50. and abs(vert.y - 50.) < 5.) for vert in visible))
+
+# with nothing in range, the region is a circle
+visible = mesh.visibility_polygon(Vector2(12.5, 12.5), max_range=5., arc_step=10.)
+assert(len(visible) == 36)
+assert(all(abs(Vector2.distance(vert, Vector2(12.5, 12.5)) - 5.) < 1e-9 for vert in visible))
+
+try:
+    mesh.visibility_polygon(Vector2(25., 25.))
+    assert(False)
+except ValueError:
+    pass